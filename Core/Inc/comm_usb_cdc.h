@@ -1,6 +1,7 @@
 #ifndef COMM_USB_CDC_H
 #define COMM_USB_CDC_H
 #include <stddef.h>
+#include <stdint.h>
 #include "telemetry_model.h"
 
 #ifdef __cplusplus
@@ -10,6 +11,8 @@ void CommUSB_Init(void);
 int  CommUSB_SendLine(const char* s);
 int  CommUSB_BuildJSON(const TelemetryPacket* p, char* out, size_t outlen);
 int  CommUSB_SendPacketJSON(const TelemetryPacket* p);
+int  CommUSB_BuildFrame(const TelemetryPacket* p, uint16_t seq, uint8_t* out, size_t outlen);
+int  CommUSB_SendPacketBinary(const TelemetryPacket* p);
 #ifdef __cplusplus
 }
 #endif
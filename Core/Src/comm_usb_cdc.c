@@ -155,3 +155,78 @@ int CommUSB_SendPacketJSON(const TelemetryPacket* p) {
   line[(size_t)n < sizeof(line)-1 ? n : (int)sizeof(line)-1] = '\0';
   return CommUSB_SendLine(line);
 }
+
+/* --------------------------------------------------------------------------
+   Modo binário (serial_bridge/framing.py): TelemetryPacket empacotado sem
+   padding, little-endian, com versão, sequência e CRC-16/CCITT-FALSE,
+   enquadrado em SLIP (END ... END). O bridge detecta sozinho JSON ou binário.
+   -------------------------------------------------------------------------- */
+#define FRAME_VERSION   1u
+#define FRAME_SRC_BYTES 16u
+#define FRAME_BYTES     46u          /* 44 de dados + 2 de CRC */
+#define SLIP_END        0xC0u
+#define SLIP_ESC        0xDBu
+#define SLIP_ESC_END    0xDCu
+#define SLIP_ESC_ESC    0xDDu
+
+static uint16_t frame_seq = 0;
+
+static uint16_t crc16_ccitt(const uint8_t *d, size_t n) {
+  uint16_t crc = 0xFFFF;
+  while (n--) {
+    crc ^= (uint16_t)(*d++) << 8;
+    for (int i = 0; i < 8; i++)
+      crc = (crc & 0x8000) ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+  }
+  return crc;
+}
+
+static size_t put_u16(uint8_t *b, size_t i, uint16_t v) { b[i] = (uint8_t)v; b[i+1] = (uint8_t)(v >> 8); return i + 2; }
+static size_t put_f32(uint8_t *b, size_t i, float v) { memcpy(b + i, &v, 4); return i + 4; } /* Cortex-M é little-endian */
+
+/* Monta o frame SLIP em `out` (até 2 + 2*FRAME_BYTES bytes). Retorna o tamanho ou -1. */
+int CommUSB_BuildFrame(const TelemetryPacket* p, uint16_t seq, uint8_t* out, size_t outlen) {
+  if (!p || !out || outlen < 2 + 2 * FRAME_BYTES) return -1;
+  uint8_t b[FRAME_BYTES];
+  size_t i = 0;
+  b[i++] = FRAME_VERSION;
+  i = put_u16(b, i, seq);
+  i = put_f32(b, i, p->car.gps.latitude);
+  i = put_f32(b, i, p->car.gps.longitude);
+  b[i++] = (uint8_t)p->car.imu.accelerationX;
+  b[i++] = (uint8_t)p->car.imu.accelerationY;
+  b[i++] = (uint8_t)p->car.imu.accelerationZ;
+  b[i++] = (uint8_t)p->car.imu.spinX;
+  b[i++] = (uint8_t)p->car.imu.spinY;
+  b[i++] = (uint8_t)p->car.imu.spinZ;
+  i = put_u16(b, i, (uint16_t)p->car.imu.scale_dps);
+  b[i++] = p->car.drive.pwm;
+  i = put_f32(b, i, p->car.drive.speed_est_mps);
+  i = put_u16(b, i, p->centric.controls.curve_direction);
+  b[i++] = p->centric.controls.speed;
+  b[i++] = p->centric.controls.movement_direction;
+  memset(b + i, 0, FRAME_SRC_BYTES);
+  const char *src = p->src ? p->src : "central";
+  size_t sl = strlen(src);
+  memcpy(b + i, src, sl < FRAME_SRC_BYTES ? sl : FRAME_SRC_BYTES);
+  i += FRAME_SRC_BYTES;
+  i = put_u16(b, i, crc16_ccitt(b, i));
+
+  size_t o = 0;
+  out[o++] = SLIP_END;
+  for (size_t k = 0; k < i; k++) {
+    if (b[k] == SLIP_END)      { out[o++] = SLIP_ESC; out[o++] = SLIP_ESC_END; }
+    else if (b[k] == SLIP_ESC) { out[o++] = SLIP_ESC; out[o++] = SLIP_ESC_ESC; }
+    else                       { out[o++] = b[k]; }
+  }
+  out[o++] = SLIP_END;
+  return (int)o;
+}
+
+/* Atalho: monta e envia um frame binário (sequência própria, incrementada a cada envio) */
+int CommUSB_SendPacketBinary(const TelemetryPacket* p) {
+  uint8_t frame[2 + 2 * FRAME_BYTES];
+  int n = CommUSB_BuildFrame(p, frame_seq++, frame, sizeof(frame));
+  if (n < 0) return -1;
+  return CDC_SendBlocking(frame, (uint16_t)n, 50);
+}
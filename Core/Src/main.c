@@ -85,7 +85,11 @@ int main(void)
 	if ((now - last) >= period_ms){
 	  last = now;
 	  DataGenSimple_Step(&pkt, now);
+#ifdef COMM_USB_BINARY
+	  CommUSB_SendPacketBinary(&pkt);   /* frames SLIP (serial_bridge/framing.py) */
+#else
 	  CommUSB_SendPacketJSON(&pkt);
+#endif
 	}
   }
 
@@ -1,5 +1,5 @@
 from typing import Generator
-from app.core.db import SessionLocal
+from app.core.db import SessionLocal, ReadSessionLocal
 
 def get_db() -> Generator:
     db = SessionLocal()
@@ -7,3 +7,11 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+def get_read_db() -> Generator:
+    """Sessão no pool somente-leitura (não bloqueia a ingestão)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,12 @@
+
+"""Respostas que reaproveitam o JSON já armazenado (sem decode/validate/encode)."""
+from typing import Iterable, Optional
+from fastapi import Response
+
+def json_array_response(docs: Iterable[str], headers: Optional[dict] = None) -> Response:
+    """Emenda textos JSON prontos num array e devolve como corpo da resposta."""
+    body = "[" + ",".join(docs) + "]"
+    return Response(content=body.encode("utf-8"), media_type="application/json", headers=headers)
+
+def json_doc_response(doc: Optional[str]) -> Response:
+    return Response(content=(doc or "null").encode("utf-8"), media_type="application/json")
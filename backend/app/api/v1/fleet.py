@@ -0,0 +1,24 @@
+
+"""Visão da frota: último estado de cada origem (`src`), servido da memória."""
+from typing import Dict
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_read_db
+from app.core.latest_cache import latest_cache
+from app.crud.telemetry_latest import load_latest
+from app.schemas.telemetry import TelemetryOut
+
+router = APIRouter(prefix="/api/v1/fleet", tags=["fleet"])
+
+@router.get(
+    "/snapshot",
+    response_model=Dict[str, TelemetryOut],
+    summary="Último registro de cada origem",
+    response_description="Objeto `{src: registro}`; origem nula aparece como \"\".",
+)
+def snapshot(db: Session = Depends(get_read_db)):
+    # O objeto é montado uma vez por mudança e devolvido como está (sem response_model).
+    if not latest_cache.loaded:
+        latest_cache.load(load_latest(db))
+    return Response(content=latest_cache.snapshot_json().encode("utf-8"), media_type="application/json")
@@ -1,36 +1,286 @@
-
-from fastapi import APIRouter, Depends, Body, Query
+import json
+import time
+from fastapi import APIRouter, Depends, Body, Query, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from sqlalchemy import exc as sa_exc
 from sqlalchemy.orm import Session
-from typing import List, Optional, Any
-from app.api.deps import get_db
-from app.schemas.telemetry import TelemetryOut, TelemetryIn
-from app.crud.telemetry import create_from_payload, get_latest, list_range
+from typing import List, Optional, Any, Tuple, Union
+from app.api.deps import get_db, get_read_db
+from app.schemas.telemetry import TelemetryOut, TelemetryIn, TelemetryBulkResult
+from app.schemas.telemetry_agg import (
+    LiveStatsOut, TelemetryAggregateOut, TelemetryQuantilesOut, TelemetrySeriesOut, TelemetryTrackOut,
+)
+from app.core.config import settings
+from app.models.telemetry import SKETCH_FIELDS
+from app.core.db import SessionLocal
+from app.core.ingest import ingest_writer, IngestQueueFull
+from app.core.jsonstream import iter_json_items, JSONStreamError
+from app.core.latest_cache import latest_cache
+from app.core.live_stats import SIGNALS, live_stats
+from app.api.responses import json_array_response, json_doc_response
+from app.crud.telemetry_agg import aggregate_range, downsample_range, parse_fields
+from app.crud import telemetry_export
+from app.crud.telemetry_geo import bbox_docs, near_docs
+from app.crud.telemetry_sketch import quantiles as sketch_quantiles
+from app.crud.telemetry_track import track
+from app.crud.telemetry import (
+    build_many, create_from_payload, create_many, get_latest_doc,
+    list_range, list_range_docs, list_range_keyset, list_range_keyset_docs,
+)
 
 router = APIRouter(tags=["telemetry"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Limite de janelas por chamada de /aggregate
+AGG_MAX_BUCKETS = 20000
+
+FAST_DESCRIPTION = (
+    "Modo rápido: devolve o JSON armazenado sem decodificar/validar/re-serializar "
+    "(mesmo conteúdo, sem passar pelo response_model)."
+)
+
 @router.get(
     "/latest",
     response_model=Optional[TelemetryOut],
     summary="Último registro de telemetria",
     response_description="Registro mais recente com datas e derivados.",
 )
-def latest(db: Session = Depends(get_db)):
-    return get_latest(db)
+def latest(
+    src: Optional[str] = Query(None, description="Último registro desta origem (servido da memória)"),
+    fast: bool = Query(False, description=FAST_DESCRIPTION),
+    db: Session = Depends(get_read_db),
+):
+    if latest_cache.loaded:
+        doc = latest_cache.get_doc(src) if src is not None else latest_cache.newest_doc()
+    else:
+        doc = get_latest_doc(db, src=src)
+    if fast:
+        return json_doc_response(doc)
+    return json.loads(doc) if doc else None
 
 @router.get(
     "/list",
     response_model=List[TelemetryOut],
     summary="Listar telemetrias",
-    response_description="Lista ordenada por ts (desc).",
+    response_description="Lista ordenada por ts (desc). Em modo cursor, o próximo cursor vem no header `X-Next-Cursor`.",
 )
 def list_items(
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     start_ts: Optional[int] = Query(None, description="Filtra por ts (>=) em epoch ms"),
     end_ts: Optional[int] = Query(None, description="Filtra por ts (<=) em epoch ms"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(
+        None,
+        description="Paginação por cursor: envie vazio (`cursor=`) na 1ª página e depois o valor de `X-Next-Cursor`. Ignora `offset`.",
+    ),
+    fast: bool = Query(False, description=FAST_DESCRIPTION),
+    db: Session = Depends(get_read_db),
+):
+    if cursor is None:
+        if fast:
+            return json_array_response(list_range_docs(db, limit=limit, offset=offset, start_ts=start_ts, end_ts=end_ts))
+        return list_range(db, limit=limit, offset=offset, start_ts=start_ts, end_ts=end_ts)
+    list_fn = list_range_keyset_docs if fast else list_range_keyset
+    try:
+        items, next_cursor = list_fn(db, limit=limit, cursor=cursor, start_ts=start_ts, end_ts=end_ts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    if fast:
+        return json_array_response(items, headers=headers)
+    if headers:
+        response.headers.update(headers)
+    return items
+
+@router.get(
+    "/aggregate",
+    response_model=Union[TelemetryAggregateOut, TelemetrySeriesOut],
+    summary="Agregação por janelas de tempo / redução LTTB",
+    response_description="`mode=buckets`: min/max/avg/count/last por janela. `mode=lttb`: séries [ts, valor] reduzidas.",
+)
+def aggregate(
+    start_ts: int = Query(..., description="Início (>=) em epoch ms"),
+    end_ts: int = Query(..., description="Fim (<=) em epoch ms"),
+    bucket_ms: int = Query(1000, ge=1, description="Tamanho da janela em ms (mode=buckets)"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula (padrão: todos os numéricos)"),
+    src: Optional[str] = Query(None, description="Filtra por origem"),
+    mode: str = Query("buckets", pattern="^(buckets|lttb)$"),
+    points: int = Query(1000, ge=3, le=20000, description="Pontos por série (mode=lttb)"),
+    db: Session = Depends(get_read_db),
+):
+    if end_ts < start_ts:
+        raise HTTPException(status_code=400, detail="end_ts < start_ts")
+    try:
+        field_list = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if mode == "lttb":
+        series = downsample_range(db, start_ts, end_ts, field_list, points, src=src)
+        return TelemetrySeriesOut(start_ts=start_ts, end_ts=end_ts, points=points, src=src, series=series)
+
+    if (end_ts - start_ts) // bucket_ms + 1 > AGG_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"intervalo gera mais de {AGG_MAX_BUCKETS} janelas; aumente bucket_ms")
+    buckets = aggregate_range(db, start_ts, end_ts, bucket_ms, field_list, src=src)
+    return TelemetryAggregateOut(start_ts=start_ts, end_ts=end_ts, bucket_ms=bucket_ms, src=src, buckets=buckets)
+
+@router.get(
+    "/track",
+    response_model=TelemetryTrackOut,
+    summary="Trajeto GPS simplificado (Douglas-Peucker)",
+    response_description="`points`: lista de [ts, lat, lon] em ordem de ts, lida só das colunas lat/lon.",
+)
+def track_route(
+    src: str = Query(..., description="Origem (um trajeto por veículo)"),
+    start_ts: int = Query(..., description="Início (>=) em epoch ms"),
+    end_ts: int = Query(..., description="Fim (<=) em epoch ms"),
+    tolerance_m: float = Query(2.0, ge=0, le=10000, description="Desvio tolerado em metros (0 = sem simplificar)"),
+    db: Session = Depends(get_read_db),
+):
+    if end_ts < start_ts:
+        raise HTTPException(status_code=400, detail="end_ts < start_ts")
+    points = track(db, src, start_ts, end_ts, tolerance_m)
+    # milhares de tuplas: serializa direto, sem validar cada uma pelo response_model
+    body = {"src": src, "start_ts": start_ts, "end_ts": end_ts, "tolerance_m": tolerance_m, "points": points}
+    return json_doc_response(json.dumps(body, separators=(",", ":")))
+
+@router.get(
+    "/quantiles",
+    response_model=TelemetryQuantilesOut,
+    summary="Percentis aproximados de um campo numérico",
+    response_description="Quantis com erro relativo ≤ SKETCH_REL_ACCURACY, somando os sketches por janela do intervalo.",
+)
+def quantiles_route(
+    field: str = Query(..., description=f"Um de: {', '.join(SKETCH_FIELDS)}"),
+    start_ts: int = Query(..., description="Início (>=) em epoch ms"),
+    end_ts: int = Query(..., description="Fim (<=) em epoch ms"),
+    q: str = Query("0.5,0.95,0.99", description="Quantis separados por vírgula, em [0, 1]"),
+    src: Optional[str] = Query(None, description="Só esta origem (padrão: todas juntas)"),
+    db: Session = Depends(get_read_db),
 ):
-    return list_range(db, limit=limit, offset=offset, start_ts=start_ts, end_ts=end_ts)
+    if field not in SKETCH_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field deve ser um de: {', '.join(SKETCH_FIELDS)}")
+    if end_ts < start_ts:
+        raise HTTPException(status_code=400, detail="end_ts < start_ts")
+    try:
+        qs = [float(x) for x in q.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q deve ser uma lista de números") from None
+    if not qs or any(not 0.0 <= x <= 1.0 for x in qs):
+        raise HTTPException(status_code=400, detail="q deve ter quantis em [0, 1]")
+    out = sketch_quantiles(db, field, qs, start_ts, end_ts, src=src)
+    return TelemetryQuantilesOut(
+        field=field, start_ts=start_ts, end_ts=end_ts, src=src, n=out["n"],
+        rel_accuracy=settings.SKETCH_REL_ACCURACY,
+        quantiles={f"{x:g}": v for x, v in zip(qs, out["values"])},
+        sketches=out["sketches"], exact_rows=out["exact_rows"],
+    )
+
+@router.get(
+    "/stats/live",
+    response_model=LiveStatsOut,
+    summary="Estatísticas móveis ao vivo (IMU e tração)",
+    response_description="Média, variância, RMS e pico por origem, janela e sinal, mantidos em memória na ingestão.",
+)
+def stats_live(
+    src: Optional[str] = Query(None, description="Só esta origem (padrão: todas)"),
+):
+    now = int(time.time() * 1000)
+    srcs = [src] if src is not None else live_stats.sources()
+    sources = [s for s in (live_stats.snapshot(x, now) for x in srcs) if s is not None]
+    return {"now": now, "windows_ms": list(live_stats.windows_ms), "signals": list(SIGNALS), "sources": sources}
+
+# Limite de amostras por chamada de /geo/*
+GEO_MAX_LIMIT = 10000
+
+@router.get(
+    "/geo/bbox",
+    response_model=List[TelemetryOut],
+    summary="Amostras dentro de um retângulo lat/lon",
+    response_description="Lista ordenada por ts (asc), até `limit` itens.",
+)
+def geo_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    start_ts: Optional[int] = Query(None, description="Filtra por ts (>=) em epoch ms"),
+    end_ts: Optional[int] = Query(None, description="Filtra por ts (<=) em epoch ms"),
+    src: Optional[str] = Query(None, description="Filtra por origem"),
+    limit: int = Query(1000, ge=1, le=GEO_MAX_LIMIT),
+    fast: bool = Query(False, description=FAST_DESCRIPTION),
+    db: Session = Depends(get_read_db),
+):
+    if max_lat < min_lat or max_lon < min_lon:
+        raise HTTPException(status_code=400, detail="max_lat/max_lon menores que min_lat/min_lon")
+    docs = bbox_docs(db, min_lat, max_lat, min_lon, max_lon, start_ts=start_ts, end_ts=end_ts, src=src, limit=limit)
+    return json_array_response(docs) if fast else [json.loads(d) for d in docs]
+
+@router.get(
+    "/geo/near",
+    response_model=List[TelemetryOut],
+    summary="Amostras a até R metros de um ponto",
+    response_description="Lista ordenada por ts (asc), até `limit` itens.",
+)
+def geo_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(..., gt=0, le=1_000_000, description="Raio em metros (distância haversine)"),
+    start_ts: Optional[int] = Query(None, description="Filtra por ts (>=) em epoch ms"),
+    end_ts: Optional[int] = Query(None, description="Filtra por ts (<=) em epoch ms"),
+    src: Optional[str] = Query(None, description="Filtra por origem"),
+    limit: int = Query(1000, ge=1, le=GEO_MAX_LIMIT),
+    fast: bool = Query(False, description=FAST_DESCRIPTION),
+    db: Session = Depends(get_read_db),
+):
+    docs = near_docs(db, lat, lon, radius_m, start_ts=start_ts, end_ts=end_ts, src=src, limit=limit)
+    return json_array_response(docs) if fast else [json.loads(d) for d in docs]
+
+EXPORT_FORMAT_PATTERN = "^(ndjson|csv|columnar)$"
+EXPORT_FIELDS_DESCRIPTION = (
+    "Caminhos separados por vírgula (folhas ou prefixos, ex.: `car.gps,centric.controls.speed`); "
+    "padrão: todos os campos do schema."
+)
+
+def export_response(docs, fmt: str, fields: Optional[str], gzip: bool, leaves, always, name: str) -> StreamingResponse:
+    """Resposta em streaming de um export (ver app/crud/telemetry_export.py)."""
+    try:
+        paths, columns = telemetry_export.parse_paths(fields, leaves, always)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ext = "csv" if fmt == "csv" else "ndjson"
+    # gzip: o arquivo baixado é o `.gz` (sem Content-Encoding, que faria o cliente descomprimir)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{ext}{".gz" if gzip else ""}"'}
+    return StreamingResponse(
+        telemetry_export.stream(docs, fmt, paths, columns, gzip=gzip),
+        media_type="application/gzip" if gzip else telemetry_export.MEDIA_TYPES[fmt],
+        headers=headers,
+    )
+
+@router.get(
+    "/export",
+    summary="Exportar um intervalo (streaming)",
+    response_description="`ndjson`: um documento por linha. `csv`: colunas achatadas do schema. "
+    "`columnar`: blocos `{n, columns}` por linha. Ordem crescente de ts.",
+)
+def export(
+    start_ts: int = Query(..., description="Início (>=) em epoch ms"),
+    end_ts: int = Query(..., description="Fim (<=) em epoch ms"),
+    src: Optional[str] = Query(None, description="Filtra por origem"),
+    format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN),
+    fields: Optional[str] = Query(None, description=EXPORT_FIELDS_DESCRIPTION),
+    gzip: bool = Query(False, description="Entrega o arquivo comprimido (`.gz`, application/gzip)"),
+):
+    if end_ts < start_ts:
+        raise HTTPException(status_code=400, detail="end_ts < start_ts")
+    return export_response(
+        telemetry_export.telemetry_docs(start_ts, end_ts, src), format, fields, gzip,
+        telemetry_export.TELEMETRY_PATHS, [("ts",), ("src",)], f"telemetry_{start_ts}_{end_ts}",
+    )
 
 @router.post(
     "/ingest",
@@ -38,5 +288,119 @@ def list_items(
     summary="Ingerir telemetria (HTTP)",
     response_description="Registro recém-criado com datas e derivados.",
 )
-def ingest(payload: TelemetryIn = Body(...), db: Session = Depends(get_db)):
-    return create_from_payload(db, payload)
+async def ingest(request: Request, payload: TelemetryIn = Body(...), db: Session = Depends(get_db)):
+    # Corpo já lido (e em cache) pelo FastAPI; vai verbatim para raw_json
+    raw = await request.body()
+    return await run_in_threadpool(_ingest_one, db, payload, raw)
+
+def _unavailable(detail: str) -> HTTPException:
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+def _writer_busy(e: Exception) -> bool:
+    """Conexão de escrita presa por outra operação (pool esgotado ou banco travado)."""
+    return isinstance(e, sa_exc.TimeoutError) or (
+        isinstance(e, sa_exc.OperationalError) and "locked" in str(e).lower()
+    )
+
+def _direct(fn, *args, **kwargs):
+    """Gravação fora do escritor em lote (ele parado): escritor ocupado vira 503."""
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        if _writer_busy(e):
+            raise _unavailable(f"escritor do banco ocupado: {e.__class__.__name__}") from e
+        raise
+
+def _wait(fut: Future, timeout: float):
+    """Resultado do lote que contém o item; escritor ocupado ou atrasado vira 503."""
+    try:
+        return fut.result(timeout=timeout + ingest_writer.flush_s + 5)
+    except FutureTimeout:
+        raise _unavailable("gravação não confirmada no prazo (escritor ocupado); pode ter sido gravada") from None
+    except Exception as e:
+        if _writer_busy(e):
+            raise _unavailable(f"escritor do banco ocupado: {e.__class__.__name__}") from e
+        raise
+
+def _ingest_one(db: Session, payload: TelemetryIn, raw: bytes):
+    if not ingest_writer.running:
+        return _direct(create_from_payload, db, payload, raw, on_commit=ingest_writer.on_commit)
+    timeout = settings.INGEST_SUBMIT_TIMEOUT_S
+    try:
+        fut = ingest_writer.submit(payload, timeout=timeout, raw=raw)
+    except IngestQueueFull as e:
+        raise _unavailable(str(e))
+    # Responde só depois do commit do lote que contém a amostra
+    return _wait(fut, timeout)
+
+def _ingest_chunk(items: List[Tuple[int, str]]) -> Tuple[int, List[int]]:
+    if not ingest_writer.running:
+        db = SessionLocal()
+        try:
+            return _direct(create_many, db, items, on_commit=ingest_writer.on_commit)
+        finally:
+            db.close()
+    # pelo escritor em lote: o bloco entra inteiro numa transação dele, sem disputar a conexão
+    rows, rejected = build_many(items)
+    if rows:
+        timeout = settings.INGEST_SUBMIT_TIMEOUT_S
+        try:
+            fut = ingest_writer.submit_many(rows, timeout=timeout)
+        except IngestQueueFull as e:
+            raise _unavailable(str(e))
+        _wait(fut, timeout)
+    return len(rows), rejected
+
+@router.post(
+    "/ingest/bulk",
+    response_model=TelemetryBulkResult,
+    summary="Ingerir telemetria em lote (array JSON ou NDJSON)",
+    response_description="Contagem de aceitos/rejeitados e índices rejeitados.",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/TelemetryIn"}}},
+                "application/x-ndjson": {"schema": {"type": "string", "description": "Um TelemetryIn por linha"}},
+            },
+        }
+    },
+)
+async def ingest_bulk(request: Request):
+    """Lê o corpo em streaming, valida/deriva em blocos de `INGEST_BULK_CHUNK`
+    fora do event loop e persiste cada bloco numa única transação."""
+    chunk_max = max(1, settings.INGEST_BULK_CHUNK)
+    accepted = 0
+    rejected: List[int] = []
+    chunk: List[Tuple[int, str]] = []
+
+    async def _flush() -> None:
+        nonlocal accepted, chunk
+        if chunk:
+            try:
+                n, rej = await run_in_threadpool(_ingest_chunk, chunk)
+            except HTTPException as e:
+                if e.status_code != 503:
+                    raise
+                # blocos anteriores já foram gravados: o cliente precisa saber quantos
+                raise HTTPException(
+                    status_code=503, headers=e.headers,
+                    detail={"error": e.detail, "accepted": accepted, "rejected": len(rejected), "rejected_indexes": rejected},
+                ) from None
+            accepted += n
+            rejected.extend(rej)
+            chunk = []
+
+    try:
+        async for idx, text in iter_json_items(request.stream()):
+            chunk.append((idx, text))
+            if len(chunk) >= chunk_max:
+                await _flush()
+    except JSONStreamError as e:
+        await _flush()
+        raise HTTPException(
+            status_code=400,
+            detail={"error": str(e), "accepted": accepted, "rejected": len(rejected), "rejected_indexes": rejected},
+        )
+    await _flush()
+    return TelemetryBulkResult(accepted=accepted, rejected=len(rejected), rejected_indexes=rejected)
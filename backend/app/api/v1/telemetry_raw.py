@@ -1,23 +1,74 @@
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from typing import Optional, List
 from sqlalchemy.orm import Session
-from app.api.deps import get_db
+from app.api.deps import get_read_db
 from app.schemas.telemetry_raw_out import TelemetryRawOut
-from app.crud.telemetry_raw import get_latest_raw, list_raw_range
+from app.crud.telemetry_raw import (
+    get_latest_raw, get_latest_raw_doc,
+    list_raw_range, list_raw_range_docs, list_raw_range_keyset, list_raw_range_keyset_docs,
+)
+from app.api.responses import json_array_response, json_doc_response
+from app.api.v1.telemetry import (
+    NEXT_CURSOR_HEADER, FAST_DESCRIPTION, EXPORT_FORMAT_PATTERN, EXPORT_FIELDS_DESCRIPTION, export_response,
+)
+from app.crud import telemetry_export
 
 router = APIRouter(prefix="/api/v1/telemetry/raw", tags=["telemetry-raw"])
 
 @router.get("/latest", response_model=Optional[TelemetryRawOut], summary="Último registro bruto")
-def latest_raw(db: Session = Depends(get_db)):
+def latest_raw(
+    fast: bool = Query(False, description=FAST_DESCRIPTION),
+    db: Session = Depends(get_read_db),
+):
+    if fast:
+        return json_doc_response(get_latest_raw_doc(db))
     return get_latest_raw(db)
 
 @router.get("/list", response_model=List[TelemetryRawOut], summary="Listar registros brutos")
 def list_raw(
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     start_received_at: Optional[int] = Query(None, description="Filtro >= em epoch ms"),
     end_received_at: Optional[int] = Query(None, description="Filtro <= em epoch ms"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(
+        None,
+        description="Paginação por cursor: envie vazio (`cursor=`) na 1ª página e depois o valor de `X-Next-Cursor`. Ignora `offset`.",
+    ),
+    fast: bool = Query(False, description=FAST_DESCRIPTION),
+    db: Session = Depends(get_read_db),
+):
+    if cursor is None:
+        list_fn = list_raw_range_docs if fast else list_raw_range
+        items = list_fn(db, limit=limit, offset=offset, start_received_at=start_received_at, end_received_at=end_received_at)
+        return json_array_response(items) if fast else items
+    list_fn = list_raw_range_keyset_docs if fast else list_raw_range_keyset
+    try:
+        items, next_cursor = list_fn(
+            db, limit=limit, cursor=cursor, start_received_at=start_received_at, end_received_at=end_received_at
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    if fast:
+        return json_array_response(items, headers=headers)
+    if headers:
+        response.headers.update(headers)
+    return items
+
+@router.get("/export", summary="Exportar registros brutos de um intervalo (streaming)")
+def export_raw(
+    start_received_at: int = Query(..., description="Início (>=) em epoch ms"),
+    end_received_at: int = Query(..., description="Fim (<=) em epoch ms"),
+    src: Optional[str] = Query(None, description="Filtra por origem"),
+    format: str = Query("ndjson", pattern=EXPORT_FORMAT_PATTERN),
+    fields: Optional[str] = Query(None, description=EXPORT_FIELDS_DESCRIPTION + " Caminhos do payload começam com `raw.`."),
+    gzip: bool = Query(False, description="Entrega o arquivo comprimido (`.gz`, application/gzip)"),
 ):
-    return list_raw_range(db, limit=limit, offset=offset, start_received_at=start_received_at, end_received_at=end_received_at)
+    if end_received_at < start_received_at:
+        raise HTTPException(status_code=400, detail="end_received_at < start_received_at")
+    return export_response(
+        telemetry_export.raw_docs(start_received_at, end_received_at, src), format, fields, gzip,
+        telemetry_export.RAW_PATHS, [("received_at",), ("src",)], f"telemetry_raw_{start_received_at}_{end_received_at}",
+    )
@@ -0,0 +1,45 @@
+"""Viagens por origem, resumidas na ingestão (ver app/crud/trips.py)."""
+import time
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_read_db
+from app.api.v1.telemetry import NEXT_CURSOR_HEADER
+from app.crud.cursor import decode_cursor, encode_cursor
+from app.crud.trips import get_trip, list_trips, trip_out
+from app.schemas.trips import TripOut
+
+router = APIRouter(prefix="/api/v1/trips", tags=["trips"])
+
+@router.get(
+    "",
+    response_model=List[TripOut],
+    summary="Listar viagens",
+    response_description="Viagens que cruzam o intervalo, da mais nova para a mais velha. Próxima página no header `X-Next-Cursor`.",
+)
+def trips(
+    response: Response,
+    src: Optional[str] = Query(None, description="Filtra por origem"),
+    start_ts: Optional[int] = Query(None, description="Viagens que terminam em/depois de (epoch ms)"),
+    end_ts: Optional[int] = Query(None, description="Viagens que começam em/antes de (epoch ms)"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Valor de `X-Next-Cursor` da página anterior"),
+    db: Session = Depends(get_read_db),
+):
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = list_trips(db, src=src, start_ts=start_ts, end_ts=end_ts, limit=limit, before=before)
+    if len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]["start_ts"], rows[-1]["id"])
+    now = int(time.time() * 1000)
+    return [trip_out(r, now) for r in rows]
+
+@router.get("/{trip_id}", response_model=TripOut, summary="Uma viagem")
+def trip(trip_id: int, db: Session = Depends(get_read_db)):
+    row = get_trip(db, trip_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="viagem não encontrada")
+    return trip_out(row, int(time.time() * 1000))
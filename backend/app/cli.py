@@ -0,0 +1,116 @@
+
+"""Comandos de manutenção do backend.
+
+Uso (a partir de backend/):
+    python -m app.cli rollup-backfill [--start-ts MS] [--end-ts MS]
+    python -m app.cli archive [--older-than-ms MS] [--vacuum]
+    python -m app.cli expire
+    python -m app.cli compress [--retrain]
+    python -m app.cli trips-backfill
+    python -m app.cli rederive [--workers N] [--restart]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.core.db import init_db, engine
+
+def _rollup_backfill(args: argparse.Namespace) -> None:
+    from app.crud.telemetry_rollup import rebuild_rollups
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        n = rebuild_rollups(conn, start_ts=args.start_ts, end_ts=args.end_ts)
+    print(f"[cli] rollups e sketches refeitos a partir de {n} linhas em {time.perf_counter() - t0:.1f}s")
+
+def _archive(args: argparse.Namespace) -> None:
+    from app.crud.telemetry_archive import archive_store, seal_archive
+    from app.crud.telemetry_raw_partitions import raw_partitions, seal_raw_partitions
+    t0 = time.perf_counter()
+    out = seal_archive(engine, older_than_ms=args.older_than_ms)
+    print(f"[cli] {out['rows']} linhas seladas em {out['segments']} segmentos "
+          f"({out['bytes'] / 1e6:.1f} MB) em {time.perf_counter() - t0:.1f}s")
+    raw = seal_raw_partitions(engine)
+    print(f"[cli] telemetry_raw: {raw['rows']} linhas movidas para {raw['partitions']} partições")
+    if args.vacuum:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("[cli] VACUUM concluído")
+    print(f"[cli] camada fria: {archive_store.stats()}")
+    print(f"[cli] partições: {raw_partitions.stats()}")
+
+def _expire(args: argparse.Namespace) -> None:
+    from app.crud.retention import expire
+    print(f"[cli] retenção aplicada: {expire()}")
+
+def _compress(args: argparse.Namespace) -> None:
+    from app.crud.telemetry_compress import migrate_plain, train_dicts
+    if args.retrain:
+        print(f"[cli] novos dicionários: {train_dicts(engine)}")
+    t0 = time.perf_counter()
+    total = {"raw": 0, "doc": 0}
+    while True:
+        out = migrate_plain(engine)
+        for k, v in out.items():
+            total[k] += v
+        if not any(out.values()):
+            break
+    print(f"[cli] linhas comprimidas: {total} em {time.perf_counter() - t0:.1f}s")
+
+def _trips_backfill(args: argparse.Namespace) -> None:
+    from app.crud.trips import rebuild_trips
+    t0 = time.perf_counter()
+    out = rebuild_trips(engine)
+    print(f"[cli] {out['trips']} viagens refeitas a partir de {out['samples']} amostras em {time.perf_counter() - t0:.1f}s")
+
+def _rederive(args: argparse.Namespace) -> None:
+    from app.crud.telemetry_rederive import checkpoint_path, rederive
+    t0 = time.perf_counter()
+    last = [t0]
+
+    def progress(out):
+        now = time.perf_counter()
+        if now - last[0] >= 5 or out["units_done"] == out["units"]:
+            last[0] = now
+            print(f"[cli] rederivação: {out['units_done']}/{out['units']} faixas, {out['rows']} linhas lidas, "
+                  f"{out['rows_updated']} regravadas, {out['segments_rewritten']} segmentos ({now - t0:.0f}s)")
+
+    print(f"[cli] checkpoint: {checkpoint_path()}")
+    out = rederive(engine, workers=args.workers, restart=args.restart, progress=progress)
+    print(f"[cli] rederivação concluída em {time.perf_counter() - t0:.1f}s: {out}")
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.cli", description="Manutenção do backend de telemetria.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("rollup-backfill", help="Recalcula os rollups (1 s/1 min/1 h) e os sketches de quantis a partir de telemetry.")
+    p.add_argument("--start-ts", type=int, default=None, help="Início (epoch ms); padrão: tudo")
+    p.add_argument("--end-ts", type=int, default=None, help="Fim (epoch ms); padrão: tudo")
+    p.set_defaults(func=_rollup_backfill)
+
+    p = sub.add_parser("archive", help="Sela telemetry antiga em segmentos e move os dias fechados de telemetry_raw para partições.")
+    p.add_argument("--older-than-ms", type=int, default=None, help="Idade mínima (ms); padrão: ARCHIVE_AFTER_MS")
+    p.add_argument("--vacuum", action="store_true", help="Roda VACUUM no SQLite depois (devolve o espaço ao disco)")
+    p.set_defaults(func=_archive)
+
+    p = sub.add_parser("compress", help="Comprime as linhas antigas de raw_json/doc_json ainda em texto puro.")
+    p.add_argument("--retrain", action="store_true", help="Treina antes novos dicionários com as linhas mais recentes")
+    p.set_defaults(func=_compress)
+
+    p = sub.add_parser("trips-backfill", help="Refaz a tabela trips a partir do histórico (camada fria + telemetry).")
+    p.set_defaults(func=_trips_backfill)
+
+    p = sub.add_parser("rederive", help="Recalcula os derivados (VMAX_MPS, volante, datas) de todo o histórico de telemetry.")
+    p.add_argument("--workers", type=int, default=None, help="Processos de cálculo; padrão: REDERIVE_WORKERS")
+    p.add_argument("--restart", action="store_true", help="Ignora o checkpoint e recomeça do início")
+    p.set_defaults(func=_rederive)
+
+    p = sub.add_parser("expire", help="Apaga segmentos/partições mais velhos que RETENTION_*_MS.")
+    p.set_defaults(func=_expire)
+
+    args = ap.parse_args(argv)
+    init_db()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Vários workers do uvicorn (`--workers N`) com um único dono da ingestão MQTT.
+
+- Eleição: o worker que consegue o `flock` exclusivo em `CLUSTER_LOCK_PATH`
+  (ao lado do SQLite) vira líder, consome o MQTT e abre um socket Unix em
+  `CLUSTER_IPC_PATH`. Os demais tentam o lock a cada `CLUSTER_ELECT_S`: se o
+  líder morrer, o kernel solta o lock e outro assume.
+- Fan-out: todo worker conecta no socket do líder. Cada lote commitado (MQTT no
+  líder ou POST em qualquer worker) vai para o hub, que repassa a todos os
+  outros; cada worker atualiza o `latest_cache` e o `live_stats` e entrega aos
+  seus WebSockets.
+
+Protocolo do socket: uma linha por documento, `ts\\tupdated_at\\tsrc_json\\tdoc_json`,
+e uma linha vazia fechando o lote. O `doc_json` segue como foi gravado.
+
+Com um único worker o processo é líder sem pares; nada muda.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import fcntl
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.fanout import ws_fanout
+from app.core.latest_cache import latest_cache
+from app.core.live_stats import live_stats
+
+Rows = List[Dict[str, Any]]
+
+# um par que acumula mais que isso sem ler é desligado (volta a conectar)
+_PEER_BUFFER_MAX = 8 * 1024 * 1024
+
+def encode_rows(rows: Rows) -> bytes:
+    parts = [f"{int(r['ts'])}\t{int(r['updated_at'])}\t{json.dumps(r.get('src'))}\t{r['doc_json']}\n" for r in rows]
+    parts.append("\n")
+    return "".join(parts).encode("utf-8")
+
+def decode_row(line: bytes) -> Dict[str, Any]:
+    ts, updated_at, src, doc = line.decode("utf-8").rstrip("\n").split("\t", 3)
+    return {"ts": int(ts), "updated_at": int(updated_at), "src": json.loads(src), "doc_json": doc}
+
+@contextlib.contextmanager
+def startup_lock(path: str):
+    """Serializa trechos da subida entre workers (ex.: `init_db`)."""
+    with open(path, "a+") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+class Cluster:
+    def __init__(self, lock_path: str, ipc_path: str, elect_s: float = 2.0) -> None:
+        self.lock_path = lock_path
+        self.ipc_path = ipc_path
+        self.elect_s = elect_s
+        self.is_leader = False
+        self._lock_fh: Optional[Any] = None
+        self._on_leader: Optional[Callable[[], Any]] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._tasks: List[asyncio.Task] = []
+        self.sent_batches = 0
+        self.recv_batches = 0
+        self.dropped_peers = 0
+
+    # --- ciclo de vida ------------------------------------------------------
+    async def start(self, on_leader: Callable[[], Any]) -> None:
+        """Tenta a liderança já (para o caso de um worker só) e segue tentando em background."""
+        self._on_leader = on_leader
+        await self._try_lead()
+        self._tasks = [asyncio.create_task(self._elect(), name="cluster-elect")]
+        if not self.is_leader:
+            self._tasks.append(asyncio.create_task(self._follow(), name="cluster-follow"))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for w in list(self._peers) + ([self._upstream] if self._upstream else []):
+            w.close()
+        if self._server is not None:
+            self._server.close()
+            with contextlib.suppress(OSError):
+                os.unlink(self.ipc_path)
+        if self._lock_fh is not None:
+            self._lock_fh.close()  # solta o flock
+            self._lock_fh = None
+
+    async def _try_lead(self) -> None:
+        fh = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return
+        self._lock_fh = fh
+        fh.seek(0)
+        fh.truncate()
+        fh.write(str(os.getpid()))
+        fh.flush()
+        # socket de um líder anterior (já morto, pois o lock estava livre)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.ipc_path)
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.ipc_path)
+        self.is_leader = True
+        if self._upstream is not None:
+            self._upstream.close()
+            self._upstream = None
+        print(f"[api] worker {os.getpid()} é o líder da ingestão (IPC em {self.ipc_path})")
+        result = self._on_leader() if self._on_leader else None
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def _elect(self) -> None:
+        while not self.is_leader:
+            await asyncio.sleep(self.elect_s)
+            await self._try_lead()
+
+    # --- líder: hub ---------------------------------------------------------
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._peers.add(writer)
+        try:
+            async for rows, data in self._read_batches(reader):
+                self._deliver(rows)
+                self._broadcast(data, skip=writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    def _broadcast(self, data: bytes, skip: Optional[asyncio.StreamWriter] = None) -> None:
+        for w in list(self._peers):
+            if w is skip:
+                continue
+            if w.transport.get_write_buffer_size() > _PEER_BUFFER_MAX:
+                # worker travado: derruba; ele reconecta e segue do próximo lote
+                self.dropped_peers += 1
+                self._peers.discard(w)
+                w.close()
+                continue
+            w.write(data)
+
+    # --- seguidor -------------------------------------------------------------
+    async def _follow(self) -> None:
+        while not self.is_leader:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.ipc_path)
+            except OSError:
+                await asyncio.sleep(self.elect_s / 2)
+                continue
+            self._upstream = writer
+            try:
+                async for rows, _ in self._read_batches(reader):
+                    self._deliver(rows)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                if self._upstream is writer:
+                    self._upstream = None
+                writer.close()
+
+    async def _read_batches(self, reader: asyncio.StreamReader):
+        lines: List[bytes] = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line == b"\n":
+                if lines:
+                    self.recv_batches += 1
+                    yield [decode_row(l) for l in lines], b"".join(lines) + b"\n"
+                lines = []
+            else:
+                lines.append(line)
+
+    # --- publicação -----------------------------------------------------------
+    def _deliver(self, rows: Rows) -> None:
+        """Lote commitado por outro worker: atualiza os caches e entrega aos WebSockets locais."""
+        latest_cache.update(rows)
+        texts = [r["doc_json"] for r in rows]
+        docs = [json.loads(d) for d in texts]
+        live_stats.update(docs)
+        ws_fanout.publish_many(docs, texts)
+
+    def committed(self, procs: List[Dict[str, Any]], tel_rows: Rows) -> None:
+        """Lote commitado neste worker (chamar no event loop)."""
+        ws_fanout.publish_many(procs, [r["doc_json"] for r in tel_rows])
+        if self.is_leader:
+            if not self._peers:
+                return
+            data = encode_rows(tel_rows)
+            self._broadcast(data)
+        elif self._upstream is not None:
+            data = encode_rows(tel_rows)
+            self._upstream.write(data)
+        else:
+            return
+        self.sent_batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "leader": self.is_leader,
+            "peers": len(self._peers),
+            "upstream": self._upstream is not None,
+            "sent_batches": self.sent_batches,
+            "recv_batches": self.recv_batches,
+            "dropped_peers": self.dropped_peers,
+        }
+
+cluster = Cluster(
+    lock_path=settings.CLUSTER_LOCK_PATH or f"{settings.SQLITE_PATH}.ingest.lock",
+    ipc_path=settings.CLUSTER_IPC_PATH or f"{settings.SQLITE_PATH}.ipc",
+    elect_s=settings.CLUSTER_ELECT_S,
+)
@@ -9,8 +9,23 @@ class Settings(BaseSettings):
     APP_NAME: str = "telemetry-api"
     MQTT_URL: str = os.getenv("MQTT_URL", "mqtt://localhost:1883")
     MQTT_TOPIC_SUB: str = os.getenv("MQTT_TOPIC_SUB", "telemetry/combined/1")
+    # Consumidor MQTT no event loop (ver app/core/mqtt_consumer.py)
+    MQTT_QOS: int = int(os.getenv("MQTT_QOS", "1"))
+    MQTT_CLIENT_ID: str = os.getenv("MQTT_CLIENT_ID", "telemetry-api")
+    MQTT_WORKERS: int = int(os.getenv("MQTT_WORKERS", "2"))  # threads: tiram a validação do loop, não escalam (GIL)
+    MQTT_QUEUE_MAX: int = int(os.getenv("MQTT_QUEUE_MAX", "1000"))
+    MQTT_BACKOFF_MIN_S: float = float(os.getenv("MQTT_BACKOFF_MIN_S", "0.5"))
+    MQTT_BACKOFF_MAX_S: float = float(os.getenv("MQTT_BACKOFF_MAX_S", "30"))
     SQLITE_PATH: str = os.getenv("SQLITE_PATH", "/data/telemetry.db")
 
+    # Perfil de armazenamento SQLite (PRAGMAs aplicados em cada conexão)
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-16000"))  # negativo = KiB
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
     SERIAL_PORT: str = os.getenv("SERIAL_PORT", "/dev/ttyACM0")
     SERIAL_BAUD: int = int(os.getenv("SERIAL_BAUD", "115200"))
 
@@ -19,6 +34,68 @@ class Settings(BaseSettings):
 
     VMAX_MPS: float = float(os.getenv("VMAX_MPS", "12"))
 
+    # Escritor em lote (group commit) da ingestão
+    INGEST_BATCH_MAX: int = int(os.getenv("INGEST_BATCH_MAX", "256"))
+    INGEST_FLUSH_MS: int = int(os.getenv("INGEST_FLUSH_MS", "50"))
+    INGEST_QUEUE_MAX: int = int(os.getenv("INGEST_QUEUE_MAX", "10000"))
+    INGEST_SUBMIT_TIMEOUT_S: float = float(os.getenv("INGEST_SUBMIT_TIMEOUT_S", "5"))
+    INGEST_BULK_CHUNK: int = int(os.getenv("INGEST_BULK_CHUNK", "1000"))
+
+    # Fan-out do WebSocket: fila por cliente e política quando ela enche
+    WS_QUEUE_MAX: int = int(os.getenv("WS_QUEUE_MAX", "256"))
+    WS_OVERFLOW_POLICY: str = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")  # drop_oldest | coalesce | disconnect
+    WS_SEND_TIMEOUT_S: float = float(os.getenv("WS_SEND_TIMEOUT_S", "10"))
+    WS_DELTA_KEYFRAME_EVERY: int = int(os.getenv("WS_DELTA_KEYFRAME_EVERY", "50"))
+
+    # Vários workers: lock do dono da ingestão e socket Unix do fan-out (padrão: ao lado do SQLite)
+    CLUSTER_LOCK_PATH: str = os.getenv("CLUSTER_LOCK_PATH", "")
+    CLUSTER_IPC_PATH: str = os.getenv("CLUSTER_IPC_PATH", "")
+    CLUSTER_ELECT_S: float = float(os.getenv("CLUSTER_ELECT_S", "2"))
+
+    # Camada fria: linhas mais velhas que ARCHIVE_AFTER_MS viram segmentos colunares
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "")  # padrão: <dir do SQLite>/segments
+    ARCHIVE_WINDOW_MS: int = int(os.getenv("ARCHIVE_WINDOW_MS", str(3600 * 1000)))
+    ARCHIVE_AFTER_MS: int = int(os.getenv("ARCHIVE_AFTER_MS", str(7 * 24 * 3600 * 1000)))
+    ARCHIVE_INTERVAL_S: float = float(os.getenv("ARCHIVE_INTERVAL_S", "3600"))  # 0 = só via CLI
+
+    # Partições de telemetry_raw (um SQLite por período) e retenção por tabela (0 = guarda tudo)
+    PARTITION_DIR: str = os.getenv("PARTITION_DIR", "")  # padrão: <dir do SQLite>/partitions
+    RAW_PARTITION_MS: int = int(os.getenv("RAW_PARTITION_MS", str(24 * 3600 * 1000)))
+    RETENTION_RAW_MS: int = int(os.getenv("RETENTION_RAW_MS", "0"))  # destrutivo: apaga partições inteiras
+    RETENTION_TELEMETRY_MS: int = int(os.getenv("RETENTION_TELEMETRY_MS", "0"))
+
+    # Compressão de raw_json/doc_json com dicionário compartilhado (zlib | off)
+    DOC_COMPRESSION: str = os.getenv("DOC_COMPRESSION", "zlib")
+    DOC_COMPRESSION_LEVEL: int = int(os.getenv("DOC_COMPRESSION_LEVEL", "6"))
+    DOC_DICT_BYTES: int = int(os.getenv("DOC_DICT_BYTES", "4096"))
+    DOC_DICT_SAMPLES: int = int(os.getenv("DOC_DICT_SAMPLES", "256"))
+    DOC_MIGRATE_BUDGET: int = int(os.getenv("DOC_MIGRATE_BUDGET", "50000"))  # linhas por rodada de manutenção
+
+    # Export em streaming: linhas lidas por vez de cada fonte (e por bloco no formato columnar)
+    EXPORT_BATCH_ROWS: int = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+    # /telemetry/track: pedaços simplificados de segmentos selados guardados em memória (0 = sem cache)
+    TRACK_CACHE_SEGMENTS: int = int(os.getenv("TRACK_CACHE_SEGMENTS", "2048"))
+
+    # Viagens (tabela trips): fecham após um buraco sem amostras ou um tempo parado
+    TRIP_IDLE_GAP_MS: int = int(os.getenv("TRIP_IDLE_GAP_MS", str(5 * 60 * 1000)))
+    TRIP_STOP_MS: int = int(os.getenv("TRIP_STOP_MS", str(2 * 60 * 1000)))
+    TRIP_STOP_SPEED_MPS: float = float(os.getenv("TRIP_STOP_SPEED_MPS", "0.2"))  # até aqui conta como parado
+    TRIP_STEER_BUCKET_DEG: int = int(os.getenv("TRIP_STEER_BUCKET_DEG", "10"))
+
+    # Rederivação do histórico (python -m app.cli rederive)
+    REDERIVE_WORKERS: int = int(os.getenv("REDERIVE_WORKERS", "0"))  # processos de cálculo; 0 = CPUs - 1
+    REDERIVE_BATCH_ROWS: int = int(os.getenv("REDERIVE_BATCH_ROWS", "2000"))  # linhas por transação de escrita
+    REDERIVE_PAUSE_MS: int = int(os.getenv("REDERIVE_PAUSE_MS", "50"))  # pausa entre transações (ingestão ao vivo)
+
+    # Sketches de quantis por janela (/telemetry/quantiles): erro relativo máximo dos valores devolvidos
+    SKETCH_REL_ACCURACY: float = float(os.getenv("SKETCH_REL_ACCURACY", "0.01"))
+
+    # Estatísticas móveis ao vivo (/telemetry/stats/live e `stats` no /ws): janelas, baldes por janela e origens em memória
+    LIVE_STATS_WINDOWS_MS: str = os.getenv("LIVE_STATS_WINDOWS_MS", "1000,10000,60000")
+    LIVE_STATS_BUCKETS: int = int(os.getenv("LIVE_STATS_BUCKETS", "10"))
+    LIVE_STATS_MAX_SOURCES: int = int(os.getenv("LIVE_STATS_MAX_SOURCES", "1024"))
+
     @field_validator("CORS_ORIGINS", mode="before")
     @classmethod
     def _parse_cors(cls, v: Any) -> List[str]:
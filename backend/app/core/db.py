@@ -1,23 +1,99 @@
 
-"""Conexão e inicialização do banco de dados SQLite (overlay)."""
-from sqlalchemy import create_engine
+"""Conexão e inicialização do banco de dados SQLite (overlay).
+
+Perfil de produção:
+- `engine` (escrita): uma única conexão serializada (pool de tamanho 1), em
+  modo WAL, usada pela ingestão e por qualquer operação que altere dados.
+- `read_engine` (leitura): pool de conexões somente-leitura (`mode=ro`).
+  Com WAL, leitores não bloqueiam o escritor e vice-versa.
+PRAGMAs configuráveis via `SQLITE_*` (ver config.py) são aplicados em cada conexão.
+"""
+from sqlalchemy import create_engine, event, select
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from .config import settings
 
 DATABASE_URL = f"sqlite:///{settings.SQLITE_PATH}"
+READ_DATABASE_URL = f"sqlite:///file:{settings.SQLITE_PATH}?mode=ro&uri=true"
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+def _common_pragmas() -> list[str]:
+    return [
+        f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}",
+        f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}",
+    ]
+
+def _writer_pragmas() -> list[str]:
+    journal = settings.SQLITE_JOURNAL_MODE.upper()
+    sync = settings.SQLITE_SYNCHRONOUS.upper()
+    if journal not in _JOURNAL_MODES:
+        raise ValueError(f"SQLITE_JOURNAL_MODE inválido: {settings.SQLITE_JOURNAL_MODE}")
+    if sync not in _SYNCHRONOUS:
+        raise ValueError(f"SQLITE_SYNCHRONOUS inválido: {settings.SQLITE_SYNCHRONOUS}")
+    return [f"PRAGMA journal_mode={journal}", f"PRAGMA synchronous={sync}", *_common_pragmas()]
+
+def _reader_pragmas() -> list[str]:
+    return ["PRAGMA query_only=ON", *_common_pragmas()]
+
+def _apply_pragmas(bind, pragmas: list[str]) -> None:
+    @event.listens_for(bind, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for p in pragmas:
+                cur.execute(p)
+        finally:
+            cur.close()
 
+# Escritor único: todas as gravações passam por esta conexão, em série.
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False},
     pool_pre_ping=True,
+    pool_size=1,
+    max_overflow=0,
+    pool_timeout=max(30.0, settings.SQLITE_BUSY_TIMEOUT_MS / 1000.0),
 )
+_apply_pragmas(engine, _writer_pragmas())
+
+# Leitores somente-leitura (não disputam o lock de escrita).
+read_engine = create_engine(
+    READ_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_pre_ping=True,
+    pool_size=max(1, settings.SQLITE_READ_POOL_SIZE),
+    max_overflow=max(0, settings.SQLITE_READ_POOL_SIZE),
+)
+_apply_pragmas(read_engine, _reader_pragmas())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 class Base(DeclarativeBase):
     pass
 
 def init_db():
-    """Cria as tabelas se não existirem (telemetry_raw + telemetry)."""
-    from app.models.telemetry import Telemetry, TelemetryRaw
+    """Cria as tabelas se não existirem (telemetry_raw + telemetry).
+
+    Também cria índices novos em tabelas que já existiam (create_all não os cria).
+    """
+    from app.models.telemetry import Telemetry, TelemetryRaw, TelemetryLatest, TelemetryDict
+    from app.crud.telemetry_latest import backfill_latest
+    from app.crud.telemetry_compress import ensure_dicts
+    from app.crud.telemetry_geo import ensure_geo_index
     Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # bancos criados antes de `telemetry_latest`: preenche a partir de `telemetry`
+    with engine.begin() as conn:
+        if conn.execute(select(TelemetryLatest.src).limit(1)).first() is None:
+            backfill_latest(conn)
+    # dicionários de compressão de raw_json/doc_json (ver app/core/doccodec.py)
+    with engine.begin() as conn:
+        ensure_dicts(conn)
+    # índice espacial (R*Tree) mantido por triggers (ver app/crud/telemetry_geo.py)
+    with engine.begin() as conn:
+        ensure_geo_index(conn)
@@ -0,0 +1,147 @@
+"""Compressão transparente de `raw_json`/`doc_json` com dicionário compartilhado.
+
+Formato por linha (versionado): texto = JSON puro (linhas antigas ou
+`DOC_COMPRESSION=off`); BLOB = `u8 versão | u16 id do dicionário | deflate cru`.
+A versão 1 é zlib com dicionário pré-carregado (`zdict`), que faz documentos de
+poucas centenas de bytes comprimirem bem: as chaves e a estrutura já estão no
+dicionário. Os dicionários ficam na tabela `telemetry_dict` (nunca apagados) e
+são treinados a partir de linhas reais (`app/crud/telemetry_compress.py`).
+
+`CompressedText` é o tipo das colunas: comprime no bind e descomprime só quando
+a coluna é lida — consultas que leem só colunas indexadas não pagam nada.
+"""
+from __future__ import annotations
+
+import struct
+import threading
+import zlib
+from typing import Dict, Optional, Union
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+_HDR = struct.Struct("<BH")
+V_ZLIB_DICT = 1
+DICT_MAX = 32 * 1024  # limite do zlib
+
+class DocCodec:
+    def __init__(self, enabled: bool, level: int) -> None:
+        self.enabled = enabled
+        self.level = level
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, bytes] = {}
+        self._current: Dict[str, int] = {}  # kind -> id do dicionário mais novo
+        self._primed: Dict[int, "zlib._Compress"] = {}
+        self._loaded = False
+
+    # --- dicionários ----------------------------------------------------------
+    def load(self) -> None:
+        """(Re)lê `telemetry_dict`. Usa o pool de leitura: pode ser chamado no meio de uma escrita."""
+        from sqlalchemy import text
+        from app.core.db import read_engine
+
+        with read_engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, kind, data FROM telemetry_dict ORDER BY id")).all()
+        with self._lock:
+            for did, kind, data in rows:
+                self._by_id[int(did)] = bytes(data)
+                self._current[kind] = int(did)
+            self._loaded = True
+
+    def register(self, did: int, kind: str, data: bytes) -> None:
+        """Dicionário recém-gravado por este processo (sem reler a tabela)."""
+        with self._lock:
+            self._by_id[did] = bytes(data)
+            self._current[kind] = did
+            self._loaded = True
+
+    def current(self, kind: str) -> Optional[int]:
+        if not self._loaded:
+            try:
+                self.load()
+            except Exception:
+                return None  # tabela ainda não existe (antes do init_db)
+        return self._current.get(kind)
+
+    def _dict(self, did: int) -> bytes:
+        data = self._by_id.get(did)
+        if data is None:
+            self.load()  # treinado por outro processo depois da nossa leitura
+            data = self._by_id[did]
+        return data
+
+    def _compressor(self, did: int):
+        # o zlib re-hasheia o dicionário a cada `setDictionary`: guarda um
+        # compressor já preparado e copia o estado por documento
+        base = self._primed.get(did)
+        if base is None:
+            base = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, self._dict(did))
+            self._primed[did] = base
+        return base.copy()
+
+    # --- linhas -----------------------------------------------------------------
+    def encode(self, text: str, kind: str) -> Union[str, bytes]:
+        """Texto -> BLOB comprimido (ou o próprio texto, se desligado / sem ganho)."""
+        if not self.enabled:
+            return text
+        did = self.current(kind)
+        if did is None:
+            return text
+        raw = text.encode("utf-8")
+        c = self._compressor(did)
+        blob = _HDR.pack(V_ZLIB_DICT, did) + c.compress(raw) + c.flush()
+        return blob if len(blob) < len(raw) else text
+
+    def decode(self, value: Union[str, bytes, memoryview, None]) -> Optional[str]:
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        version, did = _HDR.unpack_from(value, 0)
+        if version != V_ZLIB_DICT:
+            raise ValueError(f"versão de compressão desconhecida: {version}")
+        d = zlib.decompressobj(-15, zdict=self._dict(did))
+        return (d.decompress(value[_HDR.size:]) + d.flush()).decode("utf-8")
+
+doc_codec = DocCodec(
+    enabled=settings.DOC_COMPRESSION.lower() == "zlib",
+    level=settings.DOC_COMPRESSION_LEVEL,
+)
+
+class CompressedText(TypeDecorator):
+    """Coluna de JSON em texto guardada comprimida (ver módulo). `kind` escolhe o dicionário."""
+
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, kind: str, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.kind = kind
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value  # já comprimido (cópia entre tabelas/migração)
+        return doc_codec.encode(value, self.kind)
+
+    def process_result_value(self, value, dialect):
+        return doc_codec.decode(value)
+
+def train_dict(samples: "list[str]", size: int) -> bytes:
+    """Dicionário zlib a partir de amostras: documentos distintos concatenados,
+    espalhados pelo conjunto e com os mais recentes no fim (o deflate alcança
+    melhor o final do dicionário). `samples` vem do mais velho ao mais novo.
+    """
+    size = max(256, min(int(size), DICT_MAX))
+    seen, picked, total = set(), [], 0
+    step = max(1, len(samples) // 64)
+    for s in samples[::-1][::step]:
+        b = s.encode("utf-8")
+        if b in seen:
+            continue
+        seen.add(b)
+        picked.append(b)
+        total += len(b)
+        if total >= size:
+            break
+    return b"".join(reversed(picked))[-size:]
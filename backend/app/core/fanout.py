@@ -0,0 +1,310 @@
+
+"""Fan-out do WebSocket: cada mensagem é codificada uma vez e entregue por fila.
+
+Cada cliente tem uma fila limitada drenada por uma task própria. Quem publica
+(callback pós-commit da ingestão) só enfileira, então um navegador lento não
+atrasa os outros nem a ingestão. Quando a fila de um cliente enche, vale a
+política configurada:
+
+- `drop_oldest`: descarta a mensagem mais antiga da fila;
+- `coalesce`: mantém só a mensagem mais recente de cada `src` na fila;
+- `disconnect`: fecha a conexão do cliente (código 1013).
+
+Respostas de controle (`hello`, `subscribed`, `error`) vão numa fila à parte,
+enviada antes dos dados e fora da política: nunca são coalescidas nem
+descartadas (um cliente que acumula `CTRL_QUEUE_MAX` delas sem ler é desconectado).
+
+Antes de enfileirar, cada mensagem passa pelos grupos de assinatura
+(`app/core/subscriptions.py`): filtro por `src`, projeção de campos e limite de
+taxa são aplicados uma vez por assinatura distinta.
+
+Todas as operações rodam no event loop (use `loop.call_soon_threadsafe` a partir
+de outras threads).
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from app.core import wsframe
+from app.core.config import settings
+from app.core.subscriptions import (
+    Frame, SubGroup, SubKey, ack_frame, default_key, describe, error_frame, parse_subscription,
+)
+
+POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+_ids = itertools.count(1)
+
+# respostas de controle pendentes por cliente (cada mensagem do cliente gera no máximo duas)
+CTRL_QUEUE_MAX = 64
+
+class WSClient:
+    """Conexão de um cliente: fila limitada + task de envio + métricas de atraso."""
+
+    def __init__(self, ws: WebSocket, queue_max: int, policy: str, send_timeout_s: float, fmt: str = "json") -> None:
+        self.id = next(_ids)
+        self.ws = ws
+        self.queue_max = max(1, queue_max)
+        self.policy = policy
+        self.send_timeout_s = send_timeout_s
+        self.fmt = fmt
+        self.sub_key: SubKey = default_key(fmt)
+        # coalesce: src -> (frame, t_enfileirado); demais: deque de (frame, t_enfileirado)
+        self._fifo: Deque[Tuple[Frame, float]] = deque()
+        self._by_src: "OrderedDict[str, Tuple[Frame, float]]" = OrderedDict()
+        self._ctrl: Deque[Tuple[Frame, float]] = deque()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    # --- fila -------------------------------------------------------------
+    def qsize(self) -> int:
+        return len(self._ctrl) + (len(self._by_src) if self.policy == "coalesce" else len(self._fifo))
+
+    def oldest_age_ms(self) -> float:
+        q = self._by_src.values() if self.policy == "coalesce" else self._fifo
+        oldest = next(iter(q), None)
+        return (time.monotonic() - oldest[1]) * 1000.0 if oldest else 0.0
+
+    def enqueue(self, text: Frame, src: str = "") -> bool:
+        """Enfileira sem bloquear. Retorna False se o cliente deve ser desconectado."""
+        if self.closed:
+            return False
+        now = time.monotonic()
+        if self.policy == "coalesce":
+            prev = self._by_src.get(src)
+            if prev is not None:
+                # substitui no lugar, preservando o instante do mais antigo (lag real)
+                self._by_src[src] = (text, prev[1])
+                self.coalesced += 1
+            else:
+                if len(self._by_src) >= self.queue_max:
+                    self._by_src.popitem(last=False)
+                    self.dropped += 1
+                self._by_src[src] = (text, now)
+        else:
+            if len(self._fifo) >= self.queue_max:
+                if self.policy == "disconnect":
+                    return False
+                self._fifo.popleft()
+                self.dropped += 1
+            self._fifo.append((text, now))
+        self._wake.set()
+        return True
+
+    def enqueue_ctrl(self, frame: Frame) -> bool:
+        """Enfileira uma resposta de controle. Retorna False se o cliente deve ser desconectado."""
+        if self.closed or len(self._ctrl) >= CTRL_QUEUE_MAX:
+            return False
+        self._ctrl.append((frame, time.monotonic()))
+        self._wake.set()
+        return True
+
+    def clear_data(self) -> None:
+        """Descarta os dados ainda na fila (montados para a assinatura anterior)."""
+        self._fifo.clear()
+        self._by_src.clear()
+
+    def _pop(self) -> Optional[Tuple[Frame, float]]:
+        if self._ctrl:
+            return self._ctrl.popleft()
+        if self.policy == "coalesce":
+            return self._by_src.popitem(last=False)[1] if self._by_src else None
+        return self._fifo.popleft() if self._fifo else None
+
+    # --- envio ------------------------------------------------------------
+    def start(self, on_dead) -> None:
+        self._task = asyncio.create_task(self._sender(on_dead))
+
+    async def _sender(self, on_dead) -> None:
+        try:
+            while not self.closed:
+                item = self._pop()
+                if item is None:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                frame, t_enq = item
+                send = self.ws.send_bytes(frame) if isinstance(frame, bytes) else self.ws.send_text(frame)
+                await asyncio.wait_for(send, timeout=self.send_timeout_s)
+                lag = (time.monotonic() - t_enq) * 1000.0
+                self.sent += 1
+                self.last_lag_ms = lag
+                if lag > self.max_lag_ms:
+                    self.max_lag_ms = lag
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # envio falhou ou passou do timeout: cliente lento/morto
+            on_dead(self)
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = True
+        self._wake.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "policy": self.policy,
+            "format": self.fmt,
+            "subscription": describe(self.sub_key),
+            "queued": self.qsize(),
+            "queue_max": self.queue_max,
+            "lag_ms": round(self.oldest_age_ms(), 3),
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "connected_s": round(time.time() - self.connected_at, 1),
+        }
+
+class FanOut:
+    """Conjunto de clientes do `/ws` e publicação não bloqueante."""
+
+    def __init__(self, queue_max: int, policy: str, send_timeout_s: float, keyframe_every: int = 50) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"política de overflow inválida: {policy} (use {', '.join(POLICIES)})")
+        self.queue_max = queue_max
+        self.policy = policy
+        self.send_timeout_s = send_timeout_s
+        self.keyframe_every = keyframe_every
+        self._clients: Dict[int, WSClient] = {}
+        self._groups: Dict[SubKey, SubGroup] = {}
+        self.published = 0
+        self.disconnected_slow = 0
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def connect(self, ws: WebSocket, fmt: str = "json") -> WSClient:
+        """Aceita a conexão no formato `fmt` (ver `wsframe.FORMATS`; validado pelo chamador)."""
+        await ws.accept()
+        client = WSClient(ws, self.queue_max, self.policy, self.send_timeout_s, fmt)
+        self._clients[client.id] = client
+        self._join(client, client.sub_key)
+        if fmt != "json":
+            client.enqueue_ctrl(self._hello(client))
+        client.start(self._drop_slow)
+        return client
+
+    def _hello(self, client: WSClient) -> str:
+        mask = self._groups[client.sub_key].mask
+        return wsframe.hello_frame(client.fmt, mask, settings.VMAX_MPS, self.keyframe_every)
+
+    async def disconnect(self, client: WSClient) -> None:
+        if self._clients.pop(client.id, None) is not None:
+            self._leave(client)
+        await client.close()
+
+    def _drop_slow(self, client: WSClient) -> None:
+        if self._clients.pop(client.id, None) is not None:
+            self._leave(client)
+            self.disconnected_slow += 1
+            asyncio.ensure_future(client.close(code=1013))
+
+    # --- assinaturas --------------------------------------------------------
+    def _join(self, client: WSClient, key: SubKey) -> None:
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = SubGroup(key, self._emit, self.keyframe_every)
+        group.add(client.id)
+        client.sub_key = key
+
+    def _leave(self, client: WSClient) -> None:
+        group = self._groups.get(client.sub_key)
+        if group is None:
+            return
+        group.client_ids.discard(client.id)
+        if not group.client_ids:
+            group.close()
+            del self._groups[client.sub_key]
+
+    def subscribe(self, client: WSClient, key: SubKey) -> None:
+        if client.id not in self._clients or key == client.sub_key:
+            return
+        self._leave(client)
+        self._join(client, key)
+        # o que já estava na fila segue a assinatura (e, em bin/delta, a máscara do hello) anterior
+        client.clear_data()
+
+    def handle_message(self, client: WSClient, text: str) -> None:
+        """Trata uma mensagem do cliente (`subscribe`/`unsubscribe`) e responde na fila dele."""
+        try:
+            key = parse_subscription(json.loads(text), client.fmt)
+        except ValueError as e:  # inclui JSONDecodeError
+            replies = [error_frame(str(e))]
+        else:
+            self.subscribe(client, key)
+            replies = [ack_frame(key)]
+            if client.fmt != "json" and client.id in self._clients:
+                replies.append(self._hello(client))
+        for reply in replies:
+            if not client.enqueue_ctrl(reply):
+                self._drop_slow(client)
+                return
+
+    def _emit(self, group: SubGroup, frame: Frame, src: str) -> None:
+        for cid in list(group.client_ids):
+            client = self._clients.get(cid)
+            if client is None or client.closed:
+                continue
+            lost = client.dropped + client.coalesced
+            if not client.enqueue(frame, src):
+                self._drop_slow(client)
+            elif group.fmt == "delta" and client.dropped + client.coalesced != lost:
+                # o cliente perdeu um frame: o próximo de cada src sai como keyframe
+                group.resync()
+
+    def publish(self, doc: Dict[str, Any], text: Optional[str] = None) -> None:
+        """Enfileira um documento para todos os clientes (codificado uma única vez)."""
+        self.publish_many([doc], [text] if text is not None else None)
+
+    def publish_many(self, docs: List[Dict[str, Any]], texts: Optional[Iterable[str]] = None) -> None:
+        """`texts`, se vier, é o JSON já pronto de cada doc (ex.: `doc_json`)."""
+        if not self._clients or not docs:
+            return
+        text_list = list(texts) if texts is not None else [None] * len(docs)
+        groups = list(self._groups.values())
+        for doc, text in zip(docs, text_list):
+            cache: Dict[Any, Frame] = {}
+            for group in groups:
+                group.offer(doc, text, cache)
+            self.published += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "policy": self.policy,
+            "queue_max": self.queue_max,
+            "published": self.published,
+            "disconnected_slow": self.disconnected_slow,
+            "subscriptions": [g.stats() for g in self._groups.values()],
+            "per_client": [c.stats() for c in self._clients.values()],
+        }
+
+ws_fanout = FanOut(
+    queue_max=settings.WS_QUEUE_MAX,
+    policy=settings.WS_OVERFLOW_POLICY,
+    send_timeout_s=settings.WS_SEND_TIMEOUT_S,
+    keyframe_every=settings.WS_DELTA_KEYFRAME_EVERY,
+)
@@ -0,0 +1,172 @@
+
+"""Escritor em lote (group commit) da ingestão de telemetria.
+
+Produtores (MQTT, HTTP) chamam `submit`, que deriva a amostra e a coloca numa
+fila limitada. Uma única thread drena a fila e grava `telemetry_raw` +
+`telemetry` em lotes (por tamanho ou prazo máximo) com um commit por lote.
+Cada `submit` devolve um Future resolvido com o documento processado somente
+depois que o lote que contém a amostra foi commitado; o mesmo vale para o
+callback `on_commit(procs, tel_rows)` (usado para o broadcast no WebSocket), que
+recebe os documentos processados e as linhas de `telemetry` gravadas (com o
+JSON já serializado de cada um em `doc_json`).
+
+`submit_many` enfileira um bloco inteiro (`/ingest/bulk`) como um item só:
+ele é gravado atomicamente, no lote que o contém, e ocupa uma vaga da fila.
+Assim a ingestão HTTP/MQTT inteira usa a conexão de escrita só por esta
+thread; manutenção (selagem, retenção, rollups) e `rederive` ainda a disputam,
+em transações curtas, e quem espera além de `pool_timeout` recebe
+`sqlalchemy.exc.TimeoutError` (a API responde 503).
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.latest_cache import latest_cache
+from app.core.live_stats import live_stats
+from app.crud.telemetry import build_rows, insert_rows, _now_ms
+from app.schemas.telemetry import TelemetryIn
+
+# (linhas brutas, linhas de telemetry, documentos, future, bloco?) — amostra avulsa: listas de 1
+_Item = Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]], Future, bool]
+_Rows = Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]
+
+class IngestQueueFull(Exception):
+    """Fila de ingestão cheia (backpressure): o produtor deve desacelerar."""
+
+class IngestWriter:
+    def __init__(
+        self,
+        bind: Engine,
+        batch_max: int = 256,
+        flush_ms: int = 50,
+        queue_max: int = 10000,
+        on_commit: Optional[Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]] = None,
+    ) -> None:
+        self._engine = bind
+        self.batch_max = max(1, int(batch_max))
+        self.flush_s = max(0, int(flush_ms)) / 1000.0
+        self._q: "queue.Queue[_Item]" = queue.Queue(maxsize=max(1, int(queue_max)))
+        self.on_commit = on_commit
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def qsize(self) -> int:
+        return self._q.qsize()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Sinaliza parada; a thread grava o que restou na fila antes de sair."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(
+        self,
+        payload: TelemetryIn,
+        timeout: Optional[float] = None,
+        raw: Optional[Union[bytes, str]] = None,
+    ) -> "Future[Dict[str, Any]]":
+        """Deriva e enfileira uma amostra (`raw`: bytes recebidos, guardados verbatim).
+
+        Bloqueia até `timeout` segundos se a fila estiver cheia (None = espera
+        indefinidamente) e então levanta `IngestQueueFull`.
+        """
+        return self.submit_rows(build_rows(payload, _now_ms(), raw), timeout)
+
+    def submit_rows(self, rows: _Rows, timeout: Optional[float] = None) -> "Future[Dict[str, Any]]":
+        """Enfileira linhas já montadas por `build_rows` (derivação feita pelo chamador).
+
+        Mesma semântica de fila cheia de `submit`; `timeout=0` não bloqueia.
+        """
+        raw_row, tel_row, proc = rows
+        return self._put(([raw_row], [tel_row], [proc]), False, timeout)
+
+    def submit_many(self, rows: List[_Rows], timeout: Optional[float] = None) -> "Future[List[Dict[str, Any]]]":
+        """Enfileira um bloco de `build_rows`, gravado numa transação só; o Future
+        devolve a lista de documentos. Mesma semântica de fila cheia de `submit`."""
+        raw_rows, tel_rows, procs = (list(c) for c in zip(*rows)) if rows else ([], [], [])
+        return self._put((raw_rows, tel_rows, procs), True, timeout)
+
+    def _put(self, lists: Tuple[List[Dict[str, Any]], ...], many: bool, timeout: Optional[float]) -> Future:
+        fut: Future = Future()
+        try:
+            self._q.put((*lists, fut, many), timeout=timeout)
+        except queue.Full:
+            raise IngestQueueFull(f"fila de ingestão cheia ({self._q.maxsize})") from None
+        return fut
+
+    # ------------------------------------------------------------------
+    def _collect(self) -> List[_Item]:
+        try:
+            first = self._q.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        n = len(first[1])  # linhas, não itens: um bloco conta pelo tamanho
+        deadline = time.monotonic() + self.flush_s
+        while n < self.batch_max:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    item = self._q.get_nowait()
+                else:
+                    item = self._q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            n += len(item[1])
+        return batch
+
+    def _write(self, batch: List[_Item]) -> None:
+        tel_rows = [r for b in batch for r in b[1]]
+        try:
+            with self._engine.begin() as conn:
+                insert_rows(conn, [r for b in batch for r in b[0]], tel_rows)
+        except Exception as e:
+            print("[api] erro ao gravar lote de ingestão:", e)
+            for *_, fut, _many in batch:
+                fut.set_exception(e)
+            return
+
+        latest_cache.update(tel_rows)
+        procs = [p for b in batch for p in b[2]]
+        live_stats.update(procs)
+        for _, _, item_procs, fut, many in batch:
+            fut.set_result(item_procs if many else item_procs[0])
+        if self.on_commit is not None:
+            try:
+                self.on_commit(procs, tel_rows)
+            except Exception as e:
+                print("[api] erro no callback pós-commit:", e)
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._q.empty()):
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+ingest_writer = IngestWriter(
+    engine,
+    batch_max=settings.INGEST_BATCH_MAX,
+    flush_ms=settings.INGEST_FLUSH_MS,
+    queue_max=settings.INGEST_QUEUE_MAX,
+)
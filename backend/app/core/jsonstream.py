@@ -0,0 +1,155 @@
+
+"""Leitura incremental de corpos JSON grandes (array JSON ou NDJSON).
+
+Consome o corpo em blocos (ex.: `request.stream()`) e emite um item por vez,
+mantendo em memória apenas o item corrente. Cada item é emitido como o seu
+texto JSON original, para o chamador validar (ex.: `model_validate_json`) e
+guardar verbatim. Os limites de cada item do array são achados só pelas
+chaves/colchetes fora de strings, sem decodificar o item (ele é lido uma vez,
+na validação); um item malformado por dentro só é detectado nessa etapa.
+"""
+from __future__ import annotations
+
+import codecs
+import re
+from typing import AsyncIterator, Optional, Tuple
+
+_WS = " \t\r\n"
+_NON_WS = re.compile(r"[^ \t\r\n]")
+_TOKEN = re.compile(r'[{}\[\]"]')
+_STR_TOKEN = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r"[,\] \t\r\n]")
+_CLOSE = {"}": "{", "]": "["}
+
+# Um único item maior que isso é tratado como inválido (evita buffer sem fim)
+MAX_ITEM_BYTES = 1 << 20
+
+class JSONStreamError(ValueError):
+    """Erro estrutural no array JSON (não é possível ressincronizar)."""
+
+def _string_end(buf: str, i: int) -> int:
+    """Fim (exclusivo) da string iniciada antes de `i`; -1 se ainda não chegou."""
+    while True:
+        m = _STR_TOKEN.search(buf, i)
+        if m is None:
+            return -1
+        if m.group() == '"':
+            return m.end()
+        i = m.end() + 1  # pula o caractere escapado
+        if i > len(buf):
+            return -1
+
+def _item_end(buf: str, pos: int, idx: int) -> int:
+    """Fim (exclusivo) do item que começa em `pos`; -1 se o buffer acaba antes."""
+    ch = buf[pos]
+    if ch == '"':
+        return _string_end(buf, pos + 1)
+    if ch not in "{[":
+        m = _SCALAR_END.search(buf, pos)
+        return m.start() if m else -1
+    stack = []
+    i = pos
+    while True:
+        m = _TOKEN.search(buf, i)
+        if m is None:
+            return -1
+        c, i = m.group(), m.end()
+        if c == '"':
+            i = _string_end(buf, i)
+            if i < 0:
+                return -1
+        elif c in "{[":
+            stack.append(c)
+        elif stack.pop() != _CLOSE[c]:
+            raise JSONStreamError(f"item {idx} malformado")
+        elif not stack:
+            return i
+
+async def iter_json_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Gera `(indice, texto_json)` para cada item de um array JSON ou de um NDJSON."""
+    buf = ""
+    pos = 0  # início da parte ainda não consumida de `buf`
+    utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    mode: Optional[str] = None  # "array" | "ndjson"
+    idx = 0
+    eof = False
+    it = chunks.__aiter__()
+
+    async def _more() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        try:
+            chunk = await it.__anext__()
+            text = utf8.decode(chunk)
+        except StopAsyncIteration:
+            eof = True
+            text = utf8.decode(b"", final=True)
+        buf = buf[pos:] + text
+        pos = 0
+        return not eof
+
+    def _skip_ws() -> bool:
+        """Avança `pos` até o próximo caractere útil; False se o buffer acabou."""
+        nonlocal pos
+        m = _NON_WS.search(buf, pos)
+        pos = m.start() if m else len(buf)
+        return m is not None
+
+    while mode is None:
+        if _skip_ws():
+            mode = "array" if buf[pos] == "[" else "ndjson"
+            if mode == "array":
+                pos += 1
+        elif not await _more():
+            return
+
+    if mode == "ndjson":
+        while True:
+            nl = buf.find("\n", pos)
+            if nl < 0:
+                if len(buf) - pos > MAX_ITEM_BYTES:
+                    raise JSONStreamError(f"linha {idx} excede {MAX_ITEM_BYTES} bytes")
+                if await _more():
+                    continue
+                if not _skip_ws():
+                    return
+                nl = len(buf)
+            line = buf[pos:nl].strip(_WS)
+            pos = nl + 1
+            if line:
+                yield idx, line
+                idx += 1
+
+    # mode == "array"
+    expect_value = True
+    after_comma = False
+    while True:
+        if not _skip_ws():
+            if await _more():
+                continue
+            raise JSONStreamError("array JSON incompleto")
+        ch = buf[pos]
+        if ch == "]":
+            if after_comma:
+                raise JSONStreamError(f"vírgula sobrando após o item {idx - 1}")
+            return
+        if not expect_value:
+            if ch != ",":
+                raise JSONStreamError(f"esperado ',' após o item {idx - 1}")
+            pos += 1
+            expect_value = after_comma = True
+            continue
+        if ch == ",":
+            raise JSONStreamError(f"item {idx} vazio")
+        end = _item_end(buf, pos, idx)
+        if end < 0:
+            if len(buf) - pos > MAX_ITEM_BYTES:
+                raise JSONStreamError(f"item {idx} excede {MAX_ITEM_BYTES} bytes")
+            if await _more():
+                continue
+            raise JSONStreamError("array JSON incompleto")
+        item, pos = buf[pos:end], end
+        yield idx, item
+        idx += 1
+        expect_value = after_comma = False
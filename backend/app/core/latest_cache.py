@@ -0,0 +1,70 @@
+
+"""Cache em memória do último documento por `src` (fleet snapshot em O(1)).
+
+Atualizado depois de cada commit de ingestão; aquecido a partir de
+`telemetry_latest` na subida. Guarda o `doc_json` pronto para ser devolvido
+sem re-serializar, e o snapshot da frota já montado até a próxima mudança.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import json
+
+class LatestCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # src -> (ts, updated_at, doc_json)
+        self._items: Dict[str, Tuple[int, int, str]] = {}
+        self._snapshot: Optional[str] = None
+        self.loaded = False
+
+    def load(self, rows: List[Any]) -> None:
+        with self._lock:
+            for src, ts, updated_at, doc in rows:
+                self._put(src or "", int(ts), int(updated_at), doc)
+            self._snapshot = None
+            self.loaded = True
+
+    def update(self, tel_rows: List[Dict[str, Any]]) -> None:
+        """Recebe linhas de `telemetry` já commitadas."""
+        if not tel_rows:
+            return
+        with self._lock:
+            for r in tel_rows:
+                self._put(r.get("src") or "", int(r["ts"]), int(r["updated_at"]), r["doc_json"])
+            self._snapshot = None
+
+    def _put(self, src: str, ts: int, updated_at: int, doc: str) -> None:
+        cur = self._items.get(src)
+        if cur is None or ts >= cur[0]:
+            self._items[src] = (ts, updated_at, doc)
+
+    def get_doc(self, src: str) -> Optional[str]:
+        item = self._items.get(src or "")
+        return item[2] if item else None
+
+    def newest_doc(self) -> Optional[str]:
+        """Doc mais recente entre todas as origens (por updated_at): `/latest` sem `src`."""
+        with self._lock:
+            items = list(self._items.values())
+        if not items:
+            return None
+        return max(items, key=lambda it: it[1])[2]
+
+    def snapshot_json(self) -> str:
+        """Objeto JSON `{src: doc}` montado uma vez por mudança."""
+        snap = self._snapshot
+        if snap is None:
+            with self._lock:
+                if self._snapshot is None:
+                    parts = [f"{json.dumps(src)}:{doc}" for src, (_, _, doc) in sorted(self._items.items())]
+                    self._snapshot = "{" + ",".join(parts) + "}"
+                snap = self._snapshot
+        return snap
+
+    def sources(self) -> List[str]:
+        return sorted(self._items)
+
+latest_cache = LatestCache()
@@ -0,0 +1,193 @@
+"""Estatísticas móveis ao vivo (IMU e tração) por `src`, em memória.
+
+Para cada origem e janela de `LIVE_STATS_WINDOWS_MS` (padrão 1 s, 10 s e
+60 s) guarda média, variância, RMS e pico (maior |valor|) dos sinais de
+`SIGNALS`: aceleração crua, giro em °/s (`spin * scale_dps / 128`, o int8 do
+firmware cobre ±`scale_dps`), `speed_est_mps` e `pwm`.
+
+Cada janela é um anel de `LIVE_STATS_BUCKETS` baldes de `janela / baldes` ms;
+cada balde guarda `n`, soma, soma dos quadrados, mínimo e máximo de cada sinal,
+em `array('d')` de tamanho fixo. Uma amostra cai no balde do seu `ts` (se o
+slot ainda guarda um balde velho, ele é zerado antes): O(1) por amostra e
+memória fixa por origem, sem fila de amostras. A leitura combina os baldes
+ainda dentro da janela, então a janela efetiva anda de balde em balde (cobre
+entre `janela - janela/baldes` e `janela`). Origens além de
+`LIVE_STATS_MAX_SOURCES` descartam a que está há mais tempo sem amostra.
+
+Alimentado com os documentos processados depois de cada commit (como o
+`latest_cache`), inclusive os lotes que chegam de outros workers: cada worker
+tem o mesmo estado e `/telemetry/stats/live` nunca consulta o banco.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+SIGNALS: Tuple[str, ...] = (
+    "accelerationX", "accelerationY", "accelerationZ",
+    "spinX", "spinY", "spinZ",
+    "speed_est_mps", "pwm",
+)
+_NS = len(SIGNALS)
+_INF = float("inf")
+
+def parse_windows(spec: str) -> Tuple[int, ...]:
+    """`"1000,10000,60000"` -> janelas em ms, ordenadas e sem repetição."""
+    out = sorted({int(p) for p in spec.split(",") if p.strip()})
+    if not out or out[0] <= 0:
+        raise ValueError(f"LIVE_STATS_WINDOWS_MS inválido: {spec!r}")
+    return tuple(out)
+
+def sample_values(doc: Dict[str, Any]) -> List[Optional[float]]:
+    """Valores de `SIGNALS` no documento processado (None quando ausente)."""
+    car = doc.get("car") or {}
+    imu = car.get("imu") or {}
+    drive = car.get("drive") or {}
+    out: List[Optional[float]] = [imu.get("accelerationX"), imu.get("accelerationY"), imu.get("accelerationZ")]
+    scale = imu.get("scale_dps")
+    for k in ("spinX", "spinY", "spinZ"):
+        v = imu.get(k)
+        out.append(v * scale / 128.0 if v is not None and scale else None)
+    out.append(drive.get("speed_est_mps"))
+    out.append(drive.get("pwm"))
+    return [float(v) if v is not None else None for v in out]
+
+class _Stream:
+    """Anéis de baldes de uma origem; índice `(janela * baldes + slot) * sinais + sinal`."""
+
+    __slots__ = ("ids", "n", "sum", "sq", "min", "max", "last_ts")
+
+    def __init__(self, slots: int) -> None:
+        self.ids = array("q", [-1]) * slots  # balde (ts // largura) guardado em cada slot
+        cells = slots * _NS
+        self.n = array("d", [0.0]) * cells
+        self.sum = array("d", [0.0]) * cells
+        self.sq = array("d", [0.0]) * cells
+        self.min = array("d", [_INF]) * cells
+        self.max = array("d", [-_INF]) * cells
+        self.last_ts = 0
+
+class LiveStats:
+    def __init__(self, windows_ms: Sequence[int], buckets: int = 10, max_sources: int = 1024) -> None:
+        self.windows_ms = tuple(int(w) for w in windows_ms)
+        self.buckets = max(1, int(buckets))
+        self.widths = tuple(max(1, w // self.buckets) for w in self.windows_ms)
+        self.max_sources = max(1, int(max_sources))
+        self._lock = threading.Lock()
+        self._streams: "OrderedDict[str, _Stream]" = OrderedDict()
+        self.samples = 0
+        self.late = 0  # amostras mais velhas que o balde guardado no slot (descartadas)
+
+    def update(self, docs: Iterable[Dict[str, Any]]) -> None:
+        """Recebe documentos processados já commitados."""
+        with self._lock:
+            for doc in docs:
+                ts = doc.get("ts")
+                if ts is not None:
+                    self._add(doc.get("src") or "", int(ts), sample_values(doc))
+
+    def _stream(self, src: str) -> _Stream:
+        st = self._streams.get(src)
+        if st is None:
+            if len(self._streams) >= self.max_sources:
+                self._streams.popitem(last=False)
+            st = self._streams[src] = _Stream(len(self.windows_ms) * self.buckets)
+        else:
+            self._streams.move_to_end(src)
+        return st
+
+    def _add(self, src: str, ts: int, vals: List[Optional[float]]) -> None:
+        st = self._stream(src)
+        if ts > st.last_ts:
+            st.last_ts = ts
+        self.samples += 1
+        ids, n, sm, sq, mn, mx = st.ids, st.n, st.sum, st.sq, st.min, st.max
+        for w, width in enumerate(self.widths):
+            bid = ts // width
+            slot = w * self.buckets + bid % self.buckets
+            cur = ids[slot]
+            if cur != bid:
+                if cur > bid:
+                    self.late += 1
+                    continue
+                ids[slot] = bid
+                base = slot * _NS
+                for i in range(base, base + _NS):
+                    n[i] = sm[i] = sq[i] = 0.0
+                    mn[i] = _INF
+                    mx[i] = -_INF
+            i = slot * _NS
+            for v in vals:
+                if v is not None:
+                    n[i] += 1.0
+                    sm[i] += v
+                    sq[i] += v * v
+                    if v < mn[i]:
+                        mn[i] = v
+                    if v > mx[i]:
+                        mx[i] = v
+                i += 1
+
+    def snapshot(self, src: str, now_ms: int) -> Optional[Dict[str, Any]]:
+        """Estatísticas de `src` nas janelas que terminam em `now_ms` (None se a origem é desconhecida)."""
+        with self._lock:
+            st = self._streams.get(src or "")
+            if st is None:
+                return None
+            windows: Dict[str, Dict[str, Any]] = {}
+            for w, width in enumerate(self.widths):
+                hi = now_ms // width
+                lo = hi - self.buckets + 1
+                acc = [[0.0, 0.0, 0.0, _INF, -_INF] for _ in range(_NS)]
+                for b in range(self.buckets):
+                    slot = w * self.buckets + b
+                    if not lo <= st.ids[slot] <= hi:
+                        continue
+                    base = slot * _NS
+                    for s in range(_NS):
+                        c = st.n[base + s]
+                        if c:
+                            a = acc[s]
+                            a[0] += c
+                            a[1] += st.sum[base + s]
+                            a[2] += st.sq[base + s]
+                            a[3] = min(a[3], st.min[base + s])
+                            a[4] = max(a[4], st.max[base + s])
+                windows[str(self.windows_ms[w])] = {
+                    name: _summary(*acc[s]) for s, name in enumerate(SIGNALS) if acc[s][0]
+                }
+            return {"src": src, "last_ts": st.last_ts, "windows": windows}
+
+    def sources(self) -> List[str]:
+        with self._lock:
+            return sorted(self._streams)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sources": len(self._streams),
+            "samples": self.samples,
+            "late": self.late,
+            "windows_ms": list(self.windows_ms),
+            "buckets": self.buckets,
+        }
+
+def _summary(n: float, s: float, sq: float, lo: float, hi: float) -> Dict[str, Any]:
+    mean = s / n
+    return {
+        "n": int(n),
+        "mean": mean,
+        "var": max(0.0, sq / n - mean * mean),
+        "rms": math.sqrt(sq / n),
+        "peak": max(abs(lo), abs(hi)),
+    }
+
+live_stats = LiveStats(
+    parse_windows(settings.LIVE_STATS_WINDOWS_MS),
+    buckets=settings.LIVE_STATS_BUCKETS,
+    max_sources=settings.LIVE_STATS_MAX_SOURCES,
+)
@@ -0,0 +1,307 @@
+"""Consumidor MQTT dentro do event loop (paho dirigido por `add_reader`/`add_writer`).
+
+A leitura do socket não faz trabalho pesado: cada mensagem vai para uma fila
+limitada (`MQTT_QUEUE_MAX`); quando ela enche, o socket deixa de ser lido e a
+pressão volta para o broker. Um pool (`MQTT_WORKERS` threads) valida e deriva
+(`TelemetryIn` + `build_rows`) e as linhas são entregues ao escritor em lote na
+ordem de chegada — logo, em ordem por `src`. O pool só tira esse trabalho do
+event loop (que segue lendo o socket e atendendo HTTP): validação e derivação
+seguram o GIL, então mais threads não usam mais núcleos — a vazão de validação
+é a de um núcleo; para escalar, use mais processos (`UVICORN_WORKERS`/brokers).
+
+Com `MQTT_QOS=1` o PUBACK é manual e só sai depois que o lote que contém a
+amostra foi commitado (mensagem inválida também é confirmada, para não voltar).
+Queda de conexão reconecta com backoff exponencial (`MQTT_BACKOFF_*`); a sessão
+é persistente (`MQTT_CLIENT_ID`), então o broker reentrega o que não foi confirmado.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.core.config import settings
+from app.core.ingest import IngestQueueFull, IngestWriter, ingest_writer
+from app.crud.telemetry import build_rows, _now_ms
+from app.schemas.telemetry import TelemetryIn
+
+try:
+    import paho.mqtt.client as mqtt  # type: ignore
+    _HAS_PAHO = True
+except Exception:
+    _HAS_PAHO = False
+
+def _prepare(payload: bytes, ts_recv_ms: int):
+    """Roda no pool: valida e monta as linhas (levanta em payload inválido).
+
+    Segura o GIL: rodar aqui não é paralelo, só deixa o event loop livre.
+    """
+    return build_rows(TelemetryIn.model_validate_json(payload), ts_recv_ms, payload)
+
+class MqttConsumer:
+    def __init__(
+        self,
+        writer: IngestWriter,
+        url: str,
+        topic: str,
+        qos: int = 1,
+        client_id: str = "",
+        workers: int = 2,
+        queue_max: int = 1000,
+        backoff_min_s: float = 0.5,
+        backoff_max_s: float = 30.0,
+    ) -> None:
+        self.writer = writer
+        self.url = url
+        self.topic = topic
+        self.qos = 1 if int(qos) >= 1 else 0
+        self.client_id = client_id
+        self.workers = max(1, int(workers))
+        self.queue_max = max(1, int(queue_max))
+        self.backoff_min_s = backoff_min_s
+        self.backoff_max_s = max(backoff_min_s, backoff_max_s)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Any = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._tasks: list[asyncio.Task] = []
+        self._inbox: "asyncio.Queue[Tuple[Any, int, int]]" = asyncio.Queue()
+        self._ordered: "asyncio.Queue[Tuple[Any, int, asyncio.Future]]" = asyncio.Queue(maxsize=self.workers * 4)
+        self._disconnected = asyncio.Event()
+        self._sock: Any = None
+        self._paused = False
+        # incrementa a cada conexão: PUBACK de uma conexão anterior é descartado
+        self._gen = 0
+        self.connected = False
+        self.received = 0
+        self.invalid = 0
+        self.acked = 0
+        self.failed = 0
+        self.reconnects = 0
+        self.pauses = 0
+
+    # --- ciclo de vida ------------------------------------------------------
+    def start(self) -> bool:
+        """Agenda as tasks no loop atual. Retorna False se o MQTT estiver desabilitado."""
+        if not _HAS_PAHO:
+            print("[api] paho-mqtt não instalado; consumo via MQTT desabilitado.")
+            return False
+        if not self.url or not self.topic:
+            print("[api] MQTT_URL/MQTT_TOPIC_SUB não configurados; consumo via MQTT desabilitado.")
+            return False
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mqtt-worker")
+        self._client = self._make_client()
+        self._tasks = [
+            asyncio.create_task(self._supervise(), name="mqtt-supervisor"),
+            asyncio.create_task(self._misc(), name="mqtt-misc"),
+            asyncio.create_task(self._dispatch(), name="mqtt-dispatch"),
+            asyncio.create_task(self._submit(), name="mqtt-submit"),
+        ]
+        return True
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            try:
+                self._client.disconnect()
+            except Exception:
+                pass
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _make_client(self):
+        u = urlparse(self.url)
+        self._host, self._port = u.hostname or "localhost", u.port or 1883
+        client = mqtt.Client(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+            client_id=self.client_id,
+            # sessão persistente só faz sentido com id fixo e QoS 1
+            clean_session=not (self.client_id and self.qos),
+        )
+        if u.username:
+            client.username_pw_set(u.username, u.password or "")
+        client.manual_ack_set(True)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_register_write
+        client.on_socket_unregister_write = self._on_unregister_write
+        return client
+
+    # --- socket no event loop ---------------------------------------------
+    def _in_loop(self, fn, *args) -> None:
+        # `connect()` roda no executor: de lá os callbacks de socket são agendados
+        # no loop; no próprio loop rodam já (o socket pode fechar logo em seguida).
+        if threading.get_ident() == self._loop_thread:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _on_socket_open(self, client, userdata, sock) -> None:
+        self._in_loop(self._attach, sock)
+
+    def _on_socket_close(self, client, userdata, sock) -> None:
+        self._in_loop(self._detach, sock)
+
+    def _on_register_write(self, client, userdata, sock) -> None:
+        self._in_loop(self._loop.add_writer, sock, client.loop_write)
+
+    def _on_unregister_write(self, client, userdata, sock) -> None:
+        self._in_loop(self._loop.remove_writer, sock)
+
+    def _attach(self, sock) -> None:
+        self._sock = sock
+        if not self._paused:
+            self._loop.add_reader(sock, self._client.loop_read)
+
+    def _detach(self, sock) -> None:
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._sock is sock:
+            self._sock = None
+
+    def _pause(self) -> None:
+        if not self._paused:
+            self._paused = True
+            self.pauses += 1
+            if self._sock is not None:
+                self._loop.remove_reader(self._sock)
+
+    def _resume(self) -> None:
+        if self._paused:
+            self._paused = False
+            if self._sock is not None:
+                self._loop.add_reader(self._sock, self._client.loop_read)
+
+    # --- callbacks do paho (no loop) ---------------------------------------
+    def _on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            print(f"[api] MQTT conexão recusada: {reason_code}")
+            self._disconnected.set()
+            return
+        self._gen += 1
+        self.connected = True
+        print(f"[api] MQTT conectado -> subscrevendo '{self.topic}' (qos={self.qos})")
+        client.subscribe(self.topic, qos=self.qos)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties) -> None:
+        self.connected = False
+        self._in_loop(self._disconnected.set)
+
+    def _on_message(self, client, userdata, msg) -> None:
+        self.received += 1
+        self._inbox.put_nowait((msg, _now_ms(), self._gen))
+        if self._inbox.qsize() >= self.queue_max:
+            self._pause()
+
+    def _ack(self, msg, gen: int) -> None:
+        if msg.qos and gen == self._gen and self.connected:
+            self._client.ack(msg.mid, msg.qos)
+            self.acked += 1
+
+    # --- tasks ----------------------------------------------------------------
+    async def _supervise(self) -> None:
+        """Conecta e reconecta com backoff exponencial (com jitter)."""
+        backoff = self.backoff_min_s
+        first = True
+        while True:
+            self._disconnected.clear()
+            gen = self._gen
+            try:
+                fn = self._client.connect if first else self._client.reconnect
+                args = (self._host, self._port, 30) if first else ()
+                await self._loop.run_in_executor(None, fn, *args)
+                first = False
+                print(f"[api] Consumindo MQTT em mqtt://{self._host}:{self._port} topic='{self.topic}'")
+                await self._disconnected.wait()
+                if self._gen != gen:
+                    # chegou a conectar: recomeça o backoff do mínimo
+                    backoff = self.backoff_min_s
+                print(f"[api] MQTT desconectado; nova tentativa em {backoff:.1f}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[api] MQTT falha ao conectar ({e}); nova tentativa em {backoff:.1f}s")
+            self.reconnects += 1
+            await asyncio.sleep(backoff * (0.5 + random.random() / 2))
+            backoff = min(self.backoff_max_s, backoff * 2)
+
+    async def _misc(self) -> None:
+        """Keepalive/timeouts do paho."""
+        while True:
+            await asyncio.sleep(1.0)
+            if self._sock is not None:
+                self._client.loop_misc()
+
+    async def _dispatch(self) -> None:
+        """Tira da fila de recepção e dispara validação/derivação no pool, em ordem."""
+        while True:
+            msg, ts_recv, gen = await self._inbox.get()
+            if self._paused and self._inbox.qsize() <= self.queue_max // 2:
+                self._resume()
+            fut = self._loop.run_in_executor(self._pool, _prepare, msg.payload, ts_recv)
+            # fila limitada: no máximo `workers * 4` mensagens em voo no pool
+            await self._ordered.put((msg, gen, fut))
+
+    async def _submit(self) -> None:
+        """Entrega ao escritor na ordem de chegada e confirma após o commit."""
+        while True:
+            msg, gen, fut = await self._ordered.get()
+            try:
+                rows = await fut
+            except Exception as e:
+                self.invalid += 1
+                print("[api] MQTT mensagem inválida:", e)
+                self._ack(msg, gen)
+                continue
+            try:
+                done = self.writer.submit_rows(rows, timeout=0)
+            except IngestQueueFull:
+                # escritor atrasado: espera fora do loop; a ordem se mantém porque
+                # esta task só pega a próxima mensagem depois
+                done = await self._loop.run_in_executor(None, self.writer.submit_rows, rows, None)
+            done.add_done_callback(lambda f, m=msg, g=gen: self._loop.call_soon_threadsafe(self._committed, f, m, g))
+
+    def _committed(self, fut: "Future[Dict[str, Any]]", msg, gen: int) -> None:
+        if fut.exception() is not None:
+            # sem PUBACK: o broker reentrega na próxima sessão
+            self.failed += 1
+            return
+        self._ack(msg, gen)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "qos": self.qos,
+            "queued": self._inbox.qsize(),
+            "in_flight": self._ordered.qsize(),
+            "paused": self._paused,
+            "received": self.received,
+            "invalid": self.invalid,
+            "acked": self.acked,
+            "failed": self.failed,
+            "reconnects": self.reconnects,
+            "pauses": self.pauses,
+        }
+
+mqtt_consumer = MqttConsumer(
+    ingest_writer,
+    url=settings.MQTT_URL,
+    topic=settings.MQTT_TOPIC_SUB,
+    qos=settings.MQTT_QOS,
+    client_id=settings.MQTT_CLIENT_ID,
+    workers=settings.MQTT_WORKERS,
+    queue_max=settings.MQTT_QUEUE_MAX,
+    backoff_min_s=settings.MQTT_BACKOFF_MIN_S,
+    backoff_max_s=settings.MQTT_BACKOFF_MAX_S,
+)
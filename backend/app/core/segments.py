@@ -0,0 +1,281 @@
+"""Arquivos de segmento colunar (camada fria da telemetria).
+
+Um segmento guarda as linhas de uma `src` numa janela de tempo, coluna a coluna:
+
+    b"TSEG" | u32 versão | u32 len(header) | header JSON | colunas (alinhadas a 8 bytes)
+
+Codificações de coluna (`enc` no header):
+
+- `delta`: inteiros em ordem (ts, id) como varint zigzag da diferença para o anterior;
+- `zz`: inteiros como varint zigzag (ex.: `updated_at - ts`);
+- `int`: array tipado (`b`/`h`/`i`/`q`, o menor que cabe) + bitmap de nulos;
+- `float`: como `int`, mas com `scale`: se todos os valores são `k / scale`
+  exatos (1, 10², ... 10⁷) guarda o inteiro `k`; senão `d` (float64) puro;
+- `bool`: bitmap.
+
+O header traz também `meta` (livre, do chamador) e `extras`: um mapa
+`{índice: texto}` comprimido com zlib. Os arrays tipados são lidos direto do
+`mmap` (`memoryview.cast`), sem cópia até a conversão final em lista; em
+máquinas big-endian passam por `array` + `byteswap()` (o arquivo é sempre `<`).
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+MAGIC = b"TSEG"
+VERSION = 1
+_PREFIX = struct.Struct("<4sII")
+_SWAP = sys.byteorder != "little"
+
+_INT_CODES = (("b", -(1 << 7), (1 << 7) - 1), ("h", -(1 << 15), (1 << 15) - 1),
+              ("i", -(1 << 31), (1 << 31) - 1), ("q", -(1 << 63), (1 << 63) - 1))
+_SCALES = (1, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# --- varint ---------------------------------------------------------------------
+def _zz(v: int) -> int:
+    return (v << 1) ^ (v >> 63)
+
+def _unzz(u: int) -> int:
+    return (u >> 1) ^ -(u & 1)
+
+def _put_varints(values: Sequence[int]) -> bytes:
+    out = bytearray()
+    for v in values:
+        u = _zz(int(v))
+        while u > 0x7F:
+            out.append((u & 0x7F) | 0x80)
+            u >>= 7
+        out.append(u)
+    return bytes(out)
+
+def _get_varints(buf, n: int) -> List[int]:
+    out: List[int] = []
+    append = out.append
+    u = shift = 0
+    for b in buf:
+        u |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+            continue
+        append((u >> 1) ^ -(u & 1))
+        u = shift = 0
+        if len(out) == n:
+            break
+    return out
+
+# --- bitmaps ----------------------------------------------------------------------
+def _bitmap(flags: Sequence[bool]) -> bytes:
+    out = bytearray((len(flags) + 7) // 8)
+    for i, f in enumerate(flags):
+        if f:
+            out[i >> 3] |= 1 << (i & 7)
+    return bytes(out)
+
+def _typed(buf, code: str) -> List[Any]:
+    """Array little-endian do arquivo como lista (sem cópia na ordem nativa `<`)."""
+    if not _SWAP:
+        return buf.cast(code).tolist()
+    arr = array(code, bytes(buf))
+    arr.byteswap()
+    return arr.tolist()
+
+def _unbitmap(buf, n: int) -> List[bool]:
+    return [bool(buf[i >> 3] >> (i & 7) & 1) for i in range(n)]
+
+# --- escrita ------------------------------------------------------------------------
+def _int_code(lo: int, hi: int) -> str:
+    for code, mn, mx in _INT_CODES:
+        if mn <= lo and hi <= mx:
+            return code
+    raise OverflowError(f"inteiro fora de 64 bits: {lo}..{hi}")
+
+def _float_scale(values: Sequence[float]) -> Optional[int]:
+    """Menor escala em que todos os valores são inteiros exatos (None se nenhuma)."""
+    for scale in _SCALES:
+        ok = True
+        for v in values:
+            k = round(v * scale)
+            if abs(k) >= 1 << 53 or k / scale != v:
+                ok = False
+                break
+        if ok:
+            return scale
+    return None
+
+def _encode_column(enc: str, values: Sequence[Any]) -> Tuple[Dict[str, Any], List[bytes]]:
+    """Retorna (descrição da coluna, blobs [dados, nulos?])."""
+    if enc == "delta":
+        prev, deltas = 0, []
+        for v in values:
+            deltas.append(int(v) - prev)
+            prev = int(v)
+        return {"enc": enc}, [_put_varints(deltas)]
+    if enc == "zz":
+        return {"enc": enc}, [_put_varints(values)]
+    if enc == "bool":
+        return {"enc": enc}, [_bitmap([bool(v) for v in values])]
+    if enc not in ("int", "float"):
+        raise ValueError(f"codificação desconhecida: {enc}")
+
+    present = [v is not None for v in values]
+    got = [v for v in values if v is not None]
+    desc: Dict[str, Any] = {"enc": enc}
+    if enc == "float":
+        scale = _float_scale(got)
+        if scale is None:
+            desc["code"] = "d"
+            data = [float(v) if v is not None else 0.0 for v in values]
+        else:
+            desc["scale"] = scale
+            data = [round(v * scale) if v is not None else 0 for v in values]
+    else:
+        data = [int(v) if v is not None else 0 for v in values]
+    if "code" not in desc:
+        desc["code"] = _int_code(min(data, default=0), max(data, default=0))
+    blobs = [struct.pack(f"<{len(data)}{desc['code']}", *data)]
+    if not all(present):
+        blobs.append(_bitmap(present))
+    return desc, blobs
+
+def write_segment(
+    path: str,
+    meta: Dict[str, Any],
+    n: int,
+    columns: Dict[str, Tuple[str, Sequence[Any]]],
+    extras: Optional[Dict[int, str]] = None,
+) -> int:
+    """Grava o segmento de forma atômica (arquivo temporário + `os.replace`). Retorna o tamanho."""
+    body = bytearray()
+    descs: Dict[str, Any] = {}
+
+    def put(blob: bytes) -> Tuple[int, int]:
+        body.extend(b"\0" * (-len(body) % 8))
+        off = len(body)
+        body.extend(blob)
+        return off, len(blob)
+
+    for name, (enc, values) in columns.items():
+        if len(values) != n:
+            raise ValueError(f"coluna {name}: {len(values)} valores, esperado {n}")
+        desc, blobs = _encode_column(enc, values)
+        desc["off"], desc["len"] = put(blobs[0])
+        if len(blobs) > 1:
+            desc["nulls"] = put(blobs[1])
+        descs[name] = desc
+    header: Dict[str, Any] = {"n": n, "meta": meta, "columns": descs}
+    if extras:
+        header["extras"] = put(zlib.compress(json.dumps({str(k): v for k, v in extras.items()}).encode("utf-8")))
+
+    hdr = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    hdr += b" " * (-(len(hdr) + _PREFIX.size) % 8)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as fh:
+        fh.write(_PREFIX.pack(MAGIC, VERSION, len(hdr)))
+        fh.write(hdr)
+        fh.write(body)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    return _PREFIX.size + len(hdr) + len(body)
+
+# --- leitura -------------------------------------------------------------------------
+class Segment:
+    """Segmento aberto via mmap; colunas decodificadas sob demanda (e guardadas)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, hlen = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"segmento inválido: {path}")
+        header = json.loads(bytes(self._mm[_PREFIX.size:_PREFIX.size + hlen]))
+        self._base = _PREFIX.size + hlen
+        self.n: int = header["n"]
+        self.meta: Dict[str, Any] = header["meta"]
+        self._columns: Dict[str, Dict[str, Any]] = header["columns"]
+        self._extras_at = header.get("extras")
+        self._cache: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def _view(self, off_len: Sequence[int]) -> memoryview:
+        off, length = off_len
+        return memoryview(self._mm)[self._base + off:self._base + off + length]
+
+    def has(self, name: str) -> bool:
+        return name in self._columns
+
+    def column(self, name: str) -> List[Any]:
+        """Valores da coluna (None nos nulos), como lista."""
+        col = self._cache.get(name)
+        if col is None:
+            with self._lock:
+                col = self._cache.get(name)
+                if col is None:
+                    col = self._cache[name] = self._decode(self._columns[name])
+        return col
+
+    def read(self, name: str) -> List[Any]:
+        """Como `column`, sem guardar no cache (varreduras longas, ex.: export)."""
+        col = self._cache.get(name)
+        return col if col is not None else self._decode(self._columns[name])
+
+    def _decode(self, desc: Dict[str, Any]) -> List[Any]:
+        enc, n = desc["enc"], self.n
+        raw = self._view((desc["off"], desc["len"]))
+        if enc == "delta":
+            acc, out = 0, []
+            for d in _get_varints(raw, n):
+                acc += d
+                out.append(acc)
+            return out
+        if enc == "zz":
+            return _get_varints(raw, n)
+        if enc == "bool":
+            return _unbitmap(raw, n)
+        values = _typed(raw, desc["code"]) if n else []
+        scale = desc.get("scale")
+        if scale is not None:
+            values = [k / scale for k in values]
+        if "nulls" in desc:
+            present = _unbitmap(self._view(desc["nulls"]), n)
+            values = [v if p else None for v, p in zip(values, present)]
+        return values
+
+    def extras(self) -> Dict[int, str]:
+        if not self._extras_at:
+            return {}
+        data = json.loads(zlib.decompress(bytes(self._view(self._extras_at))))
+        return {int(k): v for k, v in data.items()}
+
+    def close(self) -> None:
+        self._cache.clear()
+        self._mm.close()
+
+_open_lock = threading.Lock()
+_open: Dict[str, Tuple[Tuple[int, int], Segment]] = {}
+
+def open_segment(path: str) -> Segment:
+    """Segmento aberto e reaproveitado enquanto o arquivo não muda (mtime/tamanho)."""
+    st = os.stat(path)
+    sig = (st.st_mtime_ns, st.st_size)
+    with _open_lock:
+        hit = _open.get(path)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        seg = Segment(path)
+        _open[path] = (sig, seg)
+        # o mmap antigo continua válido para quem ainda o usa; sai quando for coletado
+        return seg
+
+def forget(path: str) -> None:
+    with _open_lock:
+        _open.pop(path, None)
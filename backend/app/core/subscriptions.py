@@ -0,0 +1,262 @@
+"""Assinaturas do `/ws`: filtro por `src`, projeção de campos e limite de taxa.
+
+O cliente manda, a qualquer momento, uma mensagem JSON:
+
+    {"type": "subscribe", "src": ["carro-1"], "fields": ["car.gps"], "max_hz": 1, "stats": true}
+
+- `src`: string ou lista de origens (ausente/null = todas);
+- `fields`: caminhos com ponto dentro do documento processado (`_derive`);
+  `ts` e `src` vão sempre junto (ausente/null = documento inteiro);
+- `max_hz` ou `interval_ms`: no máximo um frame por `src` a cada intervalo;
+  o que chega no meio é coalescido e o mais recente sai no fim do intervalo;
+- `stats`: `true` acrescenta ao frame a chave `stats` com as estatísticas
+  móveis da `src` até o `ts` do frame (`app/core/live_stats.py`; só `json`).
+
+`{"type": "unsubscribe"}` volta ao padrão (tudo, sem limite).
+
+O formato do frame (`json`, `bin`, `delta`; ver `app/core/wsframe.py`) é
+escolhido na conexão e faz parte da assinatura; em `bin`/`delta` a projeção
+vira a máscara de campos do frame.
+
+Clientes com a mesma assinatura formam um grupo: o filtro, o limite de taxa e a
+projeção (incluindo a codificação) são feitos uma vez por grupo, não por cliente.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple, Union
+
+from app.core import wsframe
+from app.core.live_stats import live_stats
+
+# Chaves de topo do documento processado (ver `_derive`)
+DOC_KEYS = ("ts", "ts_iso", "ts_local", "src", "car", "centric")
+MAX_FIELDS = 32
+
+# (srcs ordenadas ou None, caminhos ou None, intervalo em ms, formato, estatísticas móveis)
+SubKey = Tuple[Optional[Tuple[str, ...]], Optional[Tuple[Tuple[str, ...], ...]], int, str, bool]
+Frame = Union[str, bytes]
+
+def default_key(fmt: str = "json") -> SubKey:
+    """Assinatura inicial: tudo, sem limite de taxa."""
+    return (None, None, 0, fmt, False)
+
+def _encode(doc: Dict[str, Any]) -> str:
+    """Mesmo formato de `WebSocket.send_json` (e de `doc_json`)."""
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+def parse_subscription(msg: Any, fmt: str = "json") -> SubKey:
+    """Valida a mensagem `subscribe` e devolve a chave canônica. Levanta ValueError."""
+    if not isinstance(msg, dict):
+        raise ValueError("mensagem deve ser um objeto JSON")
+    kind = msg.get("type")
+    if kind == "unsubscribe":
+        return default_key(fmt)
+    if kind != "subscribe":
+        raise ValueError("type deve ser 'subscribe' ou 'unsubscribe'")
+
+    src = msg.get("src")
+    srcs: Optional[Tuple[str, ...]] = None
+    if src is not None:
+        if isinstance(src, str):
+            src = [src]
+        if not isinstance(src, list) or not src or not all(isinstance(s, str) for s in src):
+            raise ValueError("src deve ser uma string ou lista de strings")
+        srcs = tuple(sorted(set(src)))
+
+    fields = msg.get("fields")
+    paths: Optional[Tuple[Tuple[str, ...], ...]] = None
+    if fields is not None:
+        if not isinstance(fields, list) or not fields or len(fields) > MAX_FIELDS:
+            raise ValueError(f"fields deve ser uma lista com 1 a {MAX_FIELDS} caminhos")
+        out = set()
+        for f in fields:
+            parts = tuple(f.split(".")) if isinstance(f, str) else ()
+            if not parts or not all(parts) or parts[0] not in DOC_KEYS:
+                raise ValueError(f"campo inválido: {f!r} (caminhos começam em {', '.join(DOC_KEYS)})")
+            out.add(parts)
+        # um caminho que já está coberto por um prefixo é redundante
+        paths = tuple(sorted(p for p in out if not any(q != p and p[: len(q)] == q for q in out)))
+
+    interval_ms = 0
+    if msg.get("max_hz") is not None:
+        hz = msg["max_hz"]
+        if not isinstance(hz, (int, float)) or isinstance(hz, bool) or hz <= 0:
+            raise ValueError("max_hz deve ser um número > 0")
+        interval_ms = int(round(1000.0 / hz))
+    elif msg.get("interval_ms") is not None:
+        iv = msg["interval_ms"]
+        if not isinstance(iv, int) or isinstance(iv, bool) or iv < 0:
+            raise ValueError("interval_ms deve ser um inteiro >= 0")
+        interval_ms = iv
+
+    stats = msg.get("stats", False)
+    if not isinstance(stats, bool):
+        raise ValueError("stats deve ser true ou false")
+    if stats and fmt != "json":
+        raise ValueError("stats só vale no formato json")
+    return (srcs, paths, interval_ms, fmt, stats)
+
+def describe(key: SubKey) -> Dict[str, Any]:
+    srcs, paths, interval_ms, fmt, stats = key
+    return {
+        "src": list(srcs) if srcs is not None else None,
+        "fields": [".".join(p) for p in paths] if paths is not None else None,
+        "interval_ms": interval_ms,
+        "format": fmt,
+        "stats": stats,
+    }
+
+def project(doc: Dict[str, Any], paths: Tuple[Tuple[str, ...], ...]) -> Dict[str, Any]:
+    """Recorta `doc` nos caminhos pedidos, mantendo o aninhamento. Caminho ausente é omitido."""
+    out: Dict[str, Any] = {"ts": doc.get("ts"), "src": doc.get("src")}
+    for path in paths:
+        cur: Any = doc
+        for part in path:
+            if not isinstance(cur, dict) or part not in cur:
+                break
+            cur = cur[part]
+        else:
+            dst = out
+            for part in path[:-1]:
+                nxt = dst.get(part)
+                if not isinstance(nxt, dict):
+                    nxt = dst[part] = {}
+                dst = nxt
+            dst[path[-1]] = cur
+    return out
+
+def _with_stats(frame: str, doc: Dict[str, Any]) -> str:
+    """Acrescenta `"stats": {janela_ms: {sinal: {...}}}` ao objeto JSON do frame, sem re-serializá-lo."""
+    snap = live_stats.snapshot(doc.get("src") or "", int(doc.get("ts") or 0))
+    return f'{frame[:-1]},"stats":{_encode(snap["windows"] if snap else {})}}}'
+
+class SubGroup:
+    """Clientes com a mesma assinatura; decide o que sai e monta o frame uma vez."""
+
+    def __init__(self, key: SubKey, emit: Callable[["SubGroup", Frame, str], None], keyframe_every: int = 50) -> None:
+        self.key = key
+        self.srcs = frozenset(key[0]) if key[0] is not None else None
+        self.paths = key[1]
+        self.interval_s = key[2] / 1000.0
+        self.fmt = key[3]
+        self.with_stats = key[4]
+        self.mask = wsframe.field_mask(self.paths)
+        self.keyframe_every = max(1, keyframe_every)
+        self.client_ids: Set[int] = set()
+        self._emit = emit
+        # por src: instante do último frame, doc pendente e timer de flush
+        self._last: Dict[str, float] = {}
+        self._pending: Dict[str, Tuple[Dict[str, Any], Optional[str]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # delta: por src, valores do último frame e frames desde o último keyframe
+        self._prev: Dict[str, wsframe.Values] = {}
+        self._since_key: Dict[str, int] = {}
+        self.frames = 0
+        self.coalesced = 0
+        self.keyframes = 0
+
+    def add(self, client_id: int) -> None:
+        self.client_ids.add(client_id)
+        # quem entra não tem o estado do delta
+        self.resync()
+
+    def resync(self) -> None:
+        """Faz o próximo frame de cada src sair como keyframe."""
+        self._prev.clear()
+
+    def render(self, doc: Dict[str, Any], text: Optional[str], cache: Dict[Any, Frame]) -> Frame:
+        """Frame do doc; `cache` é compartilhado entre grupos para o mesmo doc."""
+        if self.fmt != "json":
+            return self._render_bin(doc, cache)
+        if self.with_stats:
+            ck = ("stats", self.paths)
+            cached = cache.get(ck)
+            if cached is None:
+                cached = cache[ck] = _with_stats(self._render_json(doc, text, cache), doc)
+            return cached
+        return self._render_json(doc, text, cache)
+
+    def _render_json(self, doc: Dict[str, Any], text: Optional[str], cache: Dict[Any, Frame]) -> str:
+        if self.paths is None and text is not None:
+            return text
+        cached = cache.get(self.paths)
+        if cached is None:
+            cached = cache[self.paths] = _encode(doc if self.paths is None else project(doc, self.paths))
+        return cached
+
+    def _render_bin(self, doc: Dict[str, Any], cache: Dict[Any, Frame]) -> bytes:
+        vals = cache.get("vals")
+        if vals is None:
+            vals = cache["vals"] = wsframe.extract(doc)
+        ts, src = int(doc.get("ts") or 0), doc.get("src") or ""
+        if self.fmt == "delta":
+            prev = self._prev.get(src)
+            self._prev[src] = vals
+            n = self._since_key.get(src, 0)
+            if prev is not None and n < self.keyframe_every:
+                frame = wsframe.encode_delta(ts, src, vals, prev, self.mask)
+                if frame is not None:
+                    self._since_key[src] = n + 1
+                    return frame
+            self._since_key[src] = 1
+            self.keyframes += 1
+        # keyframe (e todo frame `bin`) é igual para grupos com a mesma máscara
+        ck = ("key", self.mask)
+        frame = cache.get(ck)
+        if frame is None:
+            frame = cache[ck] = wsframe.encode_key(ts, src, vals, self.mask)
+        return frame
+
+    def offer(self, doc: Dict[str, Any], text: Optional[str], cache: Dict[Any, Frame]) -> None:
+        src = doc.get("src") or ""
+        if self.srcs is not None and src not in self.srcs:
+            return
+        if self.interval_s <= 0:
+            self._send(src, self.render(doc, text, cache))
+            return
+        now = time.monotonic()
+        if src in self._pending:
+            self._pending[src] = (doc, text)
+            self.coalesced += 1
+            return
+        wait = self._last.get(src, float("-inf")) + self.interval_s - now
+        if wait <= 0:
+            self._last[src] = now
+            self._send(src, self.render(doc, text, cache))
+            return
+        # dentro do intervalo: guarda o mais recente e agenda a saída no fim dele
+        self._pending[src] = (doc, text)
+        self._timers[src] = asyncio.get_running_loop().call_later(wait, self._flush, src)
+
+    def _flush(self, src: str) -> None:
+        self._timers.pop(src, None)
+        item = self._pending.pop(src, None)
+        if item is None or not self.client_ids:
+            return
+        self._last[src] = time.monotonic()
+        self._send(src, self.render(item[0], item[1], {}))
+
+    def _send(self, src: str, frame: Frame) -> None:
+        self.frames += 1
+        self._emit(self, frame, src)
+
+    def close(self) -> None:
+        for h in self._timers.values():
+            h.cancel()
+        self._timers.clear()
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            describe(self.key), clients=len(self.client_ids),
+            frames=self.frames, coalesced=self.coalesced, keyframes=self.keyframes,
+        )
+
+def error_frame(detail: str) -> str:
+    return _encode({"type": "error", "detail": detail})
+
+def ack_frame(key: SubKey) -> str:
+    return _encode({"type": "subscribed", **describe(key)})
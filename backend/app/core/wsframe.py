@@ -0,0 +1,120 @@
+"""Formato binário (e delta) dos frames do `/ws`, negociado na conexão (`/ws?format=`).
+
+- `json` (padrão): o documento processado, como antes;
+- `bin`: struct little-endian com o layout de `TelemetryPacket`
+  (Core/Inc/telemetry_model.h);
+- `delta`: como `bin`, mas só com os campos que mudaram desde o frame anterior
+  da mesma `src`; a cada `WS_DELTA_KEYFRAME_EVERY` frames (e quando um campo
+  some ou um cliente entra no grupo) sai um keyframe completo.
+
+Frame binário:
+
+    u8 kind (1=keyframe, 2=delta) | u8 len(src) | u16 máscara | i64 ts (ms) | src (utf-8) | valores
+
+A máscara tem um bit por campo de `FIELDS` (bit i = FIELDS[i]); os valores
+seguem na ordem dos bits ligados, cada um com o tipo do struct em C. `ts_iso`,
+`ts_local` e `centric.controls.derived` não vão no frame: o cliente calcula a
+partir de `ts`, dos controles e do `vmax_mps` enviado no frame `hello` (JSON).
+Frames de controle (`hello`, `subscribed`, `error`) continuam em texto JSON.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+FORMATS = ("json", "bin", "delta")
+
+KIND_KEY = 1
+KIND_DELTA = 2
+
+# (caminho no documento processado, código struct) — mesma ordem de TelemetryPacket
+FIELDS: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("car", "gps", "latitude"), "f"),
+    (("car", "gps", "longitude"), "f"),
+    (("car", "imu", "accelerationX"), "b"),
+    (("car", "imu", "accelerationY"), "b"),
+    (("car", "imu", "accelerationZ"), "b"),
+    (("car", "imu", "spinX"), "b"),
+    (("car", "imu", "spinY"), "b"),
+    (("car", "imu", "spinZ"), "b"),
+    (("car", "imu", "scale_dps"), "h"),
+    (("car", "drive", "pwm"), "B"),
+    (("car", "drive", "speed_est_mps"), "f"),
+    (("centric", "controls", "curve_direction"), "H"),
+    (("centric", "controls", "speed"), "B"),
+    (("centric", "controls", "movement_direction"), "B"),
+)
+ALL_MASK = (1 << len(FIELDS)) - 1
+
+_HEADER = struct.Struct("<BBHq")
+_INT_RANGE = {"b": (-128, 127), "B": (0, 255), "h": (-32768, 32767), "H": (0, 65535)}
+
+Values = Tuple[Any, ...]
+
+def field_mask(paths: Optional[Sequence[Tuple[str, ...]]]) -> int:
+    """Bits dos campos cobertos pela projeção da assinatura (None = todos)."""
+    if paths is None:
+        return ALL_MASK
+    mask = 0
+    for i, (fpath, _) in enumerate(FIELDS):
+        if any(fpath[: len(p)] == p for p in paths):
+            mask |= 1 << i
+    return mask
+
+def extract(doc: Dict[str, Any]) -> Values:
+    """Valores de `FIELDS` no documento (None quando ausente)."""
+    out = []
+    for path, code in FIELDS:
+        cur: Any = doc
+        for part in path:
+            cur = cur.get(part) if isinstance(cur, dict) else None
+        if cur is not None:
+            rng = _INT_RANGE.get(code)
+            if rng is not None:
+                cur = max(rng[0], min(rng[1], int(cur)))
+            else:
+                cur = float(cur)
+        out.append(cur)
+    return tuple(out)
+
+@lru_cache(maxsize=256)
+def _values_struct(bits: int) -> struct.Struct:
+    return struct.Struct("<" + "".join(code for i, (_, code) in enumerate(FIELDS) if bits >> i & 1))
+
+def _pack(kind: int, ts: int, src: str, bits: int, vals: Values) -> bytes:
+    src_b = src.encode("utf-8")[:255]
+    body = _values_struct(bits).pack(*(v for i, v in enumerate(vals) if bits >> i & 1))
+    return _HEADER.pack(kind, len(src_b), bits, int(ts)) + src_b + body
+
+def encode_key(ts: int, src: str, vals: Values, mask: int = ALL_MASK) -> bytes:
+    bits = 0
+    for i, v in enumerate(vals):
+        if v is not None:
+            bits |= 1 << i
+    return _pack(KIND_KEY, ts, src, bits & mask, vals)
+
+def encode_delta(ts: int, src: str, vals: Values, prev: Values, mask: int = ALL_MASK) -> Optional[bytes]:
+    """Delta contra `prev`; None se algum campo sumiu (o chamador manda keyframe)."""
+    bits = 0
+    for i, (v, p) in enumerate(zip(vals, prev)):
+        if v != p:
+            if v is None:
+                return None
+            bits |= 1 << i
+    return _pack(KIND_DELTA, ts, src, bits & mask, vals)
+
+def hello_frame(fmt: str, mask: int, vmax_mps: float, keyframe_every: int) -> str:
+    """Descrição do layout, enviada em JSON logo após a conexão em `bin`/`delta`."""
+    return json.dumps({
+        "type": "hello",
+        "format": fmt,
+        "header": "<BBHq",
+        "fields": [
+            {"bit": i, "path": ".".join(path), "struct": code}
+            for i, (path, code) in enumerate(FIELDS) if mask >> i & 1
+        ],
+        "vmax_mps": vmax_mps,
+        "keyframe_every": keyframe_every if fmt == "delta" else None,
+    }, separators=(",", ":"))
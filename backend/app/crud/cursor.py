@@ -0,0 +1,18 @@
+
+"""Cursor opaco para paginação por chave (keyset): codifica `(chave, id)`."""
+from __future__ import annotations
+import base64
+from typing import Tuple
+
+def encode_cursor(key: int, row_id: int) -> str:
+    raw = f"{int(key)}:{int(row_id)}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Decodifica um cursor; levanta ValueError se for inválido."""
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        key, row_id = base64.urlsafe_b64decode(cursor + pad).decode("ascii").split(":")
+        return int(key), int(row_id)
+    except Exception:
+        raise ValueError("cursor inválido") from None
@@ -0,0 +1,50 @@
+"""Manutenção periódica do armazenamento: selagem por tempo e retenção.
+
+Uma rodada (`run_maintenance`) sela `telemetry` em segmentos e os períodos
+fechados de `telemetry_raw` em partições, apaga os arquivos inteiros mais
+velhos que `RETENTION_TELEMETRY_MS` / `RETENTION_RAW_MS` (0 = guarda tudo) e
+comprime até `DOC_MIGRATE_BUDGET` linhas antigas ainda em texto puro. Roda só no líder, a cada `ARCHIVE_INTERVAL_S`, ou via
+`python -m app.cli archive` / `expire`.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Dict
+
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.crud.telemetry_archive import expire_segments, seal_archive
+from app.crud.telemetry_compress import migrate_plain
+from app.crud.telemetry_raw_partitions import expire_raw_partitions, seal_raw_partitions
+
+def expire(now_ms=None) -> Dict[str, int]:
+    return {
+        "segments_dropped": expire_segments(settings.RETENTION_TELEMETRY_MS, now_ms=now_ms),
+        "raw_partitions_dropped": expire_raw_partitions(settings.RETENTION_RAW_MS, now_ms=now_ms),
+    }
+
+def run_maintenance(bind: Engine) -> Dict[str, int]:
+    sealed = seal_archive(bind)
+    raw = seal_raw_partitions(bind)
+    migrated = migrate_plain(bind, budget=settings.DOC_MIGRATE_BUDGET)
+    return {
+        "rows_sealed": sealed["rows"],
+        "segments_written": sealed["segments"],
+        "raw_rows_moved": raw["rows"],
+        **expire(),
+        "raw_compressed": migrated["raw"],
+        "doc_compressed": migrated["doc"],
+    }
+
+async def maintenance_loop(bind: Engine, interval_s: float) -> None:
+    """Roda a manutenção fora do event loop (a escrita divide a conexão com o `IngestWriter`)."""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            out = await asyncio.to_thread(run_maintenance, bind)
+        except Exception as e:
+            print(f"[api] falha na manutenção do armazenamento: {e}")
+            continue
+        if any(out.values()):
+            print(f"[api] armazenamento: {out}")
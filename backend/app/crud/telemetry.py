@@ -1,15 +1,29 @@
 
 """CRUD de telemetria: salva bruto + processado, deriva campos e gera datas (formato de tempo ajustado)."""
 from __future__ import annotations
+from sqlalchemy import insert, tuple_
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
-from typing import Optional, List, Tuple, Any, Dict
+from typing import Callable, Optional, List, Tuple, Any, Dict, Union
 from datetime import datetime, timezone
+from functools import lru_cache
 from zoneinfo import ZoneInfo
+import heapq
+import itertools
 import json
+from pydantic import ValidationError
 
-from app.models.telemetry import Telemetry, TelemetryRaw
+from app.models.telemetry import Telemetry, TelemetryLatest, TelemetryRaw
 from app.schemas.telemetry import TelemetryIn
 from app.core.config import settings
+from app.crud.cursor import encode_cursor, decode_cursor
+from app.crud.telemetry_rollup import apply_rollups
+from app.crud.telemetry_sketch import apply_sketches
+from app.crud.telemetry_latest import apply_latest
+from app.crud.trips import apply_trips
+from app.crud.telemetry_archive import archive_store, cold_top
+from app.core.latest_cache import latest_cache
+from app.core.live_stats import live_stats
 
 try:
     _TZ = ZoneInfo(settings.API_TZ)
@@ -24,20 +38,25 @@ def _fmt_offset_with_colon(dt: datetime) -> str:
         return f"{off[:3]}:{off[3:]}"
     return off
 
+@lru_cache(maxsize=8)
+def _iso_second(sec: int) -> Tuple[str, str, str]:
+    """Partes de data/hora de um segundo inteiro (memoizado: amostras do mesmo segundo)."""
+    dt_utc = datetime.fromtimestamp(sec, tz=timezone.utc)
+    dt_loc = dt_utc.astimezone(_TZ)
+    return (
+        dt_utc.strftime("%Y-%m-%dT%H:%M:%S"),
+        dt_loc.strftime("%Y-%m-%d %H:%M:%S"),
+        _fmt_offset_with_colon(dt_loc),
+    )
+
 def _iso_fields(ts_ms: int) -> Tuple[str, str]:
     """Retorna (ts_iso_utc, ts_local) no formato:
     - ts_iso:  YYYY-MM-DDTHH:MM:SS.mmmZ
     - ts_local:YYYY-MM-DD HH:MM:SS.mmm±HH:MM
     """
-    dt_utc = datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc)
-    dt_loc = dt_utc.astimezone(_TZ)
-
-    ms_utc = int(dt_utc.microsecond / 1000)
-    ms_loc = int(dt_loc.microsecond / 1000)
-
-    ts_iso = dt_utc.strftime("%Y-%m-%dT%H:%M:%S") + f".{ms_utc:03d}Z"
-    ts_local = dt_loc.strftime("%Y-%m-%d %H:%M:%S") + f".{ms_loc:03d}" + _fmt_offset_with_colon(dt_loc)
-    return ts_iso, ts_local
+    sec, ms = divmod(int(ts_ms), 1000)
+    utc, loc, off = _iso_second(sec)
+    return f"{utc}.{ms:03d}Z", f"{loc}.{ms:03d}{off}"
 
 def _clamp(v: Optional[float], lo: float, hi: float) -> Optional[float]:
     if v is None:
@@ -48,22 +67,12 @@ def _clamp(v: Optional[float], lo: float, hi: float) -> Optional[float]:
         return None
     return max(lo, min(hi, vf))
 
-def _derive(payload: TelemetryIn, ts_ms: int) -> Dict[str, Any]:
-    # Base: clonar estrutura de entrada
-    data: Dict[str, Any] = {
-        "ts": ts_ms,
-        "ts_iso": "",
-        "ts_local": "",
-        "src": payload.src,
-        "car": json.loads(payload.car.model_dump_json()),
-        "centric": json.loads(payload.centric.model_dump_json()),
-    }
-
-    # Normalizações e clamps leves
-    car = data.get("car") or {}
-    centric = data.get("centric") or {}
-    controls = (centric.get("controls") or {})
+def derive_controls(controls: Dict[str, Any]) -> Dict[str, Any]:
+    """Derivados de `centric.controls` (volante, velocidade de comando e sentido).
 
+    Depende só de `curve_direction`, `speed`, `movement_direction` e de
+    `VMAX_MPS`; a rederivação do histórico (telemetry_rederive.py) reaproveita.
+    """
     # Volante (steering_deg)
     cd = int(controls.get("curve_direction", 0))
     if cd == 0 or cd == 180:
@@ -84,11 +93,11 @@ def _derive(payload: TelemetryIn, ts_ms: int) -> Dict[str, Any]:
     speed_cmd_pct = speed_cmd_byte / 255.0
     vmax = float(getattr(settings, "VMAX_MPS", 12.0) or 12.0)
     speed_cmd_mps = speed_cmd_pct * vmax
-    movement_dir = int(_clamp(controls.get("movement_direction", 1), 0, 1) or 1)
+    mv = _clamp(controls.get("movement_direction", 1), 0, 1)
+    movement_dir = 1 if mv is None else int(mv)  # 0 (ré) é válido: não usar `or 1`
     movement_direction_text = "front" if movement_dir == 1 else "back"
 
-    # Injeta derivados
-    controls["derived"] = {
+    return {
         "steering_deg": steering_deg,
         "steering_side": steering_side,
         "speed_cmd_byte": speed_cmd_byte,
@@ -96,6 +105,31 @@ def _derive(payload: TelemetryIn, ts_ms: int) -> Dict[str, Any]:
         "speed_cmd_mps": round(speed_cmd_mps, 6),
         "movement_direction_text": movement_direction_text,
     }
+
+def _derive(payload: TelemetryIn, ts_ms: int, dumped: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Monta o documento processado.
+
+    `dumped` é o `payload.model_dump()` já calculado pelo chamador; ele é
+    reaproveitado (e alterado) aqui para não serializar o payload de novo.
+    """
+    if dumped is None:
+        dumped = payload.model_dump()
+    data: Dict[str, Any] = {
+        "ts": ts_ms,
+        "ts_iso": "",
+        "ts_local": "",
+        "src": payload.src,
+        "car": dumped["car"],
+        "centric": dumped["centric"],
+    }
+
+    # Normalizações e clamps leves
+    car = data.get("car") or {}
+    centric = data.get("centric") or {}
+    controls = (centric.get("controls") or {})
+
+    # Injeta derivados
+    controls["derived"] = derive_controls(controls)
     centric["controls"] = controls
     data["centric"] = centric
     return data
@@ -103,22 +137,34 @@ def _derive(payload: TelemetryIn, ts_ms: int) -> Dict[str, Any]:
 def _now_ms() -> int:
     return int(datetime.now(tz=timezone.utc).timestamp() * 1000)
 
-def create_from_payload(db: Session, payload: TelemetryIn):
-    """Salva bruto + processado, retornando o documento processado."""
-    ts_recv_ms = _now_ms()
+def build_rows(
+    payload: TelemetryIn,
+    ts_recv_ms: int,
+    raw: Optional[Union[bytes, str]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Monta (linha bruta, linha processada, documento processado) sem tocar no banco.
 
-    # 1) Salvar bruto
-    raw_dict = json.loads(payload.model_dump_json())
-    t_raw = TelemetryRaw(
-        received_at=ts_recv_ms,
-        src=payload.src,
-        raw_json=json.dumps(raw_dict, separators=(",", ":")),
-    )
-    db.add(t_raw)
-    db.flush()
+    O payload é convertido para dict uma única vez e cada coluna JSON é
+    codificada uma única vez. `raw` são os bytes recebidos (MQTT/HTTP), já
+    validados pelo chamador: quando presentes, vão para `raw_json` como vieram.
+    As linhas são dicts prontos para `insert(...)` em lote (executemany).
+    """
+    dumped = payload.model_dump()
+
+    # 1) Bruto (verbatim quando disponível; senão a forma canônica do payload)
+    if raw is not None:
+        raw_json = raw.decode("utf-8") if isinstance(raw, (bytes, bytearray)) else raw
+        raw_json = raw_json.strip()
+    else:
+        raw_json = json.dumps(dumped, separators=(",", ":"))
+    raw_row = {
+        "received_at": ts_recv_ms,
+        "src": payload.src,
+        "raw_json": raw_json,
+    }
 
-    # 2) Processar + datas
-    proc = _derive(payload, ts_recv_ms)
+    # 2) Processar + datas (reaproveita `dumped`)
+    proc = _derive(payload, ts_recv_ms, dumped)
     iso_utc, iso_loc = _iso_fields(ts_recv_ms)
     proc["ts_iso"] = iso_utc
     proc["ts_local"] = iso_loc
@@ -131,40 +177,154 @@ def create_from_payload(db: Session, payload: TelemetryIn):
     controls = (centric.get("controls") or {})
     derived = (controls.get("derived") or {})
 
-    t = Telemetry(
-        ts=proc["ts"],
-        ts_iso=proc["ts_iso"],
-        ts_local=proc["ts_local"],
-        src=proc.get("src"),
-        updated_at=ts_recv_ms,  # mantém compatível com /latest por updated_at
-        lat=gps.get("latitude"),
-        lon=gps.get("longitude"),
-        speed_est_mps=drive.get("speed_est_mps"),
-        pwm=drive.get("pwm"),
-        steering_deg=derived.get("steering_deg"),
-        speed_cmd_pct=derived.get("speed_cmd_pct"),
-        speed_cmd_mps=derived.get("speed_cmd_mps"),
-        movement_dir=1 if derived.get("movement_direction_text") == "front" else 0,
-        doc_json=json.dumps(proc, ensure_ascii=False, separators=(",", ":")),
-    )
-    db.add(t)
+    tel_row = {
+        "ts": proc["ts"],
+        "ts_iso": proc["ts_iso"],
+        "ts_local": proc["ts_local"],
+        "src": proc.get("src"),
+        "updated_at": ts_recv_ms,  # mantém compatível com /latest por updated_at
+        "lat": gps.get("latitude"),
+        "lon": gps.get("longitude"),
+        "speed_est_mps": drive.get("speed_est_mps"),
+        "pwm": drive.get("pwm"),
+        "steering_deg": derived.get("steering_deg"),
+        "speed_cmd_pct": derived.get("speed_cmd_pct"),
+        "speed_cmd_mps": derived.get("speed_cmd_mps"),
+        "movement_dir": 1 if derived.get("movement_direction_text") == "front" else 0,
+        "doc_json": json.dumps(proc, ensure_ascii=False, separators=(",", ":")),
+    }
+    return raw_row, tel_row, proc
+
+def insert_rows(conn: Union[Session, Connection], raw_rows: List[Dict[str, Any]], tel_rows: List[Dict[str, Any]]) -> None:
+    """Insere lotes de linhas bruta/processada via Core (executemany) e
+    atualiza rollups, sketches de quantis, `telemetry_latest` e `trips` na mesma
+    transação. Não faz commit.
+
+    Depois do commit, chame `latest_cache.update(tel_rows)` e `live_stats.update(docs)`."""
+    if raw_rows:
+        conn.execute(insert(TelemetryRaw), raw_rows)
+    if tel_rows:
+        conn.execute(insert(Telemetry), tel_rows)
+        apply_rollups(conn, tel_rows)
+        apply_sketches(conn, tel_rows)
+        apply_latest(conn, tel_rows)
+        apply_trips(conn, tel_rows)
+
+OnCommit = Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]
+
+def _committed(procs: List[Dict[str, Any]], tel_rows: List[Dict[str, Any]], on_commit: Optional[OnCommit]) -> None:
+    latest_cache.update(tel_rows)
+    live_stats.update(procs)
+    if on_commit is not None:
+        try:
+            on_commit(procs, tel_rows)
+        except Exception as e:
+            print("[api] erro no callback pós-commit:", e)
+
+def create_from_payload(
+    db: Session, payload: TelemetryIn, raw: Optional[Union[bytes, str]] = None, on_commit: Optional[OnCommit] = None,
+):
+    """Salva bruto + processado, retornando o documento processado.
+
+    `on_commit(procs, tel_rows)` roda depois do commit, como no `IngestWriter`
+    (WebSockets e repasse aos outros workers)."""
+    raw_row, tel_row, proc = build_rows(payload, _now_ms(), raw)
+    insert_rows(db, [raw_row], [tel_row])
     db.commit()
-    db.refresh(t)
+    _committed([proc], [tel_row], on_commit)
     return proc
 
+def build_many(
+    items: List[Tuple[int, str]],
+) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]], List[int]]:
+    """Valida e deriva um bloco de `(indice, texto_json)`: `(build_rows de cada aceito, indices_rejeitados)`.
+
+    Textos malformados ou inválidos são rejeitados; o texto de cada item vai
+    verbatim para `raw_json`.
+    """
+    rows = []
+    rejected: List[int] = []
+    for idx, text in items:
+        try:
+            payload = TelemetryIn.model_validate_json(text)
+        except ValidationError:
+            rejected.append(idx)
+            continue
+        rows.append(build_rows(payload, _now_ms(), text))
+    return rows, rejected
+
+def create_many(
+    db: Session, items: List[Tuple[int, str]], on_commit: Optional[OnCommit] = None,
+) -> Tuple[int, List[int]]:
+    """Valida, deriva (`build_many`) e salva um bloco numa única transação.
+
+    Retorna `(aceitos, indices_rejeitados)`. `on_commit` como em `create_from_payload`.
+    """
+    rows, rejected = build_many(items)
+    if rows:
+        raw_rows, tel_rows, procs = (list(c) for c in zip(*rows))
+        insert_rows(db, raw_rows, tel_rows)
+        db.commit()
+        _committed(procs, tel_rows, on_commit)
+    return len(rows), rejected
+
 def touch_updated_at(db: Session, row_id: int):
     now = _now_ms()
     db.query(Telemetry).filter(Telemetry.id == row_id).update({"updated_at": now})
     db.commit()
 
-def get_latest(db: Session):
-    row = db.query(Telemetry).order_by(Telemetry.updated_at.desc()).first()
-    if not row:
-        return None
-    try:
-        return json.loads(row.doc_json)
-    except Exception:
-        return None
+def _loads_all(docs: List[str]) -> List[Dict[str, Any]]:
+    out = []
+    for d in docs:
+        try:
+            out.append(json.loads(d))
+        except Exception:
+            continue
+    return out
+
+def get_latest_doc(db: Session, src: Optional[str] = None) -> Optional[str]:
+    """Último `doc_json` (texto JSON já pronto), sem decodificar, lido de `telemetry_latest`.
+
+    Com `src`, o mais recente por ts daquela origem; sem, o de maior `updated_at`
+    entre as origens. Não consulta `telemetry`: numa frota parada as linhas já
+    podem ter ido para os segmentos frios.
+    """
+    q = db.query(TelemetryLatest.doc_json)
+    if src is not None:
+        return q.filter(TelemetryLatest.src == src).scalar()
+    return q.order_by(TelemetryLatest.updated_at.desc()).limit(1).scalar()
+
+def _range_filter(q, start_ts: Optional[int], end_ts: Optional[int]):
+    if start_ts is not None:
+        q = q.filter(Telemetry.ts >= int(start_ts))
+    if end_ts is not None:
+        q = q.filter(Telemetry.ts <= int(end_ts))
+    return q
+
+def list_range_docs(
+    db: Session,
+    limit: int = 100,
+    offset: int = 0,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    order_by: str = "updated_at",  # "updated_at" ou "ts"
+) -> List[str]:
+    """Como `list_range`, mas devolve os `doc_json` como texto (sem json.loads).
+
+    Com segmentos frios no intervalo, junta as `offset + limit` maiores dos dois lados.
+    """
+    key = Telemetry.ts if order_by == "ts" else Telemetry.updated_at
+    if archive_store.empty():
+        q = _range_filter(db.query(Telemetry.doc_json), start_ts, end_ts)
+        q = q.order_by(key.desc(), Telemetry.id.desc())
+        return [r[0] for r in q.offset(offset).limit(limit).all()]
+
+    want = offset + limit
+    q = _range_filter(db.query(key, Telemetry.id, Telemetry.doc_json), start_ts, end_ts)
+    hot = [((r[0], r[1]), r[2]) for r in q.order_by(key.desc(), Telemetry.id.desc()).limit(want).all()]
+    cold = cold_top("ts" if order_by == "ts" else "updated_at", want, start_ts, end_ts)
+    merged = heapq.merge(hot, cold, key=lambda kv: kv[0], reverse=True)
+    return [doc for _, doc in itertools.islice(merged, offset, want)]
 
 def list_range(
     db: Session,
@@ -174,22 +334,40 @@ def list_range(
     end_ts: Optional[int] = None,
     order_by: str = "updated_at",  # "updated_at" ou "ts"
 ):
-    q = db.query(Telemetry)
-    if start_ts is not None:
-        q = q.filter(Telemetry.ts >= int(start_ts))
-    if end_ts is not None:
-        q = q.filter(Telemetry.ts <= int(end_ts))
+    return _loads_all(list_range_docs(db, limit=limit, offset=offset, start_ts=start_ts, end_ts=end_ts, order_by=order_by))
 
-    if order_by == "ts":
-        q = q.order_by(Telemetry.ts.desc())
-    else:
-        q = q.order_by(Telemetry.updated_at.desc())
+def list_range_keyset_docs(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+) -> Tuple[List[str], Optional[str]]:
+    """Paginação por chave `(ts, id)` desc: busca direto no índice de `ts`.
 
-    rows = q.offset(offset).limit(limit).all()
-    out = []
-    for r in rows:
-        try:
-            out.append(json.loads(r.doc_json))
-        except Exception:
-            continue
-    return out
\ No newline at end of file
+    Retorna `(doc_jsons, next_cursor)`; `next_cursor` é None na última página.
+    Levanta ValueError se o cursor for inválido.
+    """
+    q = _range_filter(db.query(Telemetry.ts, Telemetry.id, Telemetry.doc_json), start_ts, end_ts)
+    before = None
+    if cursor:
+        before = decode_cursor(cursor)
+        q = q.filter(tuple_(Telemetry.ts, Telemetry.id) < before)
+
+    rows = [((r.ts, r.id), r.doc_json) for r in q.order_by(Telemetry.ts.desc(), Telemetry.id.desc()).limit(limit).all()]
+    if not archive_store.empty():
+        cold = cold_top("ts", limit, start_ts, end_ts, before=before)
+        rows = list(itertools.islice(heapq.merge(rows, cold, key=lambda kv: kv[0], reverse=True), limit))
+    next_cursor = encode_cursor(*rows[-1][0]) if len(rows) == limit else None
+    return [doc for _, doc in rows], next_cursor
+
+def list_range_keyset(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Versão decodificada de `list_range_keyset_docs`."""
+    docs, next_cursor = list_range_keyset_docs(db, limit=limit, cursor=cursor, start_ts=start_ts, end_ts=end_ts)
+    return _loads_all(docs), next_cursor
@@ -0,0 +1,189 @@
+
+"""Agregação por janelas de tempo e redução de pontos (LTTB) sobre as colunas numéricas de `telemetry`."""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.telemetry import Telemetry, TelemetryRollup, NUMERIC_FIELDS
+from app.crud.telemetry_rollup import pick_resolution
+from app.crud.telemetry_archive import cold_buckets, cold_series
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """`"a,b"` -> `["a","b"]` (vazio = todos). Levanta ValueError para campo desconhecido."""
+    if not fields:
+        return list(NUMERIC_FIELDS)
+    out: List[str] = []
+    for f in (p.strip() for p in fields.split(",")):
+        if not f:
+            continue
+        if f not in NUMERIC_FIELDS:
+            raise ValueError(f"campo não agregável: {f} (use {', '.join(NUMERIC_FIELDS)})")
+        if f not in out:
+            out.append(f)
+    return out
+
+def _range_filter(q, start_ts: int, end_ts: int, src: Optional[str]):
+    q = q.filter(Telemetry.ts >= int(start_ts), Telemetry.ts <= int(end_ts))
+    if src is not None:
+        q = q.filter(Telemetry.src == src)
+    return q
+
+def _empty_state(fields: Sequence[str]) -> Dict[str, Any]:
+    # por campo: [n, soma, min, max, last]
+    return {"n": 0, "last_ts": None, "f": {f: [0, 0.0, None, None, None] for f in fields}}
+
+def _merge(state: Dict[str, Any], n: int, last_ts: Optional[int], parts: Sequence[Sequence[Any]]) -> None:
+    """Soma um agregado parcial (`parts` = [n, soma, min, max, last] por campo) ao estado da janela."""
+    newer = last_ts is not None and (state["last_ts"] is None or last_ts >= state["last_ts"])
+    state["n"] += n
+    if newer:
+        state["last_ts"] = last_ts
+    for acc, (pn, psum, pmin, pmax, plast) in zip(state["f"].values(), parts):
+        acc[0] += pn or 0
+        acc[1] += psum or 0.0
+        if pmin is not None and (acc[2] is None or pmin < acc[2]):
+            acc[2] = pmin
+        if pmax is not None and (acc[3] is None or pmax > acc[3]):
+            acc[3] = pmax
+        if newer:
+            acc[4] = plast
+
+def _merge_raw(db: Session, states: Dict[int, Any], start_ts: int, end_ts: int, bucket_ms: int,
+               fields: Sequence[str], src: Optional[str]) -> None:
+    """Agrega `telemetry` no SQLite (GROUP BY por janela) e os segmentos frios, e soma ao estado."""
+    for t, n, last_ts, parts in cold_buckets(start_ts, end_ts, int(bucket_ms), fields, src):
+        _merge(states.setdefault(t, _empty_state(fields)), n, last_ts, parts)
+    bucket = (Telemetry.ts // int(bucket_ms)).label("bucket")
+    cols = [bucket, func.count().label("n"), func.max(Telemetry.ts).label("last_ts"), func.max(Telemetry.id).label("last_id")]
+    for f in fields:
+        col = getattr(Telemetry, f)
+        cols += [func.count(col), func.total(col), func.min(col), func.max(col)]
+    q = _range_filter(db.query(*cols), start_ts, end_ts, src).group_by(bucket)
+    rows = q.all()
+    if not rows:
+        return
+
+    # "last": uma busca por PK para as linhas mais recentes de cada janela
+    last_ids = [r.last_id for r in rows]
+    last_vals: Dict[int, Any] = {}
+    for i in range(0, len(last_ids), 500):
+        chunk = last_ids[i:i + 500]
+        q_last = db.query(Telemetry.id, *[getattr(Telemetry, f) for f in fields]).filter(Telemetry.id.in_(chunk))
+        for lr in q_last.all():
+            last_vals[lr[0]] = lr[1:]
+
+    for r in rows:
+        last = last_vals.get(r.last_id) or (None,) * len(fields)
+        parts = [(*r[4 + 4 * i: 8 + 4 * i], last[i]) for i in range(len(fields))]
+        t = int(r.bucket) * int(bucket_ms)
+        _merge(states.setdefault(t, _empty_state(fields)), r.n, r.last_ts, parts)
+
+def _merge_rollup(db: Session, states: Dict[int, Any], start_ts: int, end_ts: int, res_ms: int,
+                  bucket_ms: int, fields: Sequence[str], src: Optional[str]) -> None:
+    """Soma ao estado as janelas de rollup `res_ms` contidas em [start_ts, end_ts] (alinhados a res_ms)."""
+    cols = [TelemetryRollup.bucket, TelemetryRollup.n, TelemetryRollup.last_ts]
+    for f in fields:
+        cols += [getattr(TelemetryRollup, f"{f}_{k}") for k in ("n", "sum", "min", "max", "last")]
+    q = db.query(*cols).filter(
+        TelemetryRollup.res_ms == res_ms,
+        TelemetryRollup.bucket >= start_ts // res_ms,
+        TelemetryRollup.bucket <= end_ts // res_ms,
+    )
+    if src is not None:
+        q = q.filter(TelemetryRollup.src == src)
+    for r in q.all():
+        t = (int(r.bucket) * res_ms // bucket_ms) * bucket_ms
+        parts = [r[3 + 5 * i: 8 + 5 * i] for i in range(len(fields))]
+        _merge(states.setdefault(t, _empty_state(fields)), r.n, r.last_ts, parts)
+
+def aggregate_range(
+    db: Session,
+    start_ts: int,
+    end_ts: int,
+    bucket_ms: int,
+    fields: Sequence[str],
+    src: Optional[str] = None,
+    use_rollups: bool = True,
+) -> List[Dict[str, Any]]:
+    """min/max/avg/count/last por janela `ts // bucket_ms`.
+
+    Usa o rollup mais grosso cuja resolução divide `bucket_ms` para o trecho
+    do intervalo alinhado a ela; as pontas (menores que uma janela de rollup)
+    e os casos sem rollup adequado são agregados direto em `telemetry`.
+    `last` é o valor da amostra mais recente da janela.
+    """
+    start_ts, end_ts, bucket_ms = int(start_ts), int(end_ts), int(bucket_ms)
+    states: Dict[int, Any] = {}
+    res = pick_resolution(bucket_ms) if use_rollups else None
+    lo = -(-start_ts // res) * res if res else 0
+    hi = ((end_ts + 1) // res) * res - 1 if res else -1
+    if res and lo <= hi:
+        if start_ts < lo:
+            _merge_raw(db, states, start_ts, lo - 1, bucket_ms, fields, src)
+        _merge_rollup(db, states, lo, hi, res, bucket_ms, fields, src)
+        if hi < end_ts:
+            _merge_raw(db, states, hi + 1, end_ts, bucket_ms, fields, src)
+    else:
+        _merge_raw(db, states, start_ts, end_ts, bucket_ms, fields, src)
+
+    out: List[Dict[str, Any]] = []
+    for t in sorted(states):
+        st = states[t]
+        stats = {
+            f: {"min": mn, "max": mx, "avg": (sm / n if n else None), "count": n, "last": last}
+            for f, (n, sm, mn, mx, last) in st["f"].items()
+        }
+        out.append({"t": t, "count": st["n"], "fields": stats})
+    return out
+
+def lttb(points: Sequence[Tuple[int, float]], threshold: int) -> List[Tuple[int, float]]:
+    """Largest-Triangle-Three-Buckets: reduz a série a `threshold` pontos preservando a forma."""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    out = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # média do próximo bucket (terceiro vértice do triângulo)
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        span = nxt_end - nxt_start
+        avg_x = sum(p[0] for p in points[nxt_start:nxt_end]) / span
+        avg_y = sum(p[1] for p in points[nxt_start:nxt_end]) / span
+
+        ax, ay = points[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(points[best])
+        a = best
+    out.append(points[-1])
+    return out
+
+def downsample_range(
+    db: Session,
+    start_ts: int,
+    end_ts: int,
+    fields: Sequence[str],
+    points: int,
+    src: Optional[str] = None,
+) -> Dict[str, List[Tuple[int, float]]]:
+    """Série `[ts, valor]` por campo reduzida por LTTB (lê só as colunas indexadas)."""
+    q = _range_filter(db.query(Telemetry.ts, *[getattr(Telemetry, f) for f in fields]), start_ts, end_ts, src)
+    series: Dict[str, List[Tuple[int, float]]] = cold_series(start_ts, end_ts, fields, src)
+    for row in q.order_by(Telemetry.ts.asc()).yield_per(5000):
+        ts = row[0]
+        for i, f in enumerate(fields):
+            v = row[1 + i]
+            if v is not None:
+                series[f].append((ts, v))
+    if any(series.values()):
+        for pts in series.values():
+            pts.sort(key=lambda p: p[0])  # frio + quente: ts se sobrepõem entre srcs
+    return {f: lttb(pts, points) for f, pts in series.items()}
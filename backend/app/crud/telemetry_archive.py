@@ -0,0 +1,548 @@
+"""Camada fria: linhas antigas de `telemetry` seladas em segmentos colunares.
+
+`seal_archive` move as linhas com `ts` anterior a `ARCHIVE_AFTER_MS` para um
+segmento por (`src`, janela de `ARCHIVE_WINDOW_MS`) em `ARCHIVE_DIR` e as apaga
+de `telemetry` (os rollups ficam no SQLite). Não se guarda o
+`doc_json`: ele é remontado das colunas (mesmo formato de `build_rows`) e
+conferido na selagem; linha cujo documento não bate (ex.: gravada por uma
+versão antiga) vai verbatim em `extras`.
+
+As leituras (`list_range*`, agregação, LTTB, backfill de rollups) juntam o
+SQLite (quente) com os segmentos que cruzam o intervalo pedido. A retenção
+(`expire_segments`) apaga segmentos inteiros.
+
+O `ts_local` remontado usa o deslocamento UTC com que a linha foi gravada
+(coluna `tzo`), não o `API_TZ` corrente: mudar o fuso não altera o histórico
+até um `rederive`. Segmentos gravados antes da coluna usam o `API_TZ` corrente.
+"""
+from __future__ import annotations
+
+import bisect
+import glob
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.segments import Segment, forget, open_segment, write_segment
+from app.models.telemetry import Telemetry, NUMERIC_FIELDS
+
+_INT_FIELDS = ("pwm", "movement_dir")
+_IMU_KEYS = ("accelerationX", "accelerationY", "accelerationZ", "spinX", "spinY", "spinZ", "scale_dps")
+_CTL_KEYS = ("curve_direction", "speed", "movement_direction")
+
+# nome -> codificação (ver app/core/segments.py)
+COLUMNS: Dict[str, str] = {
+    "ts": "delta",
+    "id": "delta",
+    "upd": "zz",  # updated_at - ts
+    **{f: ("int" if f in _INT_FIELDS else "float") for f in NUMERIC_FIELDS},
+    **{k: "int" for k in _IMU_KEYS},
+    **{k: "int" for k in _CTL_KEYS},
+    "drive": "bool",
+    "tzo": "int",  # deslocamento UTC do `ts_local`, em minutos
+}
+
+_ANY = object()  # filtro de src: todas
+
+# --- documento <-> colunas --------------------------------------------------------
+def _offset_min(ts_local: Any) -> Optional[int]:
+    """`"...-03:00"` -> -180; None se não houver deslocamento ±HH:MM no fim."""
+    if not isinstance(ts_local, str) or len(ts_local) < 6 or ts_local[-6] not in "+-" or ts_local[-3] != ":":
+        return None
+    try:
+        m = int(ts_local[-5:-3]) * 60 + int(ts_local[-2:])
+    except ValueError:
+        return None
+    return -m if ts_local[-6] == "-" else m
+
+def local_offset(ts_ms: int) -> Optional[int]:
+    """Deslocamento (minutos) do `API_TZ` corrente em `ts_ms`."""
+    from app.crud.telemetry import _iso_fields
+
+    return _offset_min(_iso_fields(ts_ms)[1])
+
+@lru_cache(maxsize=8)
+def _local_second(sec: int, off_min: int) -> Tuple[str, str]:
+    from app.crud.telemetry import _fmt_offset_with_colon
+
+    dt = datetime.fromtimestamp(sec, tz=timezone(timedelta(minutes=off_min)))
+    return dt.strftime("%Y-%m-%d %H:%M:%S"), _fmt_offset_with_colon(dt)
+
+def _row_from_db(r: Any) -> Dict[str, Any]:
+    """Linha de `telemetry` (com `doc_json`) -> valores das colunas do segmento."""
+    row = {"ts": int(r.ts), "id": int(r.id), "upd": int(r.updated_at if r.updated_at is not None else r.ts) - int(r.ts),
+           "doc_json": r.doc_json}
+    for f in NUMERIC_FIELDS:
+        row[f] = getattr(r, f)
+    try:
+        doc = json.loads(r.doc_json)
+    except Exception:
+        doc = {}
+    car = doc.get("car") or {}
+    imu = car.get("imu") or {}
+    controls = (doc.get("centric") or {}).get("controls") or {}
+    for k in _IMU_KEYS:
+        row[k] = imu.get(k)
+    for k in _CTL_KEYS:
+        row[k] = controls.get(k)
+    row["drive"] = car.get("drive") is not None
+    row["tzo"] = _offset_min(doc.get("ts_local"))
+    return row
+
+def _rebuild(src: Optional[str], row: Dict[str, Any]) -> str:
+    """Remonta o `doc_json` como `build_rows` o teria gravado."""
+    from app.crud.telemetry import _iso_fields
+
+    ts_iso, ts_local = _iso_fields(row["ts"])
+    tzo = row.get("tzo")
+    if tzo is not None:
+        sec, ms = divmod(int(row["ts"]), 1000)
+        loc, off = _local_second(sec, tzo)
+        ts_local = f"{loc}.{ms:03d}{off}"
+    steering = row["steering_deg"]
+    side = "right" if steering > 0 else ("left" if steering < 0 else "straight")
+    doc = {
+        "ts": row["ts"],
+        "ts_iso": ts_iso,
+        "ts_local": ts_local,
+        "src": src,
+        "car": {
+            "gps": {"latitude": row["lat"], "longitude": row["lon"]} if row["lat"] is not None else None,
+            "imu": {k: row[k] for k in _IMU_KEYS} if row["accelerationX"] is not None else None,
+            "drive": {"pwm": row["pwm"], "speed_est_mps": row["speed_est_mps"]} if row["drive"] else None,
+        },
+        "centric": {"controls": {
+            **{k: row[k] for k in _CTL_KEYS},
+            "derived": {
+                "steering_deg": steering,
+                "steering_side": side,
+                "speed_cmd_byte": row["speed"],
+                "speed_cmd_pct": row["speed_cmd_pct"],
+                "speed_cmd_mps": row["speed_cmd_mps"],
+                "movement_direction_text": "front" if row["movement_dir"] == 1 else "back",
+            },
+        }},
+    }
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+# --- armazenamento -----------------------------------------------------------------
+def _src_key(src: Optional[str]) -> str:
+    return "none" if src is None else "h" + src.encode("utf-8").hex()
+
+class ArchiveStore:
+    """Diretório de segmentos; o índice é relido quando o diretório muda."""
+
+    def __init__(self, root: str, window_ms: int) -> None:
+        self.root = root
+        self.window_ms = int(window_ms)
+        self._lock = threading.Lock()
+        self._sig: Optional[Tuple[int, int]] = None
+        self._index: List[Tuple[Dict[str, Any], str]] = []
+
+    def path_for(self, src: Optional[str], window_start: int) -> str:
+        return os.path.join(self.root, f"{int(window_start):013d}_{_src_key(src)}.seg")
+
+    def _refresh(self) -> List[Tuple[Dict[str, Any], str]]:
+        try:
+            st = os.stat(self.root)
+        except FileNotFoundError:
+            return []
+        sig = (st.st_mtime_ns, st.st_ino)
+        if sig != self._sig:
+            with self._lock:
+                if sig != self._sig:
+                    index = []
+                    for path in sorted(glob.glob(os.path.join(self.root, "*.seg"))):
+                        try:
+                            index.append((open_segment(path).meta, path))
+                        except (OSError, ValueError):
+                            continue
+                    self._index, self._sig = index, sig
+        return self._index
+
+    def empty(self) -> bool:
+        return not self._refresh()
+
+    def segments(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None, src: Any = _ANY) -> List[Segment]:
+        """Segmentos que podem ter linhas em [start_ts, end_ts] (e da `src`, se dada)."""
+        out = []
+        for meta, path in self._refresh():
+            if start_ts is not None and meta["ts_max"] < start_ts:
+                continue
+            if end_ts is not None and meta["ts_min"] > end_ts:
+                continue
+            if src is not _ANY and meta["src"] != src:
+                continue
+            try:
+                out.append(open_segment(path))
+            except FileNotFoundError:
+                continue
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._refresh()
+        return {
+            "dir": self.root,
+            "segments": len(index),
+            "rows": sum(m["n"] for m, _ in index),
+            "bytes": sum(os.path.getsize(p) for _, p in index if os.path.exists(p)),
+        }
+
+archive_store = ArchiveStore(
+    settings.ARCHIVE_DIR or os.path.join(os.path.dirname(settings.SQLITE_PATH) or ".", "segments"),
+    settings.ARCHIVE_WINDOW_MS,
+)
+
+def _range(seg: Segment, start_ts: Optional[int], end_ts: Optional[int]) -> Tuple[List[int], int, int]:
+    ts = seg.column("ts")
+    lo = 0 if start_ts is None else bisect.bisect_left(ts, int(start_ts))
+    hi = len(ts) if end_ts is None else bisect.bisect_right(ts, int(end_ts))
+    return ts, lo, hi
+
+def doc_columns(seg: Segment, cache: bool = True) -> Dict[str, List[Any]]:
+    """Colunas de `COLUMNS` presentes no segmento (os antigos não têm `tzo`)."""
+    get = seg.column if cache else seg.read
+    return {name: get(name) for name in COLUMNS if seg.has(name)}
+
+def segment_rows(seg: Segment) -> List[Dict[str, Any]]:
+    """Todas as linhas do segmento, com `doc_json` remontado."""
+    cols = doc_columns(seg)
+    extras = seg.extras()
+    src = seg.meta["src"]
+    rows = []
+    for i in range(seg.n):
+        row = {name: col[i] for name, col in cols.items()}
+        row["doc_json"] = extras.get(i) or _rebuild(src, row)
+        rows.append(row)
+    return rows
+
+def iter_segment_docs(
+    seg: Segment, start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+) -> Iterator[Tuple[int, int, str]]:
+    """`(ts, id, doc_json)` em ordem, sem deixar as colunas no cache do segmento."""
+    cols = doc_columns(seg, cache=False)
+    ts = cols["ts"]
+    lo = 0 if start_ts is None else bisect.bisect_left(ts, int(start_ts))
+    hi = len(ts) if end_ts is None else bisect.bisect_right(ts, int(end_ts))
+    extras = seg.extras() if seg.meta.get("has_extras") else {}
+    src = seg.meta["src"]
+    for i in range(lo, hi):
+        doc = extras.get(i)
+        if doc is None:
+            doc = _rebuild(src, {name: col[i] for name, col in cols.items()})
+        yield ts[i], cols["id"][i], doc
+
+def segment_doc(seg: Segment, i: int) -> str:
+    extras = seg.meta.get("has_extras") and seg.extras()
+    if extras and i in extras:
+        return extras[i]
+    return _rebuild(seg.meta["src"], {name: col[i] for name, col in doc_columns(seg).items()})
+
+# --- selagem --------------------------------------------------------------------------
+def _bbox(rows: List[Dict[str, Any]]) -> Optional[List[float]]:
+    """`[min_lat, max_lat, min_lon, max_lon]` das linhas com GPS (poda das consultas geo)."""
+    pts = [(r["lat"], r["lon"]) for r in rows if r["lat"] is not None and r["lon"] is not None]
+    if not pts:
+        return None
+    lats, lons = zip(*pts)
+    return [min(lats), max(lats), min(lons), max(lons)]
+
+def _write(
+    store: ArchiveStore, src: Optional[str], window_start: int, rows: List[Dict[str, Any]], path: Optional[str] = None,
+) -> int:
+    """Grava o segmento da janela (em `path`, se dado, em vez do caminho do `store`)."""
+    rows.sort(key=lambda r: (r["ts"], r["id"]))
+    extras: Dict[int, str] = {}
+    for i, r in enumerate(rows):
+        if r.get("tzo") is None:  # linha de segmento antigo (sem a coluna)
+            try:
+                r["tzo"] = _offset_min(json.loads(r["doc_json"]).get("ts_local"))
+            except Exception:
+                r["tzo"] = None
+        try:
+            ok = _rebuild(src, r) == r["doc_json"]
+        except Exception:
+            ok = False
+        if not ok:
+            extras[i] = r["doc_json"]
+    meta = {
+        "src": src,
+        "window_start": window_start,
+        "window_ms": store.window_ms,
+        "n": len(rows),
+        "ts_min": rows[0]["ts"],
+        "ts_max": rows[-1]["ts"],
+        "upd_max": max(r["ts"] + r["upd"] for r in rows),
+        "has_extras": bool(extras),
+        "bbox": _bbox(rows),
+    }
+    columns = {name: (enc, [r[name] for r in rows]) for name, enc in COLUMNS.items()}
+    path = path or store.path_for(src, window_start)
+    size = write_segment(path, meta, len(rows), columns, extras)
+    forget(path)
+    return size
+
+def seal_archive(
+    bind: Engine,
+    older_than_ms: Optional[int] = None,
+    store: ArchiveStore = archive_store,
+    now_ms: Optional[int] = None,
+) -> Dict[str, int]:
+    """Sela em segmentos as janelas inteiras anteriores a `now - older_than_ms`.
+
+    Uma transação por (src, janela): o segmento novo (fundido com o que já
+    existir para a janela) é gravado ao lado, as linhas saem de `telemetry` e só
+    então ele toma o lugar do antigo, logo antes do commit. Se o DELETE ou o
+    commit falham, o segmento antigo volta e as linhas continuam só no SQLite:
+    uma leitura quente+fria nunca vê a mesma linha duas vezes. Se o processo
+    morre entre a troca e o commit, a próxima selagem funde as linhas que
+    sobraram (por `(ts, id)`, a versão quente vale) e as apaga.
+    """
+    older_than_ms = settings.ARCHIVE_AFTER_MS if older_than_ms is None else int(older_than_ms)
+    now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+    window = store.window_ms
+    cutoff = ((now_ms - older_than_ms) // window) * window
+    os.makedirs(store.root, exist_ok=True)
+
+    bucket = (Telemetry.ts // window).label("w")
+    with bind.connect() as conn:
+        groups = conn.execute(
+            select(Telemetry.src, bucket).where(Telemetry.ts < cutoff).group_by(Telemetry.src, bucket)
+        ).all()
+
+    cols = [Telemetry.id, Telemetry.ts, Telemetry.updated_at, Telemetry.doc_json,
+            *[getattr(Telemetry, f) for f in NUMERIC_FIELDS]]
+    out = {"segments": 0, "rows": 0, "bytes": 0}
+    for src, w in groups:
+        w0 = int(w) * window
+        src_cond = Telemetry.src.is_(None) if src is None else Telemetry.src == src
+        path = store.path_for(src, w0)
+        staged, backup = path + ".new", path + ".old"
+        swapped = had_old = False
+        try:
+            with bind.begin() as conn:
+                db_rows = conn.execute(
+                    select(*cols).where(src_cond, Telemetry.ts >= w0, Telemetry.ts < w0 + window)
+                ).all()
+                if not db_rows:
+                    continue
+                rows = [_row_from_db(r) for r in db_rows]
+                had_old = os.path.exists(path)
+                if had_old:
+                    # linhas atrasadas numa janela já selada: funde (sem duplicar)
+                    seen = {(r["ts"], r["id"]) for r in rows}
+                    rows += [r for r in segment_rows(open_segment(path)) if (r["ts"], r["id"]) not in seen]
+                size = _write(store, src, w0, rows, path=staged)
+                ids = [r.id for r in db_rows]
+                for i in range(0, len(ids), 500):
+                    conn.execute(delete(Telemetry).where(Telemetry.id.in_(ids[i:i + 500])))
+                if had_old:
+                    if os.path.exists(backup):
+                        os.unlink(backup)
+                    os.link(path, backup)  # o antigo continua no lugar até a troca
+                os.replace(staged, path)
+                forget(path)
+                swapped = True
+        except BaseException:
+            if swapped:
+                if had_old:
+                    os.replace(backup, path)
+                else:
+                    os.unlink(path)
+                forget(path)
+            if os.path.exists(staged):
+                os.unlink(staged)
+            raise
+        if had_old:
+            os.unlink(backup)
+        out["segments"] += 1
+        out["rows"] += len(db_rows)
+        out["bytes"] += size
+    return out
+
+def expire_segments(
+    retention_ms: int,
+    store: ArchiveStore = archive_store,
+    now_ms: Optional[int] = None,
+) -> int:
+    """Apaga os segmentos cuja janela inteira é mais velha que `retention_ms`. Retorna quantos."""
+    if retention_ms <= 0:
+        return 0
+    now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+    dropped = 0
+    for meta, path in list(store._refresh()):
+        if meta["window_start"] + meta["window_ms"] <= now_ms - retention_ms:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            forget(path)
+            dropped += 1
+    return dropped
+
+# --- leitura ----------------------------------------------------------------------------
+def cold_top(
+    order_by: str,
+    limit: int,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    before: Optional[Tuple[int, int]] = None,
+    store: ArchiveStore = archive_store,
+) -> List[Tuple[Tuple[int, int], str]]:
+    """As `limit` maiores linhas frias por `(ts, id)` ou `(updated_at, id)`, desc.
+
+    `before` (só com `order_by="ts"`) é o cursor keyset: `(ts, id) < before`.
+    Retorna `[(chave, doc_json)]`; o documento só é remontado para as escolhidas.
+    """
+    if limit <= 0:
+        return []
+    by_ts = order_by == "ts"
+    segs = store.segments(start_ts, end_ts)
+    segs.sort(key=lambda s: s.meta["ts_max" if by_ts else "upd_max"], reverse=True)
+    best: List[Tuple[Tuple[int, int], int, Segment, int]] = []  # heap mínimo das melhores
+    seq = 0
+    for seg in segs:
+        if len(best) >= limit and (seg.meta["ts_max" if by_ts else "upd_max"], 1 << 62) < best[0][0]:
+            break
+        ts, lo, hi = _range(seg, start_ts, end_ts)
+        ids = seg.column("id")
+        upd = None if by_ts else seg.column("upd")
+        if by_ts and before is not None:
+            hi = min(hi, bisect.bisect_right(ts, before[0]))
+            while hi > lo and (ts[hi - 1], ids[hi - 1]) >= before:
+                hi -= 1
+        for i in range(hi - 1, lo - 1, -1):
+            key = (ts[i], ids[i]) if by_ts else (ts[i] + upd[i], ids[i])
+            if before is not None and key >= before:
+                continue
+            seq += 1
+            item = (key, seq, seg, i)
+            if len(best) < limit:
+                heapq.heappush(best, item)
+            elif key > best[0][0]:
+                heapq.heapreplace(best, item)
+            elif by_ts:
+                break  # ts desc: daqui para trás só piora
+    best.sort(reverse=True, key=lambda it: (it[0], it[1]))
+    return [(key, segment_doc(seg, i)) for key, _, seg, i in best]
+
+def cold_buckets(
+    start_ts: int,
+    end_ts: int,
+    bucket_ms: int,
+    fields: Sequence[str],
+    src: Optional[str] = None,
+    store: ArchiveStore = archive_store,
+) -> Iterator[Tuple[int, int, int, List[Tuple[Any, ...]]]]:
+    """Agregados parciais por janela: `(t, n, last_ts, [(n, soma, min, max, last)] por campo)`."""
+    for seg in store.segments(start_ts, end_ts, _ANY if src is None else src):
+        ts, lo, hi = _range(seg, start_ts, end_ts)
+        if lo >= hi:
+            continue
+        cols = [seg.column(f) for f in fields]
+        acc: Dict[int, List[Any]] = {}
+        for i in range(lo, hi):
+            t = (ts[i] // bucket_ms) * bucket_ms
+            a = acc.get(t)
+            if a is None:
+                a = acc[t] = [0, ts[i], [[0, 0.0, None, None, None] for _ in fields]]
+            a[0] += 1
+            a[1] = ts[i]  # ordenado por (ts, id): a última é a mais recente
+            for c, fa in zip(cols, a[2]):
+                v = c[i]
+                fa[4] = v
+                if v is None:
+                    continue
+                fa[0] += 1
+                fa[1] += v
+                if fa[2] is None or v < fa[2]:
+                    fa[2] = v
+                if fa[3] is None or v > fa[3]:
+                    fa[3] = v
+        for t, (n, last_ts, parts) in acc.items():
+            yield t, n, last_ts, [tuple(p) for p in parts]
+
+def cold_series(
+    start_ts: int,
+    end_ts: int,
+    fields: Sequence[str],
+    src: Optional[str] = None,
+    store: ArchiveStore = archive_store,
+) -> Dict[str, List[Tuple[int, Any]]]:
+    """Pontos `(ts, valor)` por campo, em ordem de ts."""
+    series: Dict[str, List[Tuple[int, Any]]] = {f: [] for f in fields}
+    for seg in store.segments(start_ts, end_ts, _ANY if src is None else src):
+        ts, lo, hi = _range(seg, start_ts, end_ts)
+        for f in fields:
+            col = seg.column(f)
+            series[f].extend((ts[i], col[i]) for i in range(lo, hi) if col[i] is not None)
+    for pts in series.values():
+        pts.sort(key=lambda p: p[0])
+    return series
+
+def cold_rollup_rows(
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    store: ArchiveStore = archive_store,
+) -> Iterator[Dict[str, Any]]:
+    """Linhas frias no formato que `accumulate` espera (ts, src e campos numéricos)."""
+    for seg in store.segments(start_ts, end_ts):
+        ts, lo, hi = _range(seg, start_ts, end_ts)
+        cols = {f: seg.column(f) for f in NUMERIC_FIELDS}
+        src = seg.meta["src"]
+        for i in range(lo, hi):
+            row = {f: c[i] for f, c in cols.items()}
+            row["ts"], row["src"] = ts[i], src
+            yield row
+
+def cold_geo(
+    min_lat: float,
+    max_lat: float,
+    min_lon: float,
+    max_lon: float,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    src: Optional[str] = None,
+    store: ArchiveStore = archive_store,
+) -> Iterator[Tuple[int, int, float, float, str]]:
+    """`(ts, id, lat, lon, doc_json)` das linhas frias dentro da caixa, em ordem (ts, id).
+
+    Segmentos cujo `bbox` não cruza a caixa nem são abertos (os gravados antes
+    do `bbox` existir são varridos).
+    """
+    segs = []
+    for seg in store.segments(start_ts, end_ts, _ANY if src is None else src):
+        box = seg.meta.get("bbox", [-90.0, 90.0, -180.0, 180.0])
+        if box is None or box[0] > max_lat or box[1] < min_lat or box[2] > max_lon or box[3] < min_lon:
+            continue
+        segs.append(seg)
+    segs.sort(key=lambda s: s.meta["window_start"])
+
+    def scan(seg: Segment) -> Iterator[Tuple[int, int, float, float, str]]:
+        ts, lo, hi = _range(seg, start_ts, end_ts)
+        lat, lon = seg.read("lat"), seg.read("lon")
+        hits = [i for i in range(lo, hi)
+                if lat[i] is not None and lon[i] is not None
+                and min_lat <= lat[i] <= max_lat and min_lon <= lon[i] <= max_lon]
+        if not hits:
+            return
+        cols = doc_columns(seg, cache=False)
+        extras = seg.extras() if seg.meta.get("has_extras") else {}
+        for i in hits:
+            doc = extras.get(i)
+            if doc is None:
+                doc = _rebuild(seg.meta["src"], {name: col[i] for name, col in cols.items()})
+            yield ts[i], cols["id"][i], lat[i], lon[i], doc
+
+    for _, group in itertools.groupby(segs, key=lambda s: s.meta["window_start"]):
+        yield from heapq.merge(*(scan(s) for s in group))
@@ -0,0 +1,122 @@
+"""Dicionários de compressão e migração das linhas antigas (ver app/core/doccodec.py).
+
+- `ensure_dicts`: no `init_db`, cria o primeiro dicionário de cada tipo a partir
+  das linhas existentes (ou de amostras sintéticas, num banco vazio).
+- `train_dicts`: novo dicionário a partir das linhas mais recentes; as linhas já
+  gravadas continuam com o dicionário delas.
+- `migrate_plain`: regrava em blocos as linhas ainda em texto puro (versão 0).
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Tuple, Union
+
+from sqlalchemy import func, insert, select, update, bindparam
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+from app.core.doccodec import doc_codec, train_dict
+from app.models.telemetry import Telemetry, TelemetryDict, TelemetryRaw
+
+# tipo -> (tabela, coluna)
+_KINDS = {"raw": (TelemetryRaw, "raw_json"), "doc": (Telemetry, "doc_json")}
+
+def _seed_samples() -> Dict[str, List[str]]:
+    """Amostras sintéticas (banco vazio): variações do payload com e sem cada bloco."""
+    from app.crud.telemetry import build_rows
+    from app.schemas.telemetry import TelemetryIn
+
+    out: Dict[str, List[str]] = {"raw": [], "doc": []}
+    ts = int(time.time() * 1000)
+    for i, (gps, imu, drive) in enumerate([(1, 1, 1), (1, 0, 1), (0, 1, 1), (1, 1, 0)]):
+        car: Dict[str, Any] = {}
+        if gps:
+            car["gps"] = {"latitude": -23.5586 + i * 1e-4, "longitude": -46.6492 - i * 1e-4}
+        if imu:
+            car["imu"] = {"accelerationX": 10 - i, "accelerationY": -3, "accelerationZ": 60, "spinX": 1,
+                          "spinY": 2 * i, "spinZ": -5, "scale_dps": 500}
+        if drive:
+            car["drive"] = {"pwm": 120 + i, "speed_est_mps": 3.33 + i / 10}
+        payload = {"car": car, "centric": {"controls": {"curve_direction": 49 * i, "speed": 120 + i,
+                                                        "movement_direction": i % 2}}, "src": "central"}
+        raw_row, tel_row, _ = build_rows(TelemetryIn.model_validate(payload), ts + i)
+        out["raw"].append(raw_row["raw_json"])
+        out["doc"].append(tel_row["doc_json"])
+    return out
+
+def _recent(conn: Union[Connection, Any], kind: str, n: int) -> List[str]:
+    table, col = _KINDS[kind]
+    rows = conn.execute(select(getattr(table, col)).order_by(table.id.desc()).limit(n)).scalars().all()
+    return list(reversed(rows))
+
+def _add(conn: Connection, kind: str, data: bytes) -> int:
+    did = conn.execute(
+        insert(TelemetryDict).values(kind=kind, created_at=int(time.time() * 1000), data=data)
+    ).inserted_primary_key[0]
+    return int(did)
+
+def ensure_dicts(conn: Connection) -> None:
+    """Primeiro dicionário de cada tipo, se ainda não houver. Não faz commit."""
+    have = set(conn.execute(select(TelemetryDict.kind).distinct()).scalars().all())
+    seed = None
+    for kind in _KINDS:
+        if kind in have:
+            continue
+        samples = _recent(conn, kind, settings.DOC_DICT_SAMPLES)
+        if not samples:
+            seed = seed or _seed_samples()
+            samples = seed[kind]
+        data = train_dict(samples, settings.DOC_DICT_BYTES)
+        doc_codec.register(_add(conn, kind, data), kind, data)
+
+def train_dicts(bind: Engine) -> Dict[str, int]:
+    """Novo dicionário por tipo a partir das linhas mais recentes. Retorna `{tipo: id}`."""
+    out = {}
+    with bind.begin() as conn:
+        for kind in _KINDS:
+            samples = _recent(conn, kind, settings.DOC_DICT_SAMPLES)
+            if not samples:
+                continue
+            data = train_dict(samples, settings.DOC_DICT_BYTES)
+            out[kind] = _add(conn, kind, data)
+            doc_codec.register(out[kind], kind, data)
+    return out
+
+# onde a migração parou em cada tabela (id), para a próxima rodada seguir dali
+_migrated_upto: Dict[str, int] = {}
+
+def migrate_plain(bind: Engine, budget: int = 50_000, chunk: int = 2000) -> Dict[str, int]:
+    """Comprime até `budget` linhas ainda em texto puro, em transações de `chunk`.
+
+    Retorna quantas linhas foram regravadas por tipo. Sem efeito com a compressão desligada.
+    """
+    out = {kind: 0 for kind in _KINDS}
+    if not doc_codec.enabled:
+        return out
+    for kind, (table, col_name) in _KINDS.items():
+        col = getattr(table, col_name)
+        stmt = update(table).where(table.id == bindparam("_id")).values({col_name: bindparam("_v")})
+        after = _migrated_upto.get(kind, 0)
+        while out[kind] < budget:
+            with bind.begin() as conn:
+                rows: List[Tuple[int, str]] = conn.execute(
+                    select(table.id, col)
+                    .where(table.id > after, func.typeof(col) == "text")
+                    .order_by(table.id)
+                    .limit(chunk)
+                ).all()
+                if not rows:
+                    break
+                params = []
+                for rid, text in rows:
+                    v = doc_codec.encode(text, kind)
+                    if isinstance(v, bytes):
+                        params.append({"_id": rid, "_v": v})
+                if params:
+                    conn.execute(stmt, params)
+            after = rows[-1][0]
+            out[kind] += len(params)
+            if len(rows) < chunk:
+                break
+        _migrated_upto[kind] = after
+    return out
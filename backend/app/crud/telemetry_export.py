@@ -0,0 +1,236 @@
+"""Export em streaming de intervalos grandes (`/telemetry/export`, `/telemetry/raw/export`).
+
+As linhas saem em ordem crescente de tempo, juntando as camadas na hora:
+
+- `telemetry`: segmentos frios (janela a janela) + SQLite, combinados por
+  `heapq.merge`;
+- `telemetry_raw`: partições antigas (uma de cada vez) + banco principal.
+
+Nada é acumulado: cada fonte é lida em blocos de `EXPORT_BATCH_ROWS` e a saída
+é emitida em pedaços de ~64 KiB (opcionalmente em gzip). A memória não depende
+do tamanho do intervalo. No banco principal cada bloco é uma consulta keyset
+própria (conexão do pool de leitura devolvida entre blocos), então um export
+lento não segura um snapshot do WAL, que impediria o checkpoint, nem uma
+conexão de leitura durante o download inteiro. As partições, que não recebem
+escrita, usam cursor no servidor (`yield_per`).
+
+Formatos: `ndjson` (um documento por linha, igual a `/list?fast=true`), `csv`
+(colunas achatadas nos caminhos do `TelemetryOut` / `TelemetryIn`) e
+`columnar` (NDJSON de blocos `{"n": k, "columns": {caminho: [valores]}}`).
+"""
+from __future__ import annotations
+
+import csv
+import heapq
+import io
+import itertools
+import json
+import typing
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+
+from app.core.config import settings
+from app.core.db import ReadSessionLocal
+from app.crud.telemetry_archive import archive_store, iter_segment_docs
+from app.crud.telemetry_raw import _to_doc
+from app.crud.telemetry_raw_partitions import raw_partitions
+from app.models.telemetry import Telemetry, TelemetryRaw
+from app.schemas.telemetry import TelemetryIn, TelemetryOut
+
+FORMATS = ("ndjson", "csv", "columnar")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8", "columnar": "application/x-ndjson"}
+_CHUNK_BYTES = 64 * 1024
+
+Path = Tuple[str, ...]
+
+# --- caminhos do schema ---------------------------------------------------------------
+def _model_of(annotation: Any) -> Optional[type]:
+    for t in (annotation, *typing.get_args(annotation)):
+        if isinstance(t, type) and issubclass(t, BaseModel):
+            return t
+    return None
+
+def schema_paths(model: type, prefix: Path = ()) -> List[Path]:
+    """Folhas do schema Pydantic, na ordem de declaração (ex.: `car.gps.latitude`)."""
+    out: List[Path] = []
+    for name, field in model.model_fields.items():
+        sub = _model_of(field.annotation)
+        if sub is None:
+            out.append(prefix + (name,))
+        else:
+            out.extend(schema_paths(sub, prefix + (name,)))
+    return out
+
+TELEMETRY_PATHS = schema_paths(TelemetryOut)
+RAW_PATHS = [("received_at",), ("src",)] + [("raw",) + p for p in schema_paths(TelemetryIn) if p != ("src",)]
+
+def parse_paths(fields: Optional[str], leaves: Sequence[Path], always: Sequence[Path]) -> Tuple[Optional[List[Path]], List[Path]]:
+    """`fields` ("car.gps,centric.controls.speed") -> (caminhos pedidos, colunas achatadas).
+
+    Um caminho pode ser uma folha ou um prefixo dela. `always` vai sempre junto.
+    Levanta ValueError em caminho desconhecido.
+    """
+    if not fields:
+        return None, list(leaves)
+    wanted: List[Path] = []
+    for f in fields.split(","):
+        parts = tuple(p for p in f.strip().split(".") if p)
+        if not parts:
+            continue
+        if not any(leaf[: len(parts)] == parts for leaf in leaves):
+            raise ValueError(f"campo desconhecido: {f.strip()!r}")
+        wanted.append(parts)
+    if not wanted:
+        return None, list(leaves)
+    wanted = list(always) + [p for p in wanted if p not in always]
+    columns = [leaf for leaf in leaves if any(leaf[: len(p)] == p for p in wanted)]
+    return wanted, columns
+
+def _get(doc: Any, path: Path) -> Any:
+    for part in path:
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+def _project(doc: Dict[str, Any], paths: Sequence[Path]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for path in paths:
+        cur: Any = doc
+        for part in path:
+            if not isinstance(cur, dict) or part not in cur:
+                break
+            cur = cur[part]
+        else:
+            dst = out
+            for part in path[:-1]:
+                dst = dst.setdefault(part, {})
+            dst[path[-1]] = cur
+    return out
+
+# --- fontes ----------------------------------------------------------------------------------
+def _keyset(q, key_cols: Sequence[Any]) -> Iterator[Any]:
+    """Linhas de `q` em ordem de `key_cols`, um bloco de `EXPORT_BATCH_ROWS` por consulta."""
+    chunk = max(1, settings.EXPORT_BATCH_ROWS)
+    key = tuple_(*key_cols)
+    after: Optional[Tuple[Any, ...]] = None
+    while True:
+        page = q if after is None else q.where(key > after)
+        with ReadSessionLocal() as db:
+            rows = db.execute(page.order_by(*key_cols).limit(chunk)).all()
+        yield from rows
+        if len(rows) < chunk:
+            return
+        after = tuple(rows[-1][:len(key_cols)])
+
+def _hot_docs(start_ts: int, end_ts: int, src: Optional[str]) -> Iterator[Tuple[int, int, str]]:
+    q = select(Telemetry.ts, Telemetry.id, Telemetry.doc_json).where(Telemetry.ts >= start_ts, Telemetry.ts <= end_ts)
+    if src is not None:
+        q = q.where(Telemetry.src == src)
+    for r in _keyset(q, (Telemetry.ts, Telemetry.id)):
+        yield r[0], r[1], r[2]
+
+def _cold_docs(start_ts: int, end_ts: int, src: Optional[str]) -> Iterator[Tuple[int, int, str]]:
+    segs = archive_store.segments(start_ts, end_ts, *([] if src is None else [src]))
+    segs.sort(key=lambda s: s.meta["window_start"])
+    # uma janela por vez (um segmento por src nela), em ordem
+    for _, group in itertools.groupby(segs, key=lambda s: s.meta["window_start"]):
+        yield from heapq.merge(*(iter_segment_docs(s, start_ts, end_ts) for s in group))
+
+def telemetry_docs(start_ts: int, end_ts: int, src: Optional[str] = None) -> Iterator[str]:
+    """`doc_json` de [start_ts, end_ts] em ordem (ts, id), frio + quente."""
+    for _, _, doc in heapq.merge(_cold_docs(start_ts, end_ts, src), _hot_docs(start_ts, end_ts, src)):
+        yield doc
+
+def _raw_query(lo: int, hi: int, src: Optional[str]):
+    q = select(TelemetryRaw.received_at, TelemetryRaw.id, TelemetryRaw.src, TelemetryRaw.raw_json).where(
+        TelemetryRaw.received_at >= lo, TelemetryRaw.received_at <= hi
+    )
+    if src is not None:
+        q = q.where(TelemetryRaw.src == src)
+    return q
+
+def _raw_rows_main(lo: int, hi: int, src: Optional[str]) -> Iterator[Any]:
+    yield from _keyset(_raw_query(lo, hi, src), (TelemetryRaw.received_at, TelemetryRaw.id))
+
+def _raw_rows_parts(lo: int, hi: int, src: Optional[str]) -> Iterator[Any]:
+    for start in reversed(raw_partitions.overlapping(lo, hi)):
+        try:
+            with raw_partitions.engine(start).connect() as conn:
+                q = _raw_query(lo, hi, src).order_by(TelemetryRaw.received_at, TelemetryRaw.id)
+                yield from conn.execute(q.execution_options(yield_per=settings.EXPORT_BATCH_ROWS))
+        except Exception:
+            continue  # partição expirada no meio do export
+
+def raw_docs(lo: int, hi: int, src: Optional[str] = None) -> Iterator[str]:
+    """Itens de `telemetry_raw` (formato de `/raw/list?fast=true`) em ordem (received_at, id)."""
+    rows = heapq.merge(_raw_rows_parts(lo, hi, src), _raw_rows_main(lo, hi, src), key=lambda r: (r.received_at, r.id))
+    for r in rows:
+        yield _to_doc(r)
+
+# --- codificação --------------------------------------------------------------------------------
+def _cell(v: Any) -> Any:
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, ensure_ascii=False, separators=(",", ":"))
+    return v
+
+def _encode(docs: Iterable[str], fmt: str, paths: Optional[List[Path]], columns: List[Path]) -> Iterator[str]:
+    if fmt == "ndjson":
+        for doc in docs:
+            if paths is not None:
+                doc = json.dumps(_project(json.loads(doc), paths), ensure_ascii=False, separators=(",", ":"))
+            yield doc + "\n"
+        return
+
+    names = [".".join(c) for c in columns]
+    if fmt == "csv":
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n")
+        w.writerow(names)
+        for doc in docs:
+            d = json.loads(doc)
+            w.writerow([_cell(_get(d, c)) for c in columns])
+            if buf.tell() >= _CHUNK_BYTES // 4:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+        return
+
+    block = max(1, settings.EXPORT_BATCH_ROWS)
+    it = iter(docs)
+    while True:
+        batch = [json.loads(d) for d in itertools.islice(it, block)]
+        if not batch:
+            return
+        cols = {name: [_get(d, c) for d in batch] for name, c in zip(names, columns)}
+        yield json.dumps({"n": len(batch), "columns": cols}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def stream(docs: Iterable[str], fmt: str, paths: Optional[List[Path]], columns: List[Path], gzip: bool = False) -> Iterator[bytes]:
+    """Bytes da resposta, em pedaços de ~64 KiB (gzip opcional, comprimido no caminho)."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    pending: List[bytes] = []
+    size = 0
+    for text in _encode(docs, fmt, paths, columns):
+        b = text.encode("utf-8")
+        pending.append(b)
+        size += len(b)
+        if size >= _CHUNK_BYTES:
+            data = b"".join(pending)
+            pending, size = [], 0
+            if z is not None:
+                data = z.compress(data)
+            if data:
+                yield data
+    data = b"".join(pending)
+    if z is not None:
+        data = z.compress(data) + z.flush()
+    if data:
+        yield data
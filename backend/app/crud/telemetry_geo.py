@@ -0,0 +1,140 @@
+"""Índice espacial de `telemetry` (R*Tree do SQLite) e consultas geo.
+
+`telemetry_geo` é uma tabela virtual `rtree` com uma caixa degenerada por linha
+com GPS — `(lat, lat, lon, lon, ts, ts)` — com a mesma chave de `telemetry.id`.
+Ela é mantida por triggers em `telemetry` (insert/update/delete), então a
+ingestão, a selagem da camada fria e a retenção não precisam saber dela.
+
+O R*Tree guarda float32 e arredonda as caixas para fora: ele só seleciona
+candidatos, e o filtro exato é refeito sobre `telemetry.lat/lon/ts`. As linhas
+já seladas em segmentos entram por `cold_geo` (poda pelo `bbox` do segmento).
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.telemetry_archive import archive_store, cold_geo
+from app.models.telemetry import Telemetry
+
+GEO_TABLE = "telemetry_geo"
+EARTH_RADIUS_M = 6_371_008.8
+
+_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {GEO_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon, min_ts, max_ts)",
+    f"""CREATE TRIGGER IF NOT EXISTS {GEO_TABLE}_ai AFTER INSERT ON telemetry
+        WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL BEGIN
+        INSERT INTO {GEO_TABLE} VALUES (new.id, new.lat, new.lat, new.lon, new.lon, new.ts, new.ts);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {GEO_TABLE}_au AFTER UPDATE OF lat, lon, ts ON telemetry BEGIN
+        DELETE FROM {GEO_TABLE} WHERE id = old.id;
+        INSERT INTO {GEO_TABLE} SELECT new.id, new.lat, new.lat, new.lon, new.lon, new.ts, new.ts
+        WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {GEO_TABLE}_ad AFTER DELETE ON telemetry BEGIN
+        DELETE FROM {GEO_TABLE} WHERE id = old.id;
+    END""",
+]
+
+def ensure_geo_index(conn: Connection) -> None:
+    """Cria o R*Tree e os triggers; num banco antigo, indexa as linhas existentes. Não faz commit."""
+    existed = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": GEO_TABLE}
+    ).first() is not None
+    for ddl in _DDL:
+        conn.exec_driver_sql(ddl)
+    if not existed:
+        conn.exec_driver_sql(
+            f"INSERT INTO {GEO_TABLE} SELECT id, lat, lat, lon, lon, ts, ts FROM telemetry "
+            "WHERE lat IS NOT NULL AND lon IS NOT NULL"
+        )
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def radius_bbox(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """Caixa `(min_lat, max_lat, min_lon, max_lon)` que contém o círculo (sem cruzar o antimeridiano)."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+    dlon = 180.0 if cos_lat <= 0 else min(180.0, dlat / cos_lat)
+    return max(-90.0, lat - dlat), min(90.0, lat + dlat), max(-180.0, lon - dlon), min(180.0, lon + dlon)
+
+def _hot_geo(
+    db: Session, min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+    start_ts: Optional[int], end_ts: Optional[int], src: Optional[str],
+) -> Iterator[Tuple[int, int, float, float, str]]:
+    conds = [
+        "g.min_lat <= :max_lat", "g.max_lat >= :min_lat", "g.min_lon <= :max_lon", "g.max_lon >= :min_lon",
+        "t.lat BETWEEN :min_lat AND :max_lat", "t.lon BETWEEN :min_lon AND :max_lon",
+    ]
+    params: dict = {"min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon}
+    if start_ts is not None:
+        conds += ["g.max_ts >= :start_ts", "t.ts >= :start_ts"]
+        params["start_ts"] = int(start_ts)
+    if end_ts is not None:
+        conds += ["g.min_ts <= :end_ts", "t.ts <= :end_ts"]
+        params["end_ts"] = int(end_ts)
+    if src is not None:
+        conds.append("t.src = :src")
+        params["src"] = src
+    q = text(
+        f"SELECT t.ts, t.id, t.lat, t.lon, t.doc_json FROM {GEO_TABLE} g JOIN telemetry t ON t.id = g.id "
+        f"WHERE {' AND '.join(conds)} ORDER BY t.ts, t.id"
+    ).columns(doc_json=Telemetry.__table__.c.doc_json.type)  # descomprime (CompressedText)
+    for r in db.execute(q.execution_options(yield_per=settings.EXPORT_BATCH_ROWS), params):
+        yield r[0], r[1], r[2], r[3], r[4]
+
+def _matches(
+    db: Session, min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+    start_ts: Optional[int], end_ts: Optional[int], src: Optional[str],
+) -> Iterator[Tuple[int, int, float, float, str]]:
+    hot = _hot_geo(db, min_lat, max_lat, min_lon, max_lon, start_ts, end_ts, src)
+    if archive_store.empty():
+        return hot
+    return heapq.merge(cold_geo(min_lat, max_lat, min_lon, max_lon, start_ts, end_ts, src), hot)
+
+def bbox_docs(
+    db: Session,
+    min_lat: float,
+    max_lat: float,
+    min_lon: float,
+    max_lon: float,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    src: Optional[str] = None,
+    limit: int = 1000,
+) -> List[str]:
+    """`doc_json` das amostras dentro da caixa (e do intervalo/origem), em ordem crescente de ts."""
+    out: List[str] = []
+    for *_, doc in _matches(db, min_lat, max_lat, min_lon, max_lon, start_ts, end_ts, src):
+        out.append(doc)
+        if len(out) >= limit:
+            break
+    return out
+
+def near_docs(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_m: float,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    src: Optional[str] = None,
+    limit: int = 1000,
+) -> List[str]:
+    """`doc_json` das amostras a até `radius_m` metros de (lat, lon), em ordem crescente de ts."""
+    out: List[str] = []
+    for _, _, plat, plon, doc in _matches(db, *radius_bbox(lat, lon, radius_m), start_ts, end_ts, src):
+        if haversine_m(lat, lon, plat, plon) <= radius_m:
+            out.append(doc)
+            if len(out) >= limit:
+                break
+    return out
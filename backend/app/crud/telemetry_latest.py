@@ -0,0 +1,54 @@
+
+"""Estado mais recente por `src` (tabela `telemetry_latest`)."""
+from __future__ import annotations
+from typing import Any, Dict, List, Union
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.telemetry import Telemetry, TelemetryLatest
+
+def newest_per_src(tel_rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Linha mais recente (maior ts; empate = a última) de cada src no lote."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in tel_rows:
+        src = r.get("src") or ""
+        cur = out.get(src)
+        if cur is None or r["ts"] >= cur["ts"]:
+            out[src] = r
+    return out
+
+def apply_latest(conn: Union[Session, Connection], tel_rows: List[Dict[str, Any]]) -> None:
+    """UPSERT do último doc por src, na transação da inserção. Não faz commit."""
+    if not tel_rows:
+        return
+    params = [
+        {"src": src, "ts": r["ts"], "updated_at": r["updated_at"], "doc_json": r["doc_json"]}
+        for src, r in newest_per_src(tel_rows).items()
+    ]
+    t = TelemetryLatest.__table__
+    stmt = sqlite_insert(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.src],
+        set_={"ts": stmt.excluded.ts, "updated_at": stmt.excluded.updated_at, "doc_json": stmt.excluded.doc_json},
+        where=stmt.excluded.ts >= t.c.ts,
+    )
+    conn.execute(stmt, params)
+
+def load_latest(db: Union[Session, Connection]) -> List[Any]:
+    """Todas as linhas de `telemetry_latest` (src, ts, updated_at, doc_json)."""
+    return db.execute(select(TelemetryLatest.src, TelemetryLatest.ts, TelemetryLatest.updated_at, TelemetryLatest.doc_json)).all()
+
+def backfill_latest(conn: Union[Session, Connection]) -> None:
+    """Preenche `telemetry_latest` a partir de `telemetry` (bancos anteriores à tabela). Não faz commit.
+
+    Com um único max() no SELECT, o SQLite devolve as demais colunas da linha do máximo.
+    """
+    src = func.coalesce(Telemetry.src, "")
+    sel = select(src, func.max(Telemetry.ts), Telemetry.updated_at, Telemetry.doc_json).group_by(src)
+    conn.execute(
+        sqlite_insert(TelemetryLatest)
+        .from_select(["src", "ts", "updated_at", "doc_json"], sel)
+        .on_conflict_do_nothing()
+    )
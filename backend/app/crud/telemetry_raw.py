@@ -1,23 +1,72 @@
 
 from __future__ import annotations
 import json
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from app.models.telemetry import TelemetryRaw
+from app.crud.cursor import encode_cursor, decode_cursor
+from app.crud.telemetry_raw_partitions import fan_out, raw_partitions
 
-def get_latest_raw(db: Session) -> Optional[Dict[str, Any]]:
-    row = db.query(TelemetryRaw).order_by(TelemetryRaw.received_at.desc()).first()
-    if not row:
-        return None
+def _to_dict(r) -> Optional[Dict[str, Any]]:
     try:
         return {
-            "received_at": row.received_at,
-            "src": row.src,
-            "raw": json.loads(row.raw_json),
+            "received_at": r.received_at,
+            "src": r.src,
+            "raw": json.loads(r.raw_json),
         }
     except Exception:
         return None
 
+def _to_doc(r) -> str:
+    """Mesmo formato de `_to_dict`, montado por concatenação sobre o `raw_json` já armazenado."""
+    return f'{{"received_at":{int(r.received_at)},"src":{json.dumps(r.src)},"raw":{r.raw_json}}}'
+
+def _filters(start_received_at: Optional[int], end_received_at: Optional[int], before: Optional[Tuple[int, int]] = None):
+    conds = []
+    if start_received_at is not None:
+        conds.append(TelemetryRaw.received_at >= int(start_received_at))
+    if end_received_at is not None:
+        conds.append(TelemetryRaw.received_at <= int(end_received_at))
+    if before is not None:
+        conds.append(tuple_(TelemetryRaw.received_at, TelemetryRaw.id) < before)
+    return conds
+
+def _range_query(db: Session, start_received_at: Optional[int], end_received_at: Optional[int]):
+    q = db.query(TelemetryRaw.id, TelemetryRaw.received_at, TelemetryRaw.src, TelemetryRaw.raw_json)
+    return q.filter(*_filters(start_received_at, end_received_at))
+
+def _with_partitions(hot, want: int, start_received_at: Optional[int], end_received_at: Optional[int],
+                     before: Optional[Tuple[int, int]] = None):
+    """Completa as linhas do banco principal com as partições antigas que cruzam o intervalo."""
+    if raw_partitions.empty():
+        return hot
+    conds = _filters(start_received_at, end_received_at, before)
+    hi = end_received_at
+    if before is not None:
+        hi = before[0] if hi is None else min(hi, before[0])
+    return fan_out(hot, want, start_received_at, hi, lambda q: q.where(*conds))
+
+def _latest_row(db: Session):
+    hot = _range_query(db, None, None).order_by(TelemetryRaw.received_at.desc(), TelemetryRaw.id.desc()).limit(1).all()
+    rows = _with_partitions(hot, 1, None, None)
+    return rows[0] if rows else None
+
+def get_latest_raw(db: Session) -> Optional[Dict[str, Any]]:
+    row = _latest_row(db)
+    return _to_dict(row) if row else None
+
+def get_latest_raw_doc(db: Session) -> Optional[str]:
+    row = _latest_row(db)
+    return _to_doc(row) if row else None
+
+def _offset_rows(db: Session, limit: int, offset: int, start_received_at: Optional[int], end_received_at: Optional[int]):
+    q = _range_query(db, start_received_at, end_received_at).order_by(TelemetryRaw.received_at.desc(), TelemetryRaw.id.desc())
+    if raw_partitions.empty():
+        return q.offset(offset).limit(limit).all()
+    want = offset + limit
+    return _with_partitions(q.limit(want).all(), want, start_received_at, end_received_at)[offset:]
+
 def list_raw_range(
     db: Session,
     limit: int = 100,
@@ -25,20 +74,47 @@ def list_raw_range(
     start_received_at: Optional[int] = None,
     end_received_at: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
-    q = db.query(TelemetryRaw)
-    if start_received_at is not None:
-        q = q.filter(TelemetryRaw.received_at >= int(start_received_at))
-    if end_received_at is not None:
-        q = q.filter(TelemetryRaw.received_at <= int(end_received_at))
-    rows = q.order_by(TelemetryRaw.received_at.desc()).offset(offset).limit(limit).all()
-    out = []
-    for r in rows:
-        try:
-            out.append({
-                "received_at": r.received_at,
-                "src": r.src,
-                "raw": json.loads(r.raw_json),
-            })
-        except Exception:
-            continue
-    return out
+    rows = _offset_rows(db, limit, offset, start_received_at, end_received_at)
+    return [d for d in map(_to_dict, rows) if d is not None]
+
+def list_raw_range_docs(
+    db: Session,
+    limit: int = 100,
+    offset: int = 0,
+    start_received_at: Optional[int] = None,
+    end_received_at: Optional[int] = None,
+) -> List[str]:
+    """Como `list_raw_range`, mas devolve cada item como texto JSON (sem json.loads)."""
+    rows = _offset_rows(db, limit, offset, start_received_at, end_received_at)
+    return [_to_doc(r) for r in rows]
+
+def _keyset_rows(db: Session, limit: int, cursor: Optional[str], start_received_at: Optional[int], end_received_at: Optional[int]):
+    q = _range_query(db, start_received_at, end_received_at)
+    before = decode_cursor(cursor) if cursor else None
+    if before is not None:
+        q = q.filter(tuple_(TelemetryRaw.received_at, TelemetryRaw.id) < before)
+    rows = q.order_by(TelemetryRaw.received_at.desc(), TelemetryRaw.id.desc()).limit(limit).all()
+    rows = _with_partitions(rows, limit, start_received_at, end_received_at, before)
+    next_cursor = encode_cursor(rows[-1].received_at, rows[-1].id) if len(rows) == limit else None
+    return rows, next_cursor
+
+def list_raw_range_keyset(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start_received_at: Optional[int] = None,
+    end_received_at: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Paginação por chave `(received_at, id)` desc. Levanta ValueError se o cursor for inválido."""
+    rows, next_cursor = _keyset_rows(db, limit, cursor, start_received_at, end_received_at)
+    return [d for d in map(_to_dict, rows) if d is not None], next_cursor
+
+def list_raw_range_keyset_docs(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    start_received_at: Optional[int] = None,
+    end_received_at: Optional[int] = None,
+) -> Tuple[List[str], Optional[str]]:
+    rows, next_cursor = _keyset_rows(db, limit, cursor, start_received_at, end_received_at)
+    return [_to_doc(r) for r in rows], next_cursor
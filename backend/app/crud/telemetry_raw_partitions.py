@@ -0,0 +1,241 @@
+"""Partições por tempo de `telemetry_raw`: um arquivo SQLite por período.
+
+O banco principal guarda só o período corrente (`RAW_PARTITION_MS`, padrão um
+dia, por `received_at`). `seal_raw_partitions` move cada período já fechado
+para `<PARTITION_DIR>/raw_<início>.db` (mesma tabela e índices) em blocos:
+cópia via `ATTACH` + `INSERT OR IGNORE ... SELECT` e depois `DELETE` no
+principal — as páginas liberadas são reaproveitadas pelas inserções seguintes,
+então o arquivo principal para de crescer. Expirar (`expire_raw_partitions`) é
+apagar arquivos inteiros, sem `DELETE` nem `VACUUM`.
+
+As leituras de `crud/telemetry_raw.py` consultam o principal e só as partições
+que cruzam o intervalo pedido (somente leitura, uma engine por arquivo).
+"""
+from __future__ import annotations
+
+import glob
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.core.db import Base, _apply_pragmas, _reader_pragmas
+from app.models.telemetry import TelemetryRaw
+
+_NAME = re.compile(r"raw_(\d{13})\.db$")
+
+class RawPartitions:
+    """Diretório de partições; o índice é relido quando o diretório muda."""
+
+    def __init__(self, root: str, period_ms: int) -> None:
+        self.root = root
+        self.period_ms = int(period_ms)
+        self._lock = threading.Lock()
+        self._sig: Optional[Tuple[int, int]] = None
+        self._starts: List[int] = []  # desc
+        self._engines: Dict[int, Engine] = {}
+
+    def path_for(self, start: int) -> str:
+        return os.path.join(self.root, f"raw_{int(start):013d}.db")
+
+    def _refresh(self) -> List[int]:
+        try:
+            st = os.stat(self.root)
+        except FileNotFoundError:
+            return []
+        sig = (st.st_mtime_ns, st.st_ino)
+        if sig != self._sig:
+            with self._lock:
+                if sig != self._sig:
+                    starts = []
+                    for path in glob.glob(os.path.join(self.root, "raw_*.db")):
+                        m = _NAME.search(path)
+                        if m:
+                            starts.append(int(m.group(1)))
+                    self._starts, self._sig = sorted(starts, reverse=True), sig
+        return self._starts
+
+    def empty(self) -> bool:
+        return not self._refresh()
+
+    def engine(self, start: int) -> Engine:
+        eng = self._engines.get(start)
+        if eng is None:
+            with self._lock:
+                eng = self._engines.get(start)
+                if eng is None:
+                    eng = create_engine(
+                        f"sqlite:///file:{self.path_for(start)}?mode=ro&uri=true",
+                        connect_args={"check_same_thread": False},
+                        poolclass=NullPool,
+                    )
+                    _apply_pragmas(eng, _reader_pragmas())
+                    self._engines[start] = eng
+        return eng
+
+    def overlapping(self, lo: Optional[int] = None, hi: Optional[int] = None) -> List[int]:
+        """Inícios das partições com algum `received_at` em [lo, hi], do mais novo ao mais velho."""
+        return [
+            s for s in self._refresh()
+            if (lo is None or s + self.period_ms > lo) and (hi is None or s <= hi)
+        ]
+
+    def drop(self, start: int) -> None:
+        with self._lock:
+            eng = self._engines.pop(start, None)
+        if eng is not None:
+            eng.dispose()
+        path = self.path_for(start)
+        for p in (path, f"{path}-journal"):
+            try:
+                os.unlink(p)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        starts = self._refresh()
+        return {
+            "dir": self.root,
+            "period_ms": self.period_ms,
+            "partitions": len(starts),
+            "oldest": starts[-1] if starts else None,
+            "bytes": sum(os.path.getsize(self.path_for(s)) for s in starts if os.path.exists(self.path_for(s))),
+        }
+
+raw_partitions = RawPartitions(
+    settings.PARTITION_DIR or os.path.join(os.path.dirname(settings.SQLITE_PATH) or ".", "partitions"),
+    settings.RAW_PARTITION_MS,
+)
+
+# --- selagem / expiração ------------------------------------------------------------------
+def _create(path: str) -> None:
+    eng = create_engine(f"sqlite:///{path}")
+    try:
+        Base.metadata.create_all(bind=eng, tables=[TelemetryRaw.__table__])
+    finally:
+        eng.dispose()
+
+_COPY = (
+    "INSERT OR IGNORE INTO part.telemetry_raw (id, received_at, src, raw_json) "
+    "SELECT id, received_at, src, raw_json FROM main.telemetry_raw "
+    "WHERE received_at >= ? AND received_at < ? AND id <= ?"
+)
+_DELETE = "DELETE FROM main.telemetry_raw WHERE received_at >= ? AND received_at < ? AND id <= ?"
+_CHUNK_MAX_ID = (
+    "SELECT max(id) FROM (SELECT id FROM main.telemetry_raw "
+    "WHERE received_at >= ? AND received_at < ? ORDER BY id LIMIT ?)"
+)
+
+def seal_raw_partitions(
+    bind: Engine,
+    parts: RawPartitions = raw_partitions,
+    now_ms: Optional[int] = None,
+    chunk: int = 5000,
+) -> Dict[str, int]:
+    """Move os períodos fechados de `telemetry_raw` para os arquivos de partição.
+
+    Cada bloco é copiado (INSERT OR IGNORE: repetir é seguro) e só depois apagado
+    do principal, em transações curtas, soltando a conexão de escrita entre blocos.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+    period = parts.period_ms
+    cutoff = (now_ms // period) * period
+    with bind.connect() as conn:
+        oldest = conn.exec_driver_sql("SELECT min(received_at) FROM telemetry_raw").scalar()
+    out = {"partitions": 0, "rows": 0}
+    if oldest is None or oldest >= cutoff:
+        return out
+    os.makedirs(parts.root, exist_ok=True)
+
+    for lo in range((int(oldest) // period) * period, cutoff, period):
+        hi = lo + period
+        path = parts.path_for(lo)
+        moved = 0
+        while True:
+            with bind.connect() as conn:
+                max_id = conn.exec_driver_sql(_CHUNK_MAX_ID, (lo, hi, chunk)).scalar()
+                if max_id is None:
+                    break
+                if not os.path.exists(path):
+                    _create(path)
+                conn.exec_driver_sql("ATTACH DATABASE ? AS part", (path,))
+                try:
+                    conn.exec_driver_sql(_COPY, (lo, hi, max_id))
+                    conn.commit()
+                    moved += conn.exec_driver_sql(_DELETE, (lo, hi, max_id)).rowcount
+                    conn.commit()
+                finally:
+                    conn.rollback()
+                    conn.exec_driver_sql("DETACH DATABASE part")
+        if moved:
+            out["partitions"] += 1
+            out["rows"] += moved
+    return out
+
+def expire_raw_partitions(
+    retention_ms: int,
+    parts: RawPartitions = raw_partitions,
+    now_ms: Optional[int] = None,
+) -> int:
+    """Apaga as partições inteiramente mais velhas que `retention_ms`. Retorna quantas."""
+    if retention_ms <= 0:
+        return 0
+    now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+    dropped = 0
+    for start in list(parts._refresh()):
+        if start + parts.period_ms <= now_ms - retention_ms:
+            parts.drop(start)
+            dropped += 1
+    return dropped
+
+# --- leitura ---------------------------------------------------------------------------------
+_COLS = (TelemetryRaw.id, TelemetryRaw.received_at, TelemetryRaw.src, TelemetryRaw.raw_json)
+
+def _key(r: Any) -> Tuple[int, int]:
+    return (int(r.received_at), int(r.id))
+
+def fan_out(
+    hot: List[Any],
+    want: int,
+    lo: Optional[int],
+    hi: Optional[int],
+    where: Callable[[Any], Any],
+    parts: RawPartitions = raw_partitions,
+) -> List[Any]:
+    """Junta as `want` maiores linhas por `(received_at, id)` do principal (`hot`, já
+    ordenadas desc) e das partições em [lo, hi]; `where(select)` aplica os filtros.
+
+    As partições são visitadas da mais nova para a mais velha e a busca para quando
+    nenhuma restante pode ter linha maior que a `want`-ésima já encontrada.
+    """
+    if want <= 0:
+        return []
+    sources: List[Iterable[Any]] = [hot]
+    best_floor: Optional[Tuple[int, int]] = _key(hot[want - 1]) if len(hot) >= want else None
+    got = len(hot)
+    for start in parts.overlapping(lo, hi):
+        if best_floor is not None and got >= want and (start + parts.period_ms - 1, 1 << 62) < best_floor:
+            break
+        q = where(select(*_COLS)).order_by(TelemetryRaw.received_at.desc(), TelemetryRaw.id.desc()).limit(want)
+        try:
+            with parts.engine(start).connect() as conn:
+                rows = conn.execute(q).all()
+        except Exception:
+            continue  # partição expirada entre o índice e a consulta
+        if rows:
+            sources.append(rows)
+            got += len(rows)
+            floor = _key(rows[-1]) if len(rows) >= want else None
+            if floor is not None and (best_floor is None or floor > best_floor):
+                best_floor = floor
+    if len(sources) == 1:
+        return hot[:want]
+    return list(itertools.islice(heapq.merge(*sources, key=_key, reverse=True), want))
@@ -0,0 +1,368 @@
+"""Rederivação em lote do histórico de `telemetry` (`python -m app.cli rederive`).
+
+Os derivados — `centric.controls.derived`, `ts_iso`/`ts_local` e as colunas
+`steering_deg`, `speed_cmd_pct`, `speed_cmd_mps` e `movement_dir` — são
+calculados na ingestão com o `VMAX_MPS`/`API_TZ` e a regra de volante da época.
+Este job os recalcula para todo o histórico (quente e frio) com o código atual
+(`derive_controls` / `_iso_fields`), sem reingerir nada.
+
+- Entrada: o `doc_json` guarda `centric.controls` já validado, que é o que
+  `_derive` recebeu; nos segmentos frios, as colunas `curve_direction`,
+  `speed` e `movement_direction`. `telemetry_raw` não serve de fonte: não tem
+  ligação com o `id` de `telemetry` e expira antes (`RETENTION_RAW_MS`).
+- Os derivados dependem só de três inteiros de domínio pequeno (0..360,
+  0..255, 0..1): cada combinação é calculada uma vez por processo (`_derived`,
+  memoizada) e vale para o lote inteiro; por linha sobra decodificar e
+  recodificar o documento.
+- O histórico é dividido em faixas de tempo alinhadas às janelas de 1 h dos
+  rollups e às dos segmentos. Um pool de processos (`REDERIVE_WORKERS`) só lê e
+  calcula; o processo principal grava as faixas em ordem, em transações de
+  `REDERIVE_BATCH_ROWS` linhas com `REDERIVE_PAUSE_MS` de pausa entre elas, para
+  a ingestão ao vivo continuar pegando o lock de escrita.
+- Só linhas e segmentos que mudaram são regravados, e só as faixas alteradas
+  têm os rollups (e os sketches de quantis) refeitos; no fim, `telemetry_latest` e `trips` também.
+- Checkpoint em `<SQLITE_PATH>.rederive.json`: uma execução interrompida
+  continua da faixa seguinte à última concluída (se `VMAX_MPS`/`API_TZ` forem os
+  mesmos). O arquivo é apagado ao terminar.
+
+Processos da API já rodando mantêm o último documento de cada `src` em memória
+até a próxima amostra (ou reinício).
+"""
+from __future__ import annotations
+
+import glob
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.config import settings
+from app.core.doccodec import doc_codec
+from app.core.segments import forget, open_segment
+from app.crud.telemetry import _iso_fields, derive_controls
+from app.crud.telemetry_archive import ArchiveStore, _offset_min, _rebuild, _write, archive_store, doc_columns, local_offset
+from app.crud.telemetry_rollup import ROLLUP_RES_MS, accumulate, clear_rollups, rebuild_rollups
+from app.crud.telemetry_sketch import sketch_rows
+from app.crud.telemetry_track import track_cache
+from app.models.telemetry import NUMERIC_FIELDS, Telemetry, TelemetryLatest, TelemetryRollup, TelemetrySketch
+
+_COLS = ("steering_deg", "speed_cmd_pct", "speed_cmd_mps", "movement_dir")
+_TMP_SUFFIX = ".rederive"  # segmento regravado, à espera de entrar no lugar do original
+
+@lru_cache(maxsize=None)
+def _derived(cd: Any, speed: Any, mv: Any) -> Tuple[Dict[str, Any], Tuple[Any, ...]]:
+    """(bloco `derived`, valores de `_COLS`) de uma combinação de controles."""
+    d = derive_controls({"curve_direction": cd, "speed": speed, "movement_direction": mv})
+    front = 1 if d["movement_direction_text"] == "front" else 0
+    return d, (d["steering_deg"], d["speed_cmd_pct"], d["speed_cmd_mps"], front)
+
+def _rederive_doc(ts: int, doc_json: str) -> Optional[Tuple[str, Tuple[Any, ...], str, str]]:
+    """`(doc_json, valores de _COLS, ts_iso, ts_local)` refeitos; None se o documento não tem `controls`."""
+    try:
+        doc = json.loads(doc_json)
+        controls = doc["centric"]["controls"]
+        derived, cols = _derived(
+            controls.get("curve_direction", 0), controls.get("speed", 0), controls.get("movement_direction", 1)
+        )
+    except Exception:
+        return None
+    ts_iso, ts_local = _iso_fields(ts)
+    doc["ts_iso"], doc["ts_local"] = ts_iso, ts_local
+    controls["derived"] = derived
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":")), cols, ts_iso, ts_local
+
+# --- trabalho de uma faixa (roda nos processos do pool) --------------------------------
+def _hot_rows(lo: int, hi: int) -> Tuple[List[Dict[str, Any]], List[Tuple[Any, ...]]]:
+    """Linhas de `telemetry` em [lo, hi) já com os valores novos (para os rollups)
+    e os parâmetros do UPDATE das que mudaram."""
+    from app.core.db import read_engine
+
+    q = (
+        select(Telemetry.id, Telemetry.ts, Telemetry.src, Telemetry.ts_iso, Telemetry.ts_local,
+               *[getattr(Telemetry, f) for f in NUMERIC_FIELDS], Telemetry.doc_json)
+        .where(Telemetry.ts >= lo, Telemetry.ts < hi)
+        .order_by(Telemetry.ts, Telemetry.id)
+    )
+    rows, updates = [], []
+    with read_engine.connect() as conn:
+        for r in conn.execute(q.execution_options(yield_per=settings.REDERIVE_BATCH_ROWS)):
+            row = {f: getattr(r, f) for f in NUMERIC_FIELDS}
+            row["ts"], row["src"] = r.ts, r.src
+            rows.append(row)
+            new = _rederive_doc(r.ts, r.doc_json)
+            if new is None:
+                continue
+            doc, vals, ts_iso, ts_local = new
+            if doc == r.doc_json and (ts_iso, ts_local) == (r.ts_iso, r.ts_local) \
+                    and vals == tuple(row[c] for c in _COLS):
+                continue
+            row.update(zip(_COLS, vals))
+            updates.append((ts_iso, ts_local, *vals, doc_codec.encode(doc, "doc"), r.id))
+    return rows, updates
+
+def _sig(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+def _segment_rows(path: str) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str, Tuple[int, int, int]]]]:
+    """Linhas do segmento com os valores novos e, se alguma mudou, o segmento
+    regravado em `<path>.rederive`: `(path, temporário, assinatura lida)`."""
+    sig = _sig(path)
+    if sig is None:
+        return [], None  # expirou
+    seg = open_segment(path)
+    src = seg.meta["src"]
+    cols = doc_columns(seg, cache=False)
+    extras = seg.extras() if seg.meta.get("has_extras") else {}
+    rows = []
+    changed = False
+    for i in range(seg.n):
+        r = {name: col[i] for name, col in cols.items()}
+        r["src"] = src
+        rows.append(r)
+        doc = extras.get(i)
+        if doc is not None:  # documento verbatim (versão antiga): refaz o próprio documento
+            new = _rederive_doc(r["ts"], doc)
+            if new is None:
+                continue
+            r["doc_json"], vals = new[0], new[1]
+            r["tzo"] = _offset_min(new[3])
+            changed |= new[0] != doc
+        else:
+            tzo = local_offset(r["ts"])  # `ts_local` remontado segue o `API_TZ` corrente
+            if tzo != r.get("tzo"):
+                r["tzo"] = tzo
+                changed = True
+            try:
+                vals = _derived(r["curve_direction"], r["speed"], r["movement_direction"])[1]
+            except Exception:
+                continue
+        if vals != tuple(r[c] for c in _COLS):
+            r.update(zip(_COLS, vals))
+            changed = True
+    if not changed:
+        return rows, None
+    for i, r in enumerate(rows):
+        if i not in extras:
+            r["doc_json"] = _rebuild(src, r)
+    tmp = path + _TMP_SUFFIX
+    _write(ArchiveStore(os.path.dirname(path), seg.meta["window_ms"]), src, seg.meta["window_start"], rows, path=tmp)
+    return rows, (path, tmp, sig)
+
+def _derive_unit(lo: int, hi: int, seg_paths: List[str]) -> Dict[str, Any]:
+    """Tudo o que a faixa [lo, hi) precisa gravar, calculado sem escrever no banco."""
+    rows, updates = _hot_rows(lo, hi)
+    hot_rows = len(rows)
+    segments = []
+    for path in seg_paths:
+        seg_rows, seg = _segment_rows(path)
+        rows += seg_rows
+        if seg is not None:
+            segments.append(seg)
+    changed = bool(updates or segments)
+    return {
+        "lo": lo, "hi": hi, "seg_paths": seg_paths, "hot_rows": hot_rows, "rows": len(rows),
+        "updates": updates, "segments": segments,
+        # rollups da faixa inteira com os valores novos (só se algo mudou), na ordem de `_ROLLUP_COLS`
+        "rollups": [tuple(a[c] for c in _ROLLUP_COLS) for a in accumulate(rows).values()] if changed else [],
+        "sketches": [tuple(a[c] for c in _SKETCH_COLS) for a in sketch_rows(rows)] if changed else [],
+    }
+
+# --- orquestração (processo principal) -------------------------------------------------
+def _span() -> int:
+    return math.lcm(max(ROLLUP_RES_MS), archive_store.window_ms)
+
+def _units(span: int) -> List[Tuple[int, List[str]]]:
+    """Faixas `[lo, lo + span)` com dados (quentes ou frios), com os segmentos de cada uma."""
+    from app.core.db import read_engine
+
+    u = (Telemetry.ts // span).label("u")
+    with read_engine.connect() as conn:
+        hot = {int(x) * span for x in conn.execute(select(u).where(Telemetry.ts.is_not(None)).group_by(u)).scalars()}
+    cold: Dict[int, List[str]] = {}
+    for seg in archive_store.segments():
+        cold.setdefault(seg.meta["window_start"] // span * span, []).append(seg.path)
+    return [(lo, cold.get(lo, [])) for lo in sorted(hot | set(cold))]
+
+def _ordered(fn: Callable[..., Dict[str, Any]], jobs: List[Tuple[int, int, List[str]]], workers: int) -> Iterator[Dict[str, Any]]:
+    """Resultados na ordem das faixas; com pool, até `2 × workers` faixas adiantadas."""
+    if workers <= 1:
+        for job in jobs:
+            yield fn(*job)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        ahead, it = [], iter(jobs)
+        for job in it:
+            ahead.append(pool.submit(fn, *job))
+            if len(ahead) >= 2 * workers:
+                break
+        while ahead:
+            res = ahead.pop(0).result()
+            for job in it:
+                ahead.append(pool.submit(fn, *job))
+                break
+            yield res
+
+def _pause() -> None:
+    if settings.REDERIVE_PAUSE_MS > 0:
+        time.sleep(settings.REDERIVE_PAUSE_MS / 1000.0)
+
+# Escritas com tuplas direto no driver: o processo principal só executa o que o
+# pool preparou (o `doc_json` já vem comprimido), e o lock de escrita fica o
+# mínimo possível com a ingestão.
+_UPDATE_SQL = "UPDATE telemetry SET {} WHERE id = ?".format(
+    ", ".join(f"{c} = ?" for c in ("ts_iso", "ts_local", *_COLS, "doc_json"))
+)
+_ROLLUP_COLS = [c.name for c in TelemetryRollup.__table__.columns]
+_ROLLUP_SQL = "INSERT INTO telemetry_rollup ({}) VALUES ({})".format(
+    ", ".join(_ROLLUP_COLS), ", ".join("?" for _ in _ROLLUP_COLS)
+)
+_SKETCH_COLS = [c.name for c in TelemetrySketch.__table__.columns]
+_SKETCH_SQL = "INSERT INTO telemetry_sketch ({}) VALUES ({})".format(
+    ", ".join(_SKETCH_COLS), ", ".join("?" for _ in _SKETCH_COLS)
+)
+
+def _apply_updates(bind: Engine, updates: List[Tuple[Any, ...]]) -> None:
+    step = max(1, settings.REDERIVE_BATCH_ROWS)
+    for i in range(0, len(updates), step):
+        with bind.begin() as conn:
+            conn.exec_driver_sql(_UPDATE_SQL, updates[i:i + step])
+        _pause()
+
+def _install(segments: Iterable[Tuple[str, str, Tuple[int, int, int]]]) -> Tuple[int, bool]:
+    """Põe os segmentos regravados no lugar. Retorna `(instalados, ok)`; `ok` é
+    False se algum original mudou (selagem de linhas atrasadas) desde a leitura."""
+    n, ok = 0, True
+    for path, tmp, sig in segments:
+        if _sig(path) != sig:
+            ok = False
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+            continue
+        os.replace(tmp, path)
+        forget(path)
+        n += 1
+    return n, ok
+
+def _hot_count(conn: Connection, lo: int, hi: int) -> int:
+    return conn.execute(select(func.count()).where(Telemetry.ts >= lo, Telemetry.ts < hi)).scalar_one()
+
+def _rederive_latest(bind: Engine) -> int:
+    """Refaz o `doc_json` de `telemetry_latest` (cobre origens que só têm dados frios)."""
+    from app.core.db import read_engine
+
+    with read_engine.connect() as conn:
+        rows = conn.execute(select(TelemetryLatest.src, TelemetryLatest.ts, TelemetryLatest.doc_json)).all()
+    params = []
+    for src, ts, doc_json in rows:
+        new = _rederive_doc(ts, doc_json)
+        if new is not None and new[0] != doc_json:
+            params.append({"_src": src, "_ts": ts, "_doc_json": new[0]})
+    if params:
+        stmt = (
+            update(TelemetryLatest)
+            .where(TelemetryLatest.src == bindparam("_src"), TelemetryLatest.ts == bindparam("_ts"))
+            .values(doc_json=bindparam("_doc_json"))
+        )
+        with bind.begin() as conn:
+            conn.execute(stmt, params)
+    return len(params)
+
+def checkpoint_path() -> str:
+    return f"{settings.SQLITE_PATH}.rederive.json"
+
+def _fingerprint() -> Dict[str, Any]:
+    return {"vmax_mps": settings.VMAX_MPS, "tz": settings.API_TZ, "span_ms": _span()}
+
+def _save_state(path: str, state: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+def _load_state(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as fh:
+            state = json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+    return state if state.get("fingerprint") == _fingerprint() else None
+
+def rederive(
+    bind: Engine,
+    workers: Optional[int] = None,
+    restart: bool = False,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    """Recalcula os derivados de todo o histórico (ver módulo). Retorna contagens."""
+    from app.core.db import read_engine
+
+    _derived.cache_clear()  # `VMAX_MPS` pode ter mudado neste processo
+    workers = settings.REDERIVE_WORKERS if workers is None else int(workers)
+    if workers <= 0:
+        workers = max(1, (os.cpu_count() or 2) - 1)
+    span = _span()
+    ckpt = checkpoint_path()
+    state = None if restart else _load_state(ckpt)
+    if state is None:
+        state = {"fingerprint": _fingerprint(), "done_upto": None, "dirty": None}
+    for tmp in glob.glob(os.path.join(archive_store.root, "*.seg" + _TMP_SUFFIX)):
+        os.remove(tmp)  # sobra de uma execução interrompida
+
+    done = state["done_upto"]
+    jobs = [(lo, lo + span, paths) for lo, paths in _units(span) if done is None or lo >= done]
+    out = {"units": len(jobs), "units_done": 0, "rows": 0, "rows_updated": 0, "segments_rewritten": 0}
+    for res in _ordered(_derive_unit, jobs, workers):
+        lo, hi = res["lo"], res["hi"]
+        dirty = state["dirty"] == lo  # interrompida no meio desta faixa: refaz os rollups de qualquer jeito
+        for _ in range(3):
+            if (res["updates"] or res["segments"]) and not dirty:
+                state["dirty"], dirty = lo, True
+                _save_state(ckpt, state)
+            _apply_updates(bind, res["updates"])
+            installed, ok = _install(res["segments"])
+            out["rows_updated"] += len(res["updates"])
+            out["segments_rewritten"] += installed
+            # linhas seladas no meio do caminho foram para segmentos que esta leitura não viu
+            with read_engine.connect() as conn:
+                if ok and _hot_count(conn, lo, hi) >= res["hot_rows"]:
+                    break
+            paths = sorted({*res["seg_paths"], *(s.path for s in archive_store.segments(lo, hi - 1)
+                                                  if lo <= s.meta["window_start"] < hi)})
+            res = _derive_unit(lo, hi, paths)
+        if dirty:
+            with bind.begin() as conn:
+                clear_rollups(conn, lo, hi - 1)  # primeira escrita: a partir daqui a faixa não muda
+                if res["rollups"] and _hot_count(conn, lo, hi) == res["hot_rows"]:
+                    conn.exec_driver_sql(_ROLLUP_SQL, res["rollups"])
+                    if res["sketches"]:
+                        conn.exec_driver_sql(_SKETCH_SQL, res["sketches"])
+                else:  # linhas atrasadas na faixa, ou retomada sem nada a regravar: relê tudo
+                    rebuild_rollups(conn, lo, hi - 1)
+            _pause()
+        out["rows"] += res["rows"]
+        out["units_done"] += 1
+        state["done_upto"], state["dirty"] = hi, None
+        _save_state(ckpt, state)
+        if progress is not None:
+            progress(out)
+
+    out["latest_updated"] = _rederive_latest(bind)
+    track_cache.clear()  # linhas regravadas sem mudar `count`/`updated_at`
+    from app.crud.trips import rebuild_trips
+    out["trips"] = rebuild_trips(bind)["trips"]
+    if os.path.exists(ckpt):
+        os.remove(ckpt)
+    return out
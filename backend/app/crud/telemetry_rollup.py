@@ -0,0 +1,194 @@
+
+"""Rollups incrementais (1 s, 1 min, 1 h por `src`) das colunas numéricas de `telemetry`.
+
+`apply_rollups` é chamado no mesmo commit da inserção (ver `insert_rows`): as
+linhas do lote são pré-agregadas em Python e gravadas com um UPSERT por
+janela. `rebuild_rollups` refaz os rollups a partir de `telemetry` (backfill).
+Os sketches de quantis (`telemetry_sketch`) são apagados e refeitos junto.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from sqlalchemy import case, delete, func, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.telemetry import Telemetry, TelemetryRollup, NUMERIC_FIELDS
+from app.crud.telemetry_archive import cold_rollup_rows
+from app.crud.telemetry_sketch import apply_sketches, clear_sketches
+
+# Resoluções mantidas (ms), da mais fina para a mais grossa
+ROLLUP_RES_MS: Tuple[int, ...] = (1_000, 60_000, 3_600_000)
+
+_Key = Tuple[int, str, int]
+
+def _empty(res_ms: int, src: str, bucket: int) -> Dict[str, Any]:
+    acc: Dict[str, Any] = {"res_ms": res_ms, "src": src, "bucket": bucket, "n": 0, "last_ts": None}
+    for f in NUMERIC_FIELDS:
+        acc[f"{f}_n"] = 0
+        acc[f"{f}_sum"] = 0.0
+        acc[f"{f}_min"] = None
+        acc[f"{f}_max"] = None
+        acc[f"{f}_last"] = None
+    return acc
+
+def _merge_into(a: Dict[str, Any], b: Dict[str, Any]) -> None:
+    """Soma o agregado `b` em `a` (mesma semântica do UPSERT)."""
+    newer = a["last_ts"] is None or (b["last_ts"] is not None and b["last_ts"] >= a["last_ts"])
+    a["n"] += b["n"]
+    if newer:
+        a["last_ts"] = b["last_ts"]
+    for f in NUMERIC_FIELDS:
+        if newer:
+            a[f"{f}_last"] = b[f"{f}_last"]
+        if not b[f"{f}_n"]:
+            continue
+        a[f"{f}_n"] += b[f"{f}_n"]
+        a[f"{f}_sum"] += b[f"{f}_sum"]
+        mn, mx = a[f"{f}_min"], a[f"{f}_max"]
+        a[f"{f}_min"] = b[f"{f}_min"] if mn is None or b[f"{f}_min"] < mn else mn
+        a[f"{f}_max"] = b[f"{f}_max"] if mx is None or b[f"{f}_max"] > mx else mx
+
+def accumulate(rows: Iterable[Any]) -> Dict[_Key, Dict[str, Any]]:
+    """Pré-agrega linhas de `telemetry` (dicts ou Row) por (res_ms, src, janela).
+
+    As amostras são somadas uma vez na resolução mais fina; as demais são
+    obtidas juntando essas janelas.
+    """
+    fine_res = ROLLUP_RES_MS[0]
+    fine: Dict[_Key, Dict[str, Any]] = {}
+    for row in rows:
+        get = row.get if isinstance(row, dict) else row._mapping.get
+        ts = int(get("ts"))
+        src = get("src") or ""
+        key = (fine_res, src, ts // fine_res)
+        a = fine.get(key)
+        if a is None:
+            a = fine[key] = _empty(fine_res, src, ts // fine_res)
+        a["n"] += 1
+        newer = a["last_ts"] is None or ts >= a["last_ts"]
+        if newer:
+            a["last_ts"] = ts
+        for f in NUMERIC_FIELDS:
+            v = get(f)
+            if newer:
+                a[f"{f}_last"] = v
+            if v is None:
+                continue
+            a[f"{f}_n"] += 1
+            a[f"{f}_sum"] += v
+            mn, mx = a[f"{f}_min"], a[f"{f}_max"]
+            a[f"{f}_min"] = v if mn is None or v < mn else mn
+            a[f"{f}_max"] = v if mx is None or v > mx else mx
+
+    acc = dict(fine)
+    for res in ROLLUP_RES_MS[1:]:
+        for (_, src, b), a in fine.items():
+            bucket = b * fine_res // res
+            key = (res, src, bucket)
+            c = acc.get(key)
+            if c is None:
+                c = acc[key] = _empty(res, src, bucket)
+            _merge_into(c, a)
+    return acc
+
+_UPSERT = None
+
+def _upsert_stmt():
+    """INSERT ... ON CONFLICT DO UPDATE que soma um agregado parcial à janela existente."""
+    global _UPSERT
+    if _UPSERT is None:
+        t = TelemetryRollup.__table__
+        stmt = sqlite_insert(t)
+        ex = stmt.excluded
+        newer = ex.last_ts >= func.coalesce(t.c.last_ts, ex.last_ts)
+        set_ = {
+            "n": t.c.n + ex.n,
+            "last_ts": func.max(func.coalesce(t.c.last_ts, ex.last_ts), ex.last_ts),
+        }
+        for f in NUMERIC_FIELDS:
+            c_min, c_max = t.c[f"{f}_min"], t.c[f"{f}_max"]
+            e_min, e_max = ex[f"{f}_min"], ex[f"{f}_max"]
+            set_[f"{f}_n"] = t.c[f"{f}_n"] + ex[f"{f}_n"]
+            set_[f"{f}_sum"] = t.c[f"{f}_sum"] + ex[f"{f}_sum"]
+            set_[f"{f}_min"] = func.coalesce(func.min(c_min, e_min), c_min, e_min)
+            set_[f"{f}_max"] = func.coalesce(func.max(c_max, e_max), c_max, e_max)
+            set_[f"{f}_last"] = case((newer, ex[f"{f}_last"]), else_=t.c[f"{f}_last"])
+        _UPSERT = stmt.on_conflict_do_update(index_elements=[t.c.res_ms, t.c.src, t.c.bucket], set_=set_)
+    return _UPSERT
+
+def apply_rollups(conn: Union[Session, Connection], tel_rows: List[Dict[str, Any]]) -> None:
+    """Atualiza os rollups com um lote de linhas recém-inseridas. Não faz commit."""
+    if not tel_rows:
+        return
+    acc = accumulate(tel_rows)
+    conn.execute(_upsert_stmt(), list(acc.values()))
+
+def clear_rollups(conn: Union[Session, Connection], lo: Optional[int], hi: Optional[int]) -> None:
+    """Apaga, em todas as resoluções, as janelas de [lo, hi] (alinhados à maior resolução),
+    inclusive os sketches. Não faz commit."""
+    for res in ROLLUP_RES_MS:
+        d = delete(TelemetryRollup).where(TelemetryRollup.res_ms == res)
+        if lo is not None:
+            d = d.where(TelemetryRollup.bucket >= lo // res)
+        if hi is not None:
+            d = d.where(TelemetryRollup.bucket <= hi // res)
+        conn.execute(d)
+    clear_sketches(conn, lo, hi)
+
+def rebuild_rollups(
+    conn: Union[Session, Connection],
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    chunk: int = 20_000,
+) -> int:
+    """Recalcula os rollups e sketches a partir de `telemetry` e dos segmentos frios (backfill). Não faz commit.
+
+    O intervalo é expandido para janelas inteiras da maior resolução.
+    Retorna o número de linhas lidas.
+    """
+    coarse = max(ROLLUP_RES_MS)
+    lo = None if start_ts is None else (int(start_ts) // coarse) * coarse
+    hi = None if end_ts is None else (int(end_ts) // coarse + 1) * coarse - 1
+    clear_rollups(conn, lo, hi)
+
+    cols = [Telemetry.id, Telemetry.ts, Telemetry.src, *[getattr(Telemetry, f) for f in NUMERIC_FIELDS]]
+    base = select(*cols).where(Telemetry.ts.is_not(None))
+    if lo is not None:
+        base = base.where(Telemetry.ts >= lo)
+    if hi is not None:
+        base = base.where(Telemetry.ts <= hi)
+
+    total = 0
+    after: Optional[Tuple[int, int]] = None
+    while True:
+        q = base if after is None else base.where(tuple_(Telemetry.ts, Telemetry.id) > after)
+        rows = conn.execute(q.order_by(Telemetry.ts, Telemetry.id).limit(chunk)).all()
+        if not rows:
+            break
+        acc = accumulate(rows)
+        conn.execute(_upsert_stmt(), list(acc.values()))
+        apply_sketches(conn, rows)
+        total += len(rows)
+        after = (rows[-1].ts, rows[-1].id)
+
+    batch: List[Dict[str, Any]] = []
+    for row in cold_rollup_rows(lo, hi):
+        batch.append(row)
+        if len(batch) >= chunk:
+            conn.execute(_upsert_stmt(), list(accumulate(batch).values()))
+            apply_sketches(conn, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        conn.execute(_upsert_stmt(), list(accumulate(batch).values()))
+        apply_sketches(conn, batch)
+        total += len(batch)
+    return total
+
+def pick_resolution(bucket_ms: int) -> Optional[int]:
+    """Maior resolução de rollup que divide `bucket_ms` (None se nenhuma serve)."""
+    for res in sorted(ROLLUP_RES_MS, reverse=True):
+        if bucket_ms % res == 0:
+            return res
+    return None
@@ -0,0 +1,396 @@
+"""Sketches de quantis (estilo DDSketch) por `src` e janela de 1 min / 1 h.
+
+Cada valor cai num balde logarítmico: `i = ceil(log_γ |v|)` com
+`γ = (1 + α) / (1 - α)` e `α = SKETCH_REL_ACCURACY`; o balde representa
+`2γ^i / (γ + 1)`, que fica a no máximo `α·|v|` de qualquer valor dentro dele.
+Negativos têm o próprio conjunto de baldes e `|v| < _MIN_VALUE` conta como
+zero. Somar os contadores de dois sketches dá o sketch da união, então um
+intervalo qualquer é a soma das janelas que o cobrem, com o mesmo erro relativo.
+
+Persistência: uma linha de `telemetry_sketch` por (resolução, `src`, janela) e
+uma coluna por campo de `SKETCH_FIELDS`, com os contadores num array denso
+(`offset` do primeiro balde + uint32) comprimido com zlib. `apply_sketches`
+roda na transação de `insert_rows`: lê as janelas tocadas pelo lote, soma os
+contadores do lote (só os baldes que ele tocou) e grava de volta.
+
+`quantiles` cobre [start_ts, end_ts] com janelas de 1 h inteiras, depois de
+1 min, e lê as linhas das pontas (menos de 1 min de cada lado) direto de
+`telemetry` e dos segmentos frios: o custo depende do número de janelas, não
+do número de amostras. Mudar `SKETCH_REL_ACCURACY` exige refazer os sketches
+(`python -m app.cli rollup-backfill`).
+"""
+from __future__ import annotations
+
+import math
+import struct
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import bindparam, delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.telemetry import SKETCH_FIELDS, Telemetry, TelemetrySketch
+
+# Resoluções mantidas (ms), da mais fina para a mais grossa
+SKETCH_RES_MS: Tuple[int, ...] = (60_000, 3_600_000)
+
+_ALPHA = float(settings.SKETCH_REL_ACCURACY)
+_GAMMA = (1.0 + _ALPHA) / (1.0 - _ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_VALUE = 1e-6  # abaixo disso (em módulo) conta como zero
+_VERSION = 1
+_HEADER = struct.Struct("<BQqIqI")  # versão, zeros, offset/tamanho dos positivos, offset/tamanho dos negativos
+_SWAP = sys.byteorder != "little"
+
+Counts = Dict[Tuple[int, int], int]  # (sinal, balde) -> amostras
+
+def _key(v: float) -> int:
+    return math.ceil(math.log(v) / _LOG_GAMMA)
+
+def _value(i: int) -> float:
+    return 2.0 * _GAMMA ** i / (_GAMMA + 1.0)
+
+class _Store:
+    """Contadores densos de baldes consecutivos a partir de `off`."""
+
+    __slots__ = ("off", "bins")
+
+    def __init__(self, off: int = 0, bins: Optional[array] = None) -> None:
+        self.off = off
+        self.bins = bins if bins is not None else array("Q")
+
+    def _cover(self, lo: int, hi: int) -> None:
+        if not self.bins:
+            self.off = lo
+            self.bins = array("Q", bytes(8 * (hi - lo + 1)))
+            return
+        if lo < self.off:
+            self.bins = array("Q", bytes(8 * (self.off - lo))) + self.bins
+            self.off = lo
+        end = self.off + len(self.bins) - 1
+        if hi > end:
+            self.bins.frombytes(bytes(8 * (hi - end)))
+
+    def add_counts(self, counts: Dict[int, int]) -> None:
+        if not counts:
+            return
+        self._cover(min(counts), max(counts))
+        bins, off = self.bins, self.off
+        for k, c in counts.items():
+            bins[k - off] += c
+
+    def merge(self, other: "_Store") -> None:
+        if not other.bins:
+            return
+        self._cover(other.off, other.off + len(other.bins) - 1)
+        bins, shift = self.bins, other.off - self.off
+        for i, c in enumerate(other.bins):
+            if c:
+                bins[i + shift] += c
+
+class Sketch:
+    """Contadores por balde logarítmico (positivos, negativos e zeros)."""
+
+    __slots__ = ("zero", "pos", "neg")
+
+    def __init__(self) -> None:
+        self.zero = 0
+        self.pos = _Store()
+        self.neg = _Store()
+
+    def add(self, v: float) -> None:
+        self.add_counts(_counts([v]))
+
+    def add_counts(self, counts: Counts) -> None:
+        pos: Dict[int, int] = {}
+        neg: Dict[int, int] = {}
+        for (sign, i), n in counts.items():
+            if sign > 0:
+                pos[i] = n
+            elif sign < 0:
+                neg[i] = n
+            else:
+                self.zero += n
+        self.pos.add_counts(pos)
+        self.neg.add_counts(neg)
+
+    def merge(self, other: "Sketch") -> None:
+        self.zero += other.zero
+        self.pos.merge(other.pos)
+        self.neg.merge(other.neg)
+
+    def count(self) -> int:
+        return self.zero + sum(self.pos.bins) + sum(self.neg.bins)
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Valores nos quantis `qs` (posto `q·(n-1)`, como o DDSketch); None se vazio."""
+        n = self.count()
+        if not n:
+            return [None] * len(qs)
+        order = sorted(range(len(qs)), key=lambda j: qs[j])
+        out: List[Optional[float]] = [None] * len(qs)
+        pending = iter(order)
+        j = next(pending, None)
+        cum = 0
+
+        def walk():
+            nb = self.neg.bins
+            for i in range(len(nb) - 1, -1, -1):  # mais negativo primeiro
+                if nb[i]:
+                    yield nb[i], -_value(self.neg.off + i)
+            if self.zero:
+                yield self.zero, 0.0
+            for i, c in enumerate(self.pos.bins):
+                if c:
+                    yield c, _value(self.pos.off + i)
+
+        for c, v in walk():
+            cum += c
+            while j is not None and cum > qs[j] * (n - 1):
+                out[j] = v
+                j = next(pending, None)
+            if j is None:
+                break
+        return out
+
+    def encode(self) -> bytes:
+        # gravado em uint32 (uma janela não chega a 2^32 amostras); zlib nível 1: roda a cada lote
+        pos, neg = array("I", self.pos.bins), array("I", self.neg.bins)
+        if _SWAP:
+            pos.byteswap()
+            neg.byteswap()
+        head = _HEADER.pack(_VERSION, self.zero, self.pos.off, len(pos), self.neg.off, len(neg))
+        return zlib.compress(head + pos.tobytes() + neg.tobytes(), 1)
+
+    @classmethod
+    def decode(cls, blob: bytes) -> "Sketch":
+        raw = zlib.decompress(blob)
+        version, zero, p_off, p_len, n_off, n_len = _HEADER.unpack_from(raw)
+        if version != _VERSION:
+            raise ValueError(f"versão de sketch desconhecida: {version}")
+        sk = cls()
+        sk.zero = zero
+        start = _HEADER.size
+        pos = array("I", raw[start:start + 4 * p_len])
+        neg = array("I", raw[start + 4 * p_len:start + 4 * (p_len + n_len)])
+        if _SWAP:
+            pos.byteswap()
+            neg.byteswap()
+        sk.pos = _Store(p_off, array("Q", pos))
+        sk.neg = _Store(n_off, array("Q", neg))
+        return sk
+
+@lru_cache(maxsize=1 << 16)
+def _key_of(v: float) -> Tuple[int, int]:
+    """(sinal, balde) de um valor; memoizado (os campos repetem poucos valores distintos)."""
+    if v > _MIN_VALUE:
+        return 1, _key(v)
+    if v < -_MIN_VALUE:
+        return -1, _key(-v)
+    return 0, 0
+
+def _counts(values: Iterable[float]) -> Counts:
+    c: Counts = {}
+    for v in values:
+        k = _key_of(v)
+        c[k] = c.get(k, 0) + 1
+    return c
+
+_Key = Tuple[int, str, int]
+
+def accumulate_sketches(rows: Iterable[Any]) -> Dict[_Key, Dict[str, Counts]]:
+    """Contadores por (res_ms, src, janela) e campo, de linhas de `telemetry` (dicts ou Row).
+
+    As amostras são contadas uma vez na resolução mais fina; as demais somam
+    essas janelas.
+    """
+    fine_res = SKETCH_RES_MS[0]
+    fine: Dict[_Key, Dict[str, Counts]] = {}
+    for row in rows:
+        get = row.get if isinstance(row, dict) else row._mapping.get
+        ts = int(get("ts"))
+        src = get("src") or ""
+        key = (fine_res, src, ts // fine_res)
+        fields = fine.get(key)
+        if fields is None:
+            fields = fine[key] = {f: {} for f in SKETCH_FIELDS}
+        for f in SKETCH_FIELDS:
+            v = get(f)
+            if v is not None:
+                c = fields[f]
+                k = _key_of(v)
+                c[k] = c.get(k, 0) + 1
+
+    acc = {key: {f: c for f, c in fields.items() if c} for key, fields in fine.items()}
+    for res in SKETCH_RES_MS[1:]:
+        for (_, src, b), fields in fine.items():
+            key = (res, src, b * fine_res // res)
+            out = acc.get(key)
+            if out is None:
+                out = acc[key] = {}
+            for f, c in fields.items():
+                if not c:
+                    continue
+                d = out.get(f)
+                if d is None:
+                    out[f] = dict(c)
+                    continue
+                for k, n in c.items():
+                    d[k] = d.get(k, 0) + n
+    return acc
+
+def sketch_rows(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Linhas novas de `telemetry_sketch` para janelas que ainda não existem (rebuild)."""
+    out = []
+    for (res, src, bucket), fields in accumulate_sketches(rows).items():
+        row: Dict[str, Any] = {"res_ms": res, "src": src, "bucket": bucket}
+        for f in SKETCH_FIELDS:
+            c = fields.get(f)
+            if c is None:
+                row[f] = None
+            else:
+                sk = Sketch()
+                sk.add_counts(c)
+                row[f] = sk.encode()
+        out.append(row)
+    return out
+
+_UPSERT = None
+
+def _upsert_stmt():
+    global _UPSERT
+    if _UPSERT is None:
+        t = TelemetrySketch.__table__
+        stmt = sqlite_insert(t)
+        _UPSERT = stmt.on_conflict_do_update(
+            index_elements=[t.c.res_ms, t.c.src, t.c.bucket],
+            set_={f: stmt.excluded[f] for f in SKETCH_FIELDS},
+        )
+    return _UPSERT
+
+_STORED = select(TelemetrySketch.bucket, *[getattr(TelemetrySketch, f) for f in SKETCH_FIELDS]).where(
+    TelemetrySketch.res_ms == bindparam("res"),
+    TelemetrySketch.src == bindparam("src"),
+    TelemetrySketch.bucket.in_(bindparam("buckets", expanding=True)),
+)
+
+def apply_sketches(conn: Union[Session, Connection], tel_rows: Iterable[Any]) -> None:
+    """Soma um lote de linhas aos sketches das janelas que ele toca. Não faz commit.
+
+    Leitura + escrita na mesma transação (o lock de escrita já é nosso).
+    """
+    acc = accumulate_sketches(tel_rows)
+    if not acc:
+        return
+    by_res_src: Dict[Tuple[int, str], List[int]] = {}
+    for res, src, bucket in acc:
+        by_res_src.setdefault((res, src), []).append(bucket)
+    out = []
+    for (res, src), buckets in by_res_src.items():
+        stored = {r[0]: r for r in conn.execute(_STORED, {"res": res, "src": src, "buckets": buckets})}
+        for bucket in buckets:
+            fields = acc[(res, src, bucket)]
+            old = stored.get(bucket)
+            row: Dict[str, Any] = {"res_ms": res, "src": src, "bucket": bucket}
+            for i, f in enumerate(SKETCH_FIELDS, start=1):
+                blob = old[i] if old is not None else None
+                c = fields.get(f)
+                if c is None:
+                    row[f] = blob
+                    continue
+                sk = Sketch.decode(blob) if blob is not None else Sketch()
+                sk.add_counts(c)
+                row[f] = sk.encode()
+            out.append(row)
+    conn.execute(_upsert_stmt(), out)
+
+def clear_sketches(conn: Union[Session, Connection], lo: Optional[int], hi: Optional[int]) -> None:
+    """Apaga, em todas as resoluções, as janelas de [lo, hi] (alinhados à maior resolução). Não faz commit."""
+    for res in SKETCH_RES_MS:
+        d = delete(TelemetrySketch).where(TelemetrySketch.res_ms == res)
+        if lo is not None:
+            d = d.where(TelemetrySketch.bucket >= lo // res)
+        if hi is not None:
+            d = d.where(TelemetrySketch.bucket <= hi // res)
+        conn.execute(d)
+
+# --- consulta ---------------------------------------------------------------------------
+def _plan(
+    lo: int, hi: int, resolutions: Sequence[int],
+    windows: List[Tuple[int, int, int]], exact: List[Tuple[int, int]],
+) -> None:
+    """Cobre [lo, hi] com janelas inteiras da maior resolução possível; o resto vai para `exact`."""
+    if lo > hi:
+        return
+    if not resolutions:
+        exact.append((lo, hi))
+        return
+    res, rest = resolutions[0], resolutions[1:]
+    b_lo, b_hi = -(-lo // res), (hi + 1) // res - 1
+    if b_lo > b_hi:
+        _plan(lo, hi, rest, windows, exact)
+        return
+    windows.append((res, b_lo, b_hi))
+    _plan(lo, b_lo * res - 1, rest, windows, exact)
+    _plan((b_hi + 1) * res, hi, rest, windows, exact)
+
+def _exact_values(db: Session, field: str, lo: int, hi: int, src: Optional[str]) -> Iterable[float]:
+    from app.crud.telemetry_archive import archive_store
+
+    col = getattr(Telemetry, field)
+    q = select(col).where(Telemetry.ts >= lo, Telemetry.ts <= hi, col.is_not(None))
+    if src is not None:
+        q = q.where(Telemetry.src == src)
+    yield from db.execute(q).scalars()
+    if archive_store.empty():
+        return
+    segs = archive_store.segments(lo, hi) if src is None else archive_store.segments(lo, hi, src)
+    for seg in segs:
+        ts, vals = seg.read("ts"), seg.read(field)
+        for i, t in enumerate(ts):
+            if lo <= t <= hi and vals[i] is not None:
+                yield vals[i]
+
+def quantiles(
+    db: Session,
+    field: str,
+    qs: Sequence[float],
+    start_ts: int,
+    end_ts: int,
+    src: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Quantis aproximados (erro relativo ≤ `SKETCH_REL_ACCURACY`) de `field` em [start_ts, end_ts]."""
+    windows: List[Tuple[int, int, int]] = []
+    exact: List[Tuple[int, int]] = []
+    _plan(int(start_ts), int(end_ts), sorted(SKETCH_RES_MS, reverse=True), windows, exact)
+
+    total = Sketch()
+    col = getattr(TelemetrySketch, field)
+    n_windows = 0
+    for res, b_lo, b_hi in windows:
+        q = select(col).where(
+            TelemetrySketch.res_ms == res, TelemetrySketch.bucket >= b_lo, TelemetrySketch.bucket <= b_hi,
+            col.is_not(None),
+        )
+        if src is not None:
+            q = q.where(TelemetrySketch.src == src)
+        for blob in db.execute(q).scalars():
+            total.merge(Sketch.decode(blob))
+            n_windows += 1
+    n_exact = 0
+    for lo, hi in exact:
+        c = _counts(_exact_values(db, field, lo, hi, src))
+        n_exact += sum(c.values())
+        total.add_counts(c)
+    return {
+        "n": total.count(),
+        "values": total.quantiles(qs),
+        "sketches": n_windows,
+        "exact_rows": n_exact,
+    }
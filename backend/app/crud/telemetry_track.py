@@ -0,0 +1,226 @@
+"""Trajeto GPS simplificado para o mapa (`/telemetry/track`).
+
+Lê só `ts`/`lat`/`lon` (colunas de `telemetry` e dos segmentos frios, sem
+`doc_json`) e simplifica por Douglas-Peucker com tolerância em metros, numa
+projeção local equirretangular (erro desprezível nas distâncias de um trajeto).
+Antes do Douglas-Peucker, uma passada linear descarta pontos a menos de
+`tolerance_m` do último ponto mantido (a 5 Hz, a maioria das amostras), como
+o `L.LineUtil.simplify` do Leaflet: a parte quadrática fica bem menor, e o
+desvio continua na ordem de `tolerance_m` (no pior caso, 2×).
+
+O trajeto é simplificado por janela de `ARCHIVE_WINDOW_MS` (um segmento frio
+ou as linhas quentes da janela) e os pedaços são emendados; cada pedaço mantém
+as pontas. Janelas inteiras dentro do intervalo ficam num cache LRU por
+(janela, tolerância): a chave de um segmento é o próprio arquivo (imutável) e a
+de uma janela quente inclui o `count` e o `max(updated_at)` das linhas — uma
+linha nova na janela, ou um UPDATE no lugar que avance `updated_at`, invalida o
+pedaço (linhas de `telemetry` só saem em janelas inteiras, pela selagem ou
+retenção). Rederivação e backfills, que regravam linhas sem mexer em
+`updated_at`, limpam o cache com `track_cache.clear()`.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.telemetry_archive import archive_store
+from app.models.telemetry import Telemetry
+
+Point = Tuple[int, float, float]  # (ts, lat, lon)
+
+_M_PER_DEG = math.pi * 6_371_008.8 / 180.0
+
+def simplify(points: Sequence[Point], tolerance_m: float) -> List[Point]:
+    """Douglas-Peucker (distância ao segmento, em metros) com pré-filtro radial."""
+    n = len(points)
+    if n <= 2 or tolerance_m <= 0:
+        return list(points)
+    lat0 = points[0][1]
+    kx = _M_PER_DEG * math.cos(math.radians(lat0))
+    lon0 = points[0][2]
+    tol2 = float(tolerance_m) ** 2
+
+    # pré-filtro radial: mantém o primeiro, o último e quem se afastou `tolerance_m` do último mantido
+    xs: List[float] = [0.0]
+    ys: List[float] = [0.0]
+    idx: List[int] = [0]
+    lx = ly = 0.0
+    for i in range(1, n - 1):
+        p = points[i]
+        x = (p[2] - lon0) * kx
+        y = (p[1] - lat0) * _M_PER_DEG
+        dx, dy = x - lx, y - ly
+        if dx * dx + dy * dy > tol2:
+            xs.append(x)
+            ys.append(y)
+            idx.append(i)
+            lx, ly = x, y
+    last = points[n - 1]
+    xs.append((last[2] - lon0) * kx)
+    ys.append((last[1] - lat0) * _M_PER_DEG)
+    idx.append(n - 1)
+
+    m = len(idx)
+    keep = bytearray(m)
+    keep[0] = keep[m - 1] = 1
+    stack = [(0, m - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        ax, ay = xs[a], ys[a]
+        dx, dy = xs[b] - ax, ys[b] - ay
+        seg2 = dx * dx + dy * dy
+        best, far = tol2, -1
+        for i in range(a + 1, b):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2 > 0.0:
+                t = (px * dx + py * dy) / seg2
+                if t > 1.0:
+                    t = 1.0
+                elif t < 0.0:
+                    t = 0.0
+                px -= t * dx
+                py -= t * dy
+            d = px * px + py * py
+            if d > best:
+                best, far = d, i
+        if far >= 0:
+            keep[far] = 1
+            stack.append((a, far))
+            stack.append((far, b))
+    return [points[idx[i]] for i in range(m) if keep[i]]
+
+class _TrackCache:
+    """LRU de pedaços simplificados de segmentos inteiros."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple[Any, ...], List[Point]]" = OrderedDict()
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[List[Point]]:
+        with self._lock:
+            val = self._data.get(key)
+            if val is not None:
+                self._data.move_to_end(key)
+            return val
+
+    def put(self, key: Tuple[Any, ...], val: List[Point]) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._data[key] = val
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+track_cache = _TrackCache(settings.TRACK_CACHE_SEGMENTS)
+
+def _segment_points(seg: Any, start_ts: int, end_ts: int) -> List[Point]:
+    ts, lat, lon = seg.read("ts"), seg.read("lat"), seg.read("lon")
+    return [(ts[i], lat[i], lon[i]) for i in range(len(ts))
+            if start_ts <= ts[i] <= end_ts and lat[i] is not None and lon[i] is not None]
+
+def _cold_pieces(src: str, start_ts: int, end_ts: int, tolerance_m: float) -> List[Tuple[int, List[Point]]]:
+    pieces = []
+    for seg in archive_store.segments(start_ts, end_ts, src):
+        if seg.meta.get("bbox", True) is None:
+            continue  # segmento sem nenhuma posição
+        whole = start_ts <= seg.meta["ts_min"] and seg.meta["ts_max"] <= end_ts
+        key = ("seg", seg.path, seg.n, seg.meta["ts_max"], tolerance_m)
+        piece = track_cache.get(key) if whole else None
+        if piece is None:
+            piece = simplify(_segment_points(seg, start_ts, end_ts), tolerance_m)
+            if whole:
+                track_cache.put(key, piece)
+        pieces.append((seg.meta["window_start"], piece))
+    return pieces
+
+def _hot_points(db: Session, src: str, lo: int, hi: int) -> List[Point]:
+    return [
+        (r[0], r[1], r[2]) for r in db.execute(
+            select(Telemetry.ts, Telemetry.lat, Telemetry.lon)
+            .where(Telemetry.src == src, Telemetry.ts >= lo, Telemetry.ts <= hi,
+                   Telemetry.lat.is_not(None), Telemetry.lon.is_not(None))
+            .order_by(Telemetry.ts, Telemetry.id)
+        )
+    ]
+
+def _count(db: Session, src: str, lo: int, hi: int) -> int:
+    return db.execute(
+        select(func.count()).where(Telemetry.src == src, Telemetry.ts >= lo, Telemetry.ts <= hi)
+    ).scalar_one()
+
+def _version(db: Session, src: str, lo: int, hi: int) -> Tuple[int, Optional[int]]:
+    """`(count, max(updated_at))` da janela: o que a chave de cache quente precisa."""
+    count, upd = db.execute(
+        select(func.count(), func.max(Telemetry.updated_at))
+        .where(Telemetry.src == src, Telemetry.ts >= lo, Telemetry.ts <= hi)
+    ).one()
+    return count, upd
+
+def _hot_pieces(db: Session, src: str, start_ts: int, end_ts: int, tolerance_m: float) -> List[Tuple[int, List[Point]]]:
+    window = archive_store.window_ms
+    first, last = db.execute(
+        select(func.min(Telemetry.ts), func.max(Telemetry.ts))
+        .where(Telemetry.src == src, Telemetry.ts >= start_ts, Telemetry.ts <= end_ts)
+    ).one()
+    if first is None:
+        return []
+    # `count`/`max(updated_at)` por janela (busca no índice (src, ts)); um GROUP BY aqui
+    # ordenaria tudo numa B-tree temporária
+    stats = []
+    for ws in range(first - first % window, last + 1, window):
+        count, upd = _version(db, src, ws, ws + window - 1)
+        lo, hi = max(ws, start_ts), min(ws + window - 1, end_ts)
+        whole = (lo, hi) == (ws, ws + window - 1) or _count(db, src, lo, hi) == count
+        stats.append((ws, count, upd, whole))
+    pieces, missing = [], []
+    for ws, count, upd, whole in stats:
+        if not count:
+            continue
+        key = ("hot", src, ws, count, upd, tolerance_m) if whole else None
+        piece = track_cache.get(key) if key else None
+        if piece is None:
+            missing.append((ws, key))
+        else:
+            pieces.append((ws, piece))
+    # janelas sem cache: uma consulta por sequência contígua
+    i = 0
+    while i < len(missing):
+        j = i
+        while j + 1 < len(missing) and missing[j + 1][0] == missing[j][0] + window:
+            j += 1
+        pts = _hot_points(db, src, max(start_ts, missing[i][0]), min(end_ts, missing[j][0] + window - 1))
+        for ws, key in missing[i:j + 1]:
+            lo = bisect.bisect_left(pts, (ws,))
+            hi = bisect.bisect_left(pts, (ws + window,))
+            piece = simplify(pts[lo:hi], tolerance_m)
+            if key:
+                track_cache.put(key, piece)
+            pieces.append((ws, piece))
+        i = j + 1
+    return pieces
+
+def track(db: Session, src: str, start_ts: int, end_ts: int, tolerance_m: float) -> List[Point]:
+    """Pontos `(ts, lat, lon)` simplificados, em ordem de ts."""
+    tolerance_m = float(tolerance_m)
+    pieces = [] if archive_store.empty() else _cold_pieces(src, start_ts, end_ts, tolerance_m)
+    pieces.extend(_hot_pieces(db, src, start_ts, end_ts, tolerance_m))
+    pieces.sort(key=lambda p: p[0])  # estável: na mesma janela, o frio (mais velho) vem antes
+    out: List[Point] = []
+    for _, piece in pieces:
+        out.extend(piece)
+    return out
@@ -0,0 +1,242 @@
+"""Viagens por `src`, detectadas e resumidas na ingestão (tabela `trips`).
+
+Uma viagem começa na primeira amostra em movimento (`speed_est_mps` acima de
+`TRIP_STOP_SPEED_MPS`) e termina quando a origem fica sem amostras por mais de
+`TRIP_IDLE_GAP_MS` ou parada por mais de `TRIP_STOP_MS`; amostras paradas fora
+de uma viagem não entram em nenhuma. Paradas curtas (semáforo) ficam dentro da
+viagem, e a viagem fechada por parada termina com até `TRIP_STOP_MS` parada.
+
+Cada amostra atualiza os somatórios em O(1): distância (haversine entre
+posições consecutivas), contagem/soma/máximo de `speed_est_mps`, tempo em ré
+(intervalos cuja amostra anterior tinha `movement_dir == 0`) e histograma de
+`steering_deg` em baldes de `TRIP_STEER_BUCKET_DEG`. `apply_trips` roda na
+transação de `insert_rows`, depois do INSERT em `telemetry` (o lock de escrita
+já é nosso, então vários processos ingerindo não se atropelam): lê a viagem
+aberta de cada `src` do lote, aplica as amostras e grava. As rotas nunca
+releem `telemetry`.
+"""
+from __future__ import annotations
+
+import json
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import delete, insert, select, tuple_, update, bindparam
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.telemetry_geo import haversine_m
+from app.models.telemetry import Telemetry, Trip
+
+_STATE_COLS = [c.name for c in Trip.__table__.columns]
+_SELECT = select(*Trip.__table__.columns)  # linhas de colunas também numa Session (sem entidade ORM)
+# sobre a tabela, não a entidade: numa Session o executemany fica no Core (com `update(Trip)`
+# viraria o "bulk UPDATE" do ORM, que não aceita o WHERE por bindparam)
+_UPDATE = update(Trip.__table__).where(Trip.__table__.c.id == bindparam("_id")).values(
+    {c: bindparam("_" + c) for c in _STATE_COLS if c != "id"}
+)
+
+def _new_trip(src: str, ts: int) -> Dict[str, Any]:
+    return {
+        "id": None, "src": src, "start_ts": ts, "end_ts": ts, "moving_ts": ts, "closed": 0, "n": 0,
+        "distance_m": 0.0, "speed_n": 0, "speed_sum": 0.0, "speed_max": None, "reverse_ms": 0,
+        "steer_hist": {}, "last_lat": None, "last_lon": None, "last_dir": None,
+    }
+
+def _moving(r: Dict[str, Any]) -> bool:
+    v = r.get("speed_est_mps")
+    return v is not None and v > settings.TRIP_STOP_SPEED_MPS
+
+def _add(trip: Dict[str, Any], r: Dict[str, Any]) -> None:
+    """Acumula uma amostra na viagem (O(1))."""
+    ts = max(int(r["ts"]), trip["end_ts"])  # lotes de processos diferentes podem chegar fora de ordem
+    if trip["last_dir"] == 0:
+        trip["reverse_ms"] += ts - trip["end_ts"]
+    lat, lon = r.get("lat"), r.get("lon")
+    if lat is not None and lon is not None:
+        if trip["last_lat"] is not None:
+            trip["distance_m"] += haversine_m(trip["last_lat"], trip["last_lon"], lat, lon)
+        trip["last_lat"], trip["last_lon"] = lat, lon
+    v = r.get("speed_est_mps")
+    if v is not None:
+        trip["speed_n"] += 1
+        trip["speed_sum"] += v
+        if trip["speed_max"] is None or v > trip["speed_max"]:
+            trip["speed_max"] = v
+        if v > settings.TRIP_STOP_SPEED_MPS:
+            trip["moving_ts"] = ts
+    steer = r.get("steering_deg")
+    if steer is not None:
+        width = settings.TRIP_STEER_BUCKET_DEG
+        b = str(int(math.floor(steer / width) * width))
+        hist = trip["steer_hist"]
+        hist[b] = hist.get(b, 0) + 1
+    if r.get("movement_dir") is not None:
+        trip["last_dir"] = int(r["movement_dir"])
+    trip["end_ts"] = ts
+    trip["n"] += 1
+
+def _ended(trip: Dict[str, Any], ts: int) -> bool:
+    return ts - trip["end_ts"] > settings.TRIP_IDLE_GAP_MS or ts - trip["moving_ts"] > settings.TRIP_STOP_MS
+
+class TripTracker:
+    """Viagens em andamento por `src`; `feed` devolve as que fecharam."""
+
+    def __init__(self, open_trips: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self.open: Dict[str, Dict[str, Any]] = open_trips or {}
+
+    def feed(self, r: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        src = r.get("src") or ""
+        trip = self.open.get(src)
+        closed = None
+        if trip is not None and _ended(trip, int(r["ts"])):
+            trip["closed"] = 1
+            closed = trip
+            del self.open[src]
+            trip = None
+        if trip is None:
+            if not _moving(r):
+                return closed
+            trip = self.open[src] = _new_trip(src, int(r["ts"]))
+        _add(trip, r)
+        return closed
+
+# --- persistência --------------------------------------------------------------------------
+def _to_row(trip: Dict[str, Any]) -> Dict[str, Any]:
+    row = {k: trip[k] for k in _STATE_COLS if k != "id"}
+    row["steer_hist"] = json.dumps(trip["steer_hist"], separators=(",", ":"), sort_keys=True)
+    return row
+
+def _from_row(r: Any) -> Dict[str, Any]:
+    trip = dict(r._mapping)
+    trip["steer_hist"] = json.loads(trip["steer_hist"] or "{}")
+    return trip
+
+def _load_open(conn: Union[Session, Connection], srcs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    rows = conn.execute(_SELECT.where(Trip.closed == 0, Trip.src.in_(list(srcs)))).all()
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        trip = _from_row(r)
+        cur = out.get(trip["src"])
+        if cur is None or trip["start_ts"] > cur["start_ts"]:
+            out[trip["src"]] = trip
+    return out
+
+def _save(conn: Union[Session, Connection], trips: List[Dict[str, Any]]) -> None:
+    new = [_to_row(t) for t in trips if t["id"] is None]
+    old = [{"_" + k: v for k, v in _to_row(t).items()} | {"_id": t["id"]} for t in trips if t["id"] is not None]
+    if old:
+        conn.execute(_UPDATE, old)
+    if new:
+        conn.execute(insert(Trip), new)
+
+def apply_trips(conn: Union[Session, Connection], tel_rows: List[Dict[str, Any]]) -> None:
+    """Aplica um lote recém-inserido às viagens, na transação da inserção. Não faz commit."""
+    if not tel_rows:
+        return
+    rows = sorted(tel_rows, key=lambda r: r["ts"])
+    tracker = TripTracker(_load_open(conn, {r.get("src") or "" for r in rows}))
+    done: List[Dict[str, Any]] = []
+    for r in rows:
+        closed = tracker.feed(r)
+        if closed is not None:
+            done.append(closed)
+    # toda viagem carregada ou termina em `done` ou continua aberta
+    _save(conn, done + list(tracker.open.values()))
+
+# --- leitura ------------------------------------------------------------------------------------
+def trip_out(trip: Dict[str, Any], now_ms: int) -> Dict[str, Any]:
+    """Linha de `trips` -> formato da API."""
+    hist = trip["steer_hist"]
+    return {
+        "id": trip["id"],
+        "src": trip["src"],
+        "start_ts": trip["start_ts"],
+        "end_ts": trip["end_ts"],
+        "duration_ms": trip["end_ts"] - trip["start_ts"],
+        "active": not trip["closed"] and now_ms - trip["end_ts"] <= settings.TRIP_IDLE_GAP_MS,
+        "samples": trip["n"],
+        "distance_m": round(trip["distance_m"], 3),
+        "speed_max_mps": trip["speed_max"],
+        "speed_avg_mps": trip["speed_sum"] / trip["speed_n"] if trip["speed_n"] else None,
+        "reverse_ms": trip["reverse_ms"],
+        "steering_bucket_deg": settings.TRIP_STEER_BUCKET_DEG,
+        "steering_hist": {k: hist[k] for k in sorted(hist, key=int)},
+    }
+
+def list_trips(
+    db: Session,
+    src: Optional[str] = None,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    limit: int = 100,
+    before: Optional[Tuple[int, int]] = None,
+) -> List[Dict[str, Any]]:
+    """Viagens que cruzam [start_ts, end_ts], da mais nova para a mais velha (chave `(start_ts, id)`)."""
+    q = _SELECT
+    if src is not None:
+        q = q.where(Trip.src == src)
+    if start_ts is not None:
+        q = q.where(Trip.end_ts >= start_ts)
+    if end_ts is not None:
+        q = q.where(Trip.start_ts <= end_ts)
+    if before is not None:
+        q = q.where(tuple_(Trip.start_ts, Trip.id) < before)
+    rows = db.execute(q.order_by(Trip.start_ts.desc(), Trip.id.desc()).limit(limit)).all()
+    return [_from_row(r) for r in rows]
+
+def get_trip(db: Session, trip_id: int) -> Optional[Dict[str, Any]]:
+    r = db.execute(_SELECT.where(Trip.id == trip_id)).first()
+    return _from_row(r) if r else None
+
+# --- backfill --------------------------------------------------------------------------------------
+_FEED_COLS = ("ts", "src", "lat", "lon", "speed_est_mps", "steering_deg", "movement_dir")
+
+def _history(bind: Engine, upto_id: int, chunk: int = 20_000) -> Iterator[Dict[str, Any]]:
+    """Amostras em ordem de ts por src: segmentos frios e depois `telemetry` até `upto_id`."""
+    from app.crud.telemetry_archive import cold_rollup_rows
+
+    yield from cold_rollup_rows()
+    cols = [Telemetry.ts, Telemetry.id, *[getattr(Telemetry, c) for c in _FEED_COLS if c != "ts"]]
+    after: Optional[Tuple[int, int]] = None
+    while True:
+        q = select(*cols).where(Telemetry.id <= upto_id)
+        if after is not None:
+            q = q.where(tuple_(Telemetry.ts, Telemetry.id) > after)
+        with bind.connect() as conn:
+            rows = conn.execute(q.order_by(Telemetry.ts, Telemetry.id).limit(chunk)).all()
+        if not rows:
+            return
+        for r in rows:
+            yield r._asdict()
+        after = (rows[-1].ts, rows[-1].id)
+
+def rebuild_trips(bind: Engine) -> Dict[str, int]:
+    """Refaz `trips` a partir do histórico (camada fria + `telemetry`).
+
+    A varredura lê um snapshot (pool de leitura) até o maior `id` do início;
+    só a troca da tabela e as linhas que chegaram durante a varredura rodam na
+    transação de escrita.
+    """
+    from app.core.db import read_engine
+
+    with read_engine.connect() as conn:
+        upto = conn.execute(select(Telemetry.id).order_by(Telemetry.id.desc()).limit(1)).scalar() or 0
+    tracker = TripTracker()
+    done: List[Dict[str, Any]] = []
+    samples = 0
+    for r in _history(read_engine, upto):
+        samples += 1
+        closed = tracker.feed(r)
+        if closed is not None:
+            done.append(closed)
+
+    with bind.begin() as conn:
+        conn.execute(delete(Trip))
+        _save(conn, done + list(tracker.open.values()))
+        late = [r._asdict() for r in conn.execute(
+            select(*[getattr(Telemetry, c) for c in _FEED_COLS]).where(Telemetry.id > upto).order_by(Telemetry.ts, Telemetry.id)
+        ).all()]
+        apply_trips(conn, late)
+    return {"samples": samples + len(late), "trips": len(done) + len(tracker.open)}
@@ -1,19 +1,26 @@
 from __future__ import annotations
 
 import asyncio
-import json
-import threading
-from typing import Set
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
-from app.core.db import init_db, SessionLocal
+from app.core.db import init_db, engine, ReadSessionLocal
+from app.core.latest_cache import latest_cache
+from app.crud.telemetry_latest import load_latest
+from app.crud.telemetry_archive import archive_store
+from app.crud.telemetry_raw_partitions import raw_partitions
+from app.crud.retention import maintenance_loop
+from app.core.ingest import ingest_writer
+from app.core.cluster import cluster, startup_lock
+from app.core.fanout import ws_fanout
+from app.core.mqtt_consumer import mqtt_consumer
+from app.core.wsframe import FORMATS
 from app.api.v1 import telemetry as api_telemetry
 from app.api.v1 import telemetry_raw as api_telemetry_raw
-from app.schemas.telemetry import TelemetryIn
-from app.crud.telemetry import create_from_payload
+from app.api.v1 import fleet as api_fleet
+from app.api.v1 import trips as api_trips
 
 # ---------------------------------------------------------------------
 # OpenAPI / App metadata
@@ -46,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[api_telemetry.NEXT_CURSOR_HEADER],
 )
 
 # ---------------------------------------------------------------------
@@ -53,6 +61,8 @@ app.add_middleware(
 # ---------------------------------------------------------------------
 app.include_router(api_telemetry.router, prefix="/api/v1/telemetry", tags=["telemetry"])
 app.include_router(api_telemetry_raw.router)
+app.include_router(api_fleet.router)
+app.include_router(api_trips.router)
 
 # ---------------------------------------------------------------------
 # Health (inline para evitar módulos extras)
@@ -67,138 +77,86 @@ def ready() -> dict:
     return {"status": "ready"}
 
 # ---------------------------------------------------------------------
-# WebSocket manager simples (broadcast)
+# WebSocket (fan-out com fila por cliente; ver app/core/fanout.py)
 # ---------------------------------------------------------------------
-class WebSocketManager:
-    def __init__(self) -> None:
-        self._clients: Set[WebSocket] = set()
-
-    async def connect(self, ws: WebSocket) -> None:
-        await ws.accept()
-        self._clients.add(ws)
-
-    def disconnect(self, ws: WebSocket) -> None:
-        self._clients.discard(ws)
-
-    async def broadcast(self, payload) -> None:
-        dead: list[WebSocket] = []
-        for client in list(self._clients):
-            try:
-                await client.send_json(payload)
-            except Exception:
-                dead.append(client)
-        for ws in dead:
-            self.disconnect(ws)
-
-ws_manager = WebSocketManager()
-
 @app.websocket("/ws")
-async def ws_endpoint(ws: WebSocket):
-    await ws_manager.connect(ws)
+async def ws_endpoint(ws: WebSocket, fmt: str = Query("json", alias="format")):
+    # Formato do frame negociado na conexão: /ws?format=json|bin|delta (ver app/core/wsframe.py)
+    if fmt not in FORMATS:
+        await ws.close(code=1008)
+        return
+    client = await ws_fanout.connect(ws, fmt)
     try:
-        # Mantém a conexão viva sem exigir mensagens do cliente
+        # Mensagens do cliente: assinatura (src, campos, taxa); ver app/core/subscriptions.py
         while True:
-            await asyncio.sleep(30)
+            ws_fanout.handle_message(client, await ws.receive_text())
     except WebSocketDisconnect:
         pass
     finally:
-        ws_manager.disconnect(ws)
+        await ws_fanout.disconnect(client)
 
-# ---------------------------------------------------------------------
-# MQTT subscriber (inline, sem depender de services antigos)
-# ---------------------------------------------------------------------
-try:
-    import paho.mqtt.client as mqtt  # type: ignore
-    _HAS_PAHO = True
-except Exception:
-    _HAS_PAHO = False
-
-def _start_mqtt_subscriber(loop: asyncio.AbstractEventLoop) -> None:
-    """
-    Inicia uma thread que:
-      - Conecta no MQTT (MQTT_URL)
-      - Assina o tópico (MQTT_TOPIC_SUB)
-      - Para cada mensagem:
-          * valida (TelemetryIn)
-          * persiste bruto+processado (create_from_payload)
-          * faz broadcast no WS do documento processado
-    """
-    if not _HAS_PAHO:
-        print("[api] paho-mqtt não instalado; consumo via MQTT desabilitado.")
-        return
+@app.get("/ws/stats", tags=["health"])
+def ws_stats() -> dict:
+    """Clientes conectados, assinaturas ativas e atraso/descartes de cada fila de envio."""
+    return ws_fanout.stats()
 
-    from urllib.parse import urlparse
+@app.get("/cluster/stats", tags=["health"])
+def cluster_stats() -> dict:
+    """Este worker: se é o líder da ingestão e o estado do fan-out entre workers."""
+    return cluster.stats()
 
-    url = settings.MQTT_URL or ""
-    topic = settings.MQTT_TOPIC_SUB or ""
-    if not url or not topic:
-        print("[api] MQTT_URL/MQTT_TOPIC_SUB não configurados; consumo via MQTT desabilitado.")
-        return
+@app.get("/mqtt/stats", tags=["health"])
+def mqtt_stats() -> dict:
+    """Estado do consumidor MQTT: conexão, fila, confirmações e reconexões."""
+    return mqtt_consumer.stats()
 
-    u = urlparse(url)
-    host = u.hostname or "localhost"
-    port = u.port or 1883
-
-    client = mqtt.Client()
-    if u.username:
-        client.username_pw_set(u.username, u.password or "")
-
-    def on_connect(cli, userdata, flags, rc):
-        print(f"[api] MQTT conectado (rc={rc}) -> subscrevendo '{topic}'")
-        cli.subscribe(topic, qos=0)
-
-    def on_message(cli, userdata, msg):
-        try:
-            raw = json.loads(msg.payload.decode("utf-8"))
-            payload = TelemetryIn.model_validate(raw)
-        except Exception as e:
-            print("[api] MQTT mensagem inválida:", e)
-            return
-
-        db = SessionLocal()
-        try:
-            proc = create_from_payload(db, payload)
-        except Exception as e:
-            print("[api] erro ao persistir MQTT:", e)
-            proc = None
-        finally:
-            db.close()
-
-        if proc is not None:
-            try:
-                asyncio.run_coroutine_threadsafe(ws_manager.broadcast(proc), loop)
-            except Exception as e:
-                print("[api] erro no broadcast WS:", e)
-
-    def worker():
-        try:
-            client.on_connect = on_connect
-            client.on_message = on_message
-            client.connect(host, port, keepalive=30)
-            print(f"[api] Consumindo MQTT em mqtt://{host}:{port} topic='{topic}'")
-            client.loop_forever()
-        except Exception as e:
-            print("[api] MQTT subscriber encerrou com erro:", e)
-
-    th = threading.Thread(target=worker, name="mqtt-subscriber", daemon=True)
-    th.start()
+@app.get("/archive/stats", tags=["health"])
+def archive_stats() -> dict:
+    """Camada fria e partições de `telemetry_raw`: arquivos, linhas e bytes."""
+    return {**archive_store.stats(), "raw_partitions": raw_partitions.stats()}
 
 # ---------------------------------------------------------------------
 # Startup / Shutdown
 # ---------------------------------------------------------------------
 _event_loop: asyncio.AbstractEventLoop | None = None
+_maintenance_task: asyncio.Task | None = None
+
+def _on_leader() -> None:
+    global _maintenance_task
+    mqtt_consumer.start()
+    if settings.ARCHIVE_INTERVAL_S > 0:
+        _maintenance_task = asyncio.create_task(maintenance_loop(engine, settings.ARCHIVE_INTERVAL_S), name="storage-maintenance")
 
 @app.on_event("startup")
 async def on_startup():
     global _event_loop
-    # Garante as tabelas do SQLite
-    init_db()
-    # Captura event loop para uso no broadcast a partir da thread MQTT
+    # Garante as tabelas do SQLite (um worker por vez)
+    with startup_lock(f"{cluster.lock_path}.init"):
+        init_db()
+    # Aquece o cache do último estado por origem (warm restart)
+    with ReadSessionLocal() as db:
+        latest_cache.load(load_latest(db))
+    # Captura event loop para uso no broadcast a partir da thread do escritor
     _event_loop = asyncio.get_running_loop()
-    # Inicia o assinante MQTT (se configurado)
-    _start_mqtt_subscriber(_event_loop)
+    # Escritor em lote: broadcast só depois do commit do lote
+    loop = _event_loop
+
+    def _on_commit(procs, tel_rows):
+        # só enfileira: o envio a cada cliente é feito pela task dele, e o lote
+        # segue pelo IPC para os outros workers
+        loop.call_soon_threadsafe(cluster.committed, procs, tel_rows)
+
+    ingest_writer.on_commit = _on_commit
+    ingest_writer.start()
+    # Só o líder (um por volume SQLite) consome o MQTT e cuida da selagem/retenção
+    await cluster.start(on_leader=_on_leader)
 
 @app.on_event("shutdown")
-def on_shutdown():
-    # Nada especial; o thread MQTT é daemon e sai com o processo.
-    pass
\ No newline at end of file
+async def on_shutdown():
+    # Para de consumir antes; o escritor grava o que ainda estiver na fila
+    # antes de parar (PUBACKs pendentes são reentregues pelo broker).
+    await mqtt_consumer.stop()
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+    ingest_writer.stop()
+    await cluster.stop()
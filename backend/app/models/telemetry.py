@@ -1,17 +1,35 @@
 
 """Modelos ORM (SQLAlchemy 2.x) para telemetria (bruta e processada)."""
-from sqlalchemy import Column, Integer, Float, BigInteger, String, Text
+from sqlalchemy import Column, Index, Integer, Float, BigInteger, String, LargeBinary
 from app.core.db import Base
+from app.core.doccodec import CompressedText
+
+# Colunas numéricas de `telemetry` que podem ser agregadas (e têm rollup)
+NUMERIC_FIELDS = (
+    "speed_est_mps",
+    "pwm",
+    "steering_deg",
+    "speed_cmd_pct",
+    "speed_cmd_mps",
+    "movement_dir",
+    "lat",
+    "lon",
+)
+
+# Campos com sketch de quantis (lat/lon ficam de fora: erro relativo numa coordenada não faz sentido)
+SKETCH_FIELDS = tuple(f for f in NUMERIC_FIELDS if f not in ("lat", "lon"))
 
 class TelemetryRaw(Base):
     __tablename__ = "telemetry_raw"
+    __table_args__ = (Index("ix_telemetry_raw_src_received_at", "src", "received_at"),)
     id = Column(Integer, primary_key=True, index=True)
     received_at = Column(BigInteger, index=True)
     src = Column(String(32), nullable=True)
-    raw_json = Column(Text, nullable=False)
+    raw_json = Column(CompressedText("raw"), nullable=False)
 
 class Telemetry(Base):
     __tablename__ = "telemetry"
+    __table_args__ = (Index("ix_telemetry_src_ts", "src", "ts"),)
     id = Column(Integer, primary_key=True, index=True)
     ts = Column(BigInteger, index=True)
     ts_iso = Column(String, nullable=True)
@@ -30,4 +48,85 @@ class Telemetry(Base):
     speed_cmd_mps = Column(Float, nullable=True)
     movement_dir = Column(Integer, nullable=True)
 
-    doc_json = Column(Text, nullable=False)
+    doc_json = Column(CompressedText("doc"), nullable=False)
+
+class TelemetryLatest(Base):
+    """Último documento processado de cada `src` (src nulo vira ""), para warm restart do cache."""
+    __tablename__ = "telemetry_latest"
+    src = Column(String(32), primary_key=True)
+    ts = Column(BigInteger, nullable=False)
+    updated_at = Column(BigInteger, nullable=False)
+    doc_json = Column(CompressedText("doc"), nullable=False)
+
+class TelemetryDict(Base):
+    """Dicionários de compressão de `raw_json`/`doc_json` (ver app/core/doccodec.py); nunca apagados."""
+    __tablename__ = "telemetry_dict"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(8), nullable=False)  # "raw" | "doc"
+    created_at = Column(BigInteger, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+class TelemetryRollup(Base):
+    """Agregados por janela fixa (`res_ms` = 1 s, 1 min, 1 h) e por `src`.
+
+    Para cada campo de NUMERIC_FIELDS há `<campo>_n/_sum/_min/_max/_last`;
+    `last_ts` é o ts da amostra mais recente da janela. `src` nulo vira "".
+    """
+    __tablename__ = "telemetry_rollup"
+    __table_args__ = (Index("ix_telemetry_rollup_res_bucket", "res_ms", "bucket"),)
+    res_ms = Column(Integer, primary_key=True)
+    src = Column(String(32), primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)  # ts // res_ms
+    n = Column(Integer, nullable=False, default=0)
+    last_ts = Column(BigInteger, nullable=True)
+
+for _f in NUMERIC_FIELDS:
+    setattr(TelemetryRollup, f"{_f}_n", Column(Integer, nullable=False, default=0))
+    setattr(TelemetryRollup, f"{_f}_sum", Column(Float, nullable=False, default=0.0))
+    setattr(TelemetryRollup, f"{_f}_min", Column(Float, nullable=True))
+    setattr(TelemetryRollup, f"{_f}_max", Column(Float, nullable=True))
+    setattr(TelemetryRollup, f"{_f}_last", Column(Float, nullable=True))
+
+class TelemetrySketch(Base):
+    """Sketches de quantis por janela fixa (`res_ms` = 1 min, 1 h) e por `src`.
+
+    Uma coluna BLOB por campo de SKETCH_FIELDS (ver app/crud/telemetry_sketch.py);
+    nula quando a janela não teve valor do campo. `src` nulo vira "".
+    """
+    __tablename__ = "telemetry_sketch"
+    __table_args__ = (Index("ix_telemetry_sketch_res_bucket", "res_ms", "bucket"),)
+    res_ms = Column(Integer, primary_key=True)
+    src = Column(String(32), primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)  # ts // res_ms
+
+for _f in SKETCH_FIELDS:
+    setattr(TelemetrySketch, _f, Column(LargeBinary, nullable=True))
+
+class Trip(Base):
+    """Viagem detectada na ingestão (ver app/crud/trips.py).
+
+    Somatórios mantidos de forma incremental: cada amostra atualiza a linha em
+    O(1). `last_*` é o estado necessário para a próxima amostra; `steer_hist` é
+    um JSON `{início do balde em graus: amostras}`.
+    """
+    __tablename__ = "trips"
+    __table_args__ = (
+        Index("ix_trips_src_start_ts", "src", "start_ts"),
+        Index("ix_trips_start_ts", "start_ts"),
+    )
+    id = Column(Integer, primary_key=True)
+    src = Column(String(32), nullable=False)  # src nulo vira ""
+    start_ts = Column(BigInteger, nullable=False)
+    end_ts = Column(BigInteger, nullable=False)  # ts da última amostra
+    moving_ts = Column(BigInteger, nullable=False)  # ts da última amostra em movimento
+    closed = Column(Integer, nullable=False, default=0)
+    n = Column(Integer, nullable=False, default=0)
+    distance_m = Column(Float, nullable=False, default=0.0)
+    speed_n = Column(Integer, nullable=False, default=0)
+    speed_sum = Column(Float, nullable=False, default=0.0)
+    speed_max = Column(Float, nullable=True)
+    reverse_ms = Column(BigInteger, nullable=False, default=0)
+    steer_hist = Column(String, nullable=False, default="{}")
+    last_lat = Column(Float, nullable=True)
+    last_lon = Column(Float, nullable=True)
+    last_dir = Column(Integer, nullable=True)
@@ -1,7 +1,7 @@
 
 """Esquemas Pydantic para validação/serialização de telemetria (versão única)."""
 from pydantic import BaseModel, Field, conint, confloat
-from typing import Optional
+from typing import Optional, List
 
 # ---------- Blocos "car" ----------
 class CarGPS(BaseModel):
@@ -59,4 +59,10 @@ class TelemetryOut(BaseModel):
     src: Optional[str]
 
     car: CarBlock
-    centric: CentricBlock
\ No newline at end of file
+    centric: CentricBlock
+
+# ---------- Ingestão em lote ----------
+class TelemetryBulkResult(BaseModel):
+    accepted: int = Field(..., description="Amostras válidas persistidas")
+    rejected: int = Field(..., description="Linhas/itens rejeitados")
+    rejected_indexes: List[int] = Field(default_factory=list, description="Índices (base 0) rejeitados")
@@ -0,0 +1,68 @@
+
+"""Esquemas de saída da agregação por janelas de tempo."""
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+
+class FieldStats(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: Optional[float] = None
+    count: int = 0
+    last: Optional[float] = None
+
+class AggregateBucket(BaseModel):
+    t: int = Field(..., description="Início da janela (epoch ms)")
+    count: int = Field(..., description="Amostras na janela")
+    fields: Dict[str, FieldStats]
+
+class TelemetryAggregateOut(BaseModel):
+    mode: str = "buckets"
+    start_ts: int
+    end_ts: int
+    bucket_ms: int
+    src: Optional[str] = None
+    buckets: List[AggregateBucket]
+
+class TelemetrySeriesOut(BaseModel):
+    mode: str = "lttb"
+    start_ts: int
+    end_ts: int
+    points: int
+    src: Optional[str] = None
+    series: Dict[str, List[Tuple[int, float]]] = Field(..., description="Por campo: lista de [ts, valor]")
+
+class TelemetryTrackOut(BaseModel):
+    src: str
+    start_ts: int
+    end_ts: int
+    tolerance_m: float
+    points: List[Tuple[int, float, float]] = Field(..., description="Trajeto simplificado: lista de [ts, lat, lon]")
+
+class TelemetryQuantilesOut(BaseModel):
+    field: str
+    start_ts: int
+    end_ts: int
+    src: Optional[str] = None
+    n: int = Field(..., description="Amostras com valor no intervalo")
+    rel_accuracy: float = Field(..., description="Erro relativo máximo de cada valor (SKETCH_REL_ACCURACY)")
+    quantiles: Dict[str, Optional[float]] = Field(..., description="Por quantil pedido (como veio em `q`)")
+    sketches: int = Field(..., description="Sketches de janela (1 h / 1 min) somados")
+    exact_rows: int = Field(..., description="Linhas das pontas lidas direto da tabela/segmentos")
+
+class SignalStats(BaseModel):
+    n: int
+    mean: float
+    var: float = Field(..., description="Variância (populacional)")
+    rms: float
+    peak: float = Field(..., description="Maior |valor| na janela")
+
+class LiveStatsSource(BaseModel):
+    src: str
+    last_ts: int = Field(..., description="ts da amostra mais nova desta origem")
+    windows: Dict[str, Dict[str, SignalStats]] = Field(..., description="Por janela (ms) e sinal; sinal sem amostra na janela fica de fora")
+
+class LiveStatsOut(BaseModel):
+    now: int = Field(..., description="Fim das janelas (epoch ms)")
+    windows_ms: List[int]
+    signals: List[str] = Field(..., description="spinX/Y/Z em °/s (escalados por scale_dps)")
+    sources: List[LiveStatsSource]
@@ -0,0 +1,18 @@
+"""Esquemas de saída das viagens (`/api/v1/trips`)."""
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+
+class TripOut(BaseModel):
+    id: int
+    src: str = Field(..., description="Origem (nula vira \"\")")
+    start_ts: int = Field(..., description="Primeira amostra (epoch ms)")
+    end_ts: int = Field(..., description="Última amostra (epoch ms)")
+    duration_ms: int
+    active: bool = Field(..., description="Viagem ainda aberta e com amostras recentes")
+    samples: int
+    distance_m: float = Field(..., description="Soma das distâncias haversine entre posições consecutivas")
+    speed_max_mps: Optional[float] = None
+    speed_avg_mps: Optional[float] = None
+    reverse_ms: int = Field(..., description="Tempo com movement_dir == 0 (ré)")
+    steering_bucket_deg: int
+    steering_hist: Dict[str, int] = Field(..., description="Amostras por balde de steering_deg (chave = início do balde em graus)")
@@ -0,0 +1,117 @@
+"""Benchmark: tamanho e leitura da camada fria (segmentos) contra o SQLite.
+
+Grava `--rows` amostras (uma a cada `--step-ms`, duas origens) num SQLite
+temporário, mede o banco (após VACUUM), sela tudo em segmentos e compara:
+bytes por linha e o tempo de varrer o intervalo inteiro por keyset
+(`list_range_keyset_docs`) e de agregar por hora sem rollups.
+
+Uso (a partir de backend/):
+    python -m bench.bench_archive [--rows 200000] [--step-ms 200]
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import os
+import random
+import tempfile
+import time
+
+def _fill(n: int, step_ms: int, t0: int) -> None:
+    from app.core.db import engine
+    from app.crud.telemetry import build_rows, insert_rows
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_read_p99 import SAMPLE
+
+    rnd = random.Random(42)
+    raw = copy.deepcopy(SAMPLE)
+    raw_rows, tel_rows = [], []
+    for i in range(n):
+        car = raw["car"]
+        raw["src"] = "bench-a" if i % 2 else "bench-b"
+        car["gps"]["latitude"] += rnd.uniform(-1e-5, 1e-5)
+        car["gps"]["longitude"] += rnd.uniform(-1e-5, 1e-5)
+        car["imu"]["accelerationX"] = max(-128, min(127, car["imu"]["accelerationX"] + rnd.randint(-2, 2)))
+        car["drive"]["speed_est_mps"] = round(rnd.uniform(0, 5), 3)
+        r, t, _ = build_rows(TelemetryIn.model_validate(raw), t0 + i * step_ms)
+        raw_rows.append(r)
+        tel_rows.append(t)
+        if len(tel_rows) >= 5000:
+            with engine.begin() as conn:
+                insert_rows(conn, raw_rows, tel_rows)
+            raw_rows, tel_rows = [], []
+    if tel_rows:
+        with engine.begin() as conn:
+            insert_rows(conn, raw_rows, tel_rows)
+
+def _table_bytes() -> int:
+    """Bytes de `telemetry` + índices (dbstat), sem `telemetry_raw` nem rollups."""
+    from sqlalchemy import text
+    from app.core.db import engine
+
+    with engine.connect() as conn:
+        try:
+            return int(conn.execute(text(
+                "SELECT sum(pgsize) FROM dbstat WHERE name = 'telemetry' OR name IN "
+                "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'telemetry')"
+            )).scalar() or 0)
+        except Exception:
+            return os.path.getsize(os.environ["SQLITE_PATH"])
+
+def _scan(t0: int, t1: int):
+    from app.core.db import ReadSessionLocal
+    from app.crud.telemetry import list_range_keyset_docs
+    from app.crud.telemetry_agg import aggregate_range
+
+    with ReadSessionLocal() as db:
+        t = time.perf_counter()
+        n, cursor = 0, None
+        while True:
+            docs, cursor = list_range_keyset_docs(db, limit=1000, cursor=cursor, start_ts=t0, end_ts=t1)
+            n += len(docs)
+            if cursor is None:
+                break
+        scan = time.perf_counter() - t
+        t = time.perf_counter()
+        aggregate_range(db, t0, t1, 3600 * 1000, ["speed_est_mps", "lat", "lon", "pwm"], use_rollups=False)
+        agg = time.perf_counter() - t
+    return n, scan, agg
+
+def run(args) -> None:
+    from app.core.db import engine, init_db
+    from app.crud.telemetry_archive import archive_store, seal_archive
+
+    init_db()
+    now = int(time.time() * 1000)
+    t0 = now - 30 * 24 * 3600 * 1000
+    t1 = t0 + args.rows * args.step_ms
+    _fill(args.rows, args.step_ms, t0)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    hot_bytes = _table_bytes()
+    n, scan_hot, agg_hot = _scan(t0, t1)
+
+    t = time.perf_counter()
+    out = seal_archive(engine, older_than_ms=0)
+    seal_s = time.perf_counter() - t
+    cold_bytes = archive_store.stats()["bytes"]
+    n2, scan_cold, agg_cold = _scan(t0, t1)
+    assert n == n2 == args.rows, (n, n2)
+
+    print(f"selagem: {out['rows']} linhas em {out['segments']} segmentos em {seal_s:.1f}s")
+    print(f"[quente] {hot_bytes / n:7.1f} B/linha | keyset {scan_hot:6.2f}s | aggregate {agg_hot * 1000:7.1f} ms")
+    print(f"[fria  ] {cold_bytes / n:7.1f} B/linha | keyset {scan_cold:6.2f}s | aggregate {agg_cold * 1000:7.1f} ms "
+          f"({cold_bytes / hot_bytes * 100:.1f}% do tamanho)")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--step-ms", type=int, default=200)
+    args = ap.parse_args()
+    d = tempfile.mkdtemp(prefix="bench-archive-")
+    os.environ["SQLITE_PATH"] = os.path.join(d, "bench.db")
+    os.environ.setdefault("MQTT_URL", "")
+    run(args)
+
+if __name__ == "__main__":
+    main()
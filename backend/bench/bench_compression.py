@@ -0,0 +1,123 @@
+"""Benchmark: compressão de `raw_json`/`doc_json` (DOC_COMPRESSION=off × zlib).
+
+Os payloads vêm do `make_payload` de `simulator/sim.py` (extraído do fonte, sem
+conectar ao broker), com `t` avançando `SIM_INTERVAL_MS` por amostra e algumas
+origens. Cada modo roda num subprocesso com um SQLite temporário e mede:
+
+- tamanho em disco (após VACUUM) e bytes médios por linha de cada coluna JSON;
+- vazão de ingestão (`build_rows` + `insert_rows` em lotes, como o escritor);
+- latência de leitura de `/list` (`list_range_docs`, 100 docs) e de uma
+  agregação que só lê colunas indexadas (não descomprime nada).
+
+Uso (a partir de backend/):
+    python -m bench.bench_compression [--rows 100000] [--batch 256] [--level 6]
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SIM_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "simulator", "sim.py")
+
+def load_make_payload(src: str):
+    """`make_payload` do simulador, sem executar o resto do módulo (que conecta no MQTT)."""
+    with open(SIM_PATH, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    fn = next(n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name == "make_payload")
+    ns = {"SRC": src, "math": math}
+    exec(compile(ast.Module(body=[fn], type_ignores=[]), SIM_PATH, "exec"), ns)
+    return ns["make_payload"]
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+def run_mode(rows: int, batch: int) -> dict:
+    from sqlalchemy import text
+    from app.core.db import engine, init_db, ReadSessionLocal
+    from app.crud.telemetry import build_rows, insert_rows, list_range_docs
+    from app.crud.telemetry_agg import aggregate_range
+    from app.schemas.telemetry import TelemetryIn
+
+    init_db()
+    makers = [load_make_payload(f"sim-{i}") for i in range(4)]
+    interval = int(os.getenv("SIM_INTERVAL_MS", "200")) / 1000.0
+    ts0 = int(time.time() * 1000) - rows * 50
+
+    ingest_s = 0.0
+    for start in range(0, rows, batch):
+        raw_rows, tel_rows = [], []
+        for i in range(start, min(rows, start + batch)):
+            body = json.dumps(makers[i % 4]((i // 4) * interval)).encode()
+            t = time.perf_counter()
+            r, tr, _ = build_rows(TelemetryIn.model_validate_json(body), ts0 + i * 50, body)
+            ingest_s += time.perf_counter() - t
+            raw_rows.append(r)
+            tel_rows.append(tr)
+        t = time.perf_counter()
+        with engine.begin() as conn:
+            insert_rows(conn, raw_rows, tel_rows)
+        ingest_s += time.perf_counter() - t
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        avg_doc = conn.execute(text("SELECT avg(length(doc_json)) FROM telemetry")).scalar()
+        avg_raw = conn.execute(text("SELECT avg(length(raw_json)) FROM telemetry_raw")).scalar()
+
+    lat_list, lat_agg = [], []
+    span = rows * 50
+    with ReadSessionLocal() as db:
+        for k in range(200):
+            lo = ts0 + (k * 7919 * 50) % max(1, span - 100_000)
+            t = time.perf_counter()
+            list_range_docs(db, limit=100, start_ts=lo, end_ts=lo + 100_000, order_by="ts")
+            lat_list.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            aggregate_range(db, lo, lo + 100_000, 10_000, ["speed_est_mps", "pwm"], use_rollups=False)
+            lat_agg.append(time.perf_counter() - t)
+
+    return {
+        "db_mb": os.path.getsize(os.environ["SQLITE_PATH"]) / 1e6,
+        "doc_b": avg_doc,
+        "raw_b": avg_raw,
+        "rows_per_s": rows / ingest_s,
+        "list_p50": _pct(lat_list, 50),
+        "list_p99": _pct(lat_list, 99),
+        "agg_p50": _pct(lat_agg, 50),
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--batch", type=int, default=256)
+    ap.add_argument("--level", type=int, default=6)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.rows, args.batch)))
+        return
+
+    for mode in ("off", "zlib"):
+        with tempfile.TemporaryDirectory() as d:
+            env = {**os.environ, "DOC_COMPRESSION": mode, "DOC_COMPRESSION_LEVEL": str(args.level),
+                   "SQLITE_PATH": os.path.join(d, "bench.db"), "MQTT_URL": ""}
+            out = subprocess.run(
+                [sys.executable, "-m", "bench.bench_compression", "--child",
+                 "--rows", str(args.rows), "--batch", str(args.batch)],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"[{mode:4}] disco {r['db_mb']:7.1f} MB | doc_json {r['doc_b']:6.1f} B | raw_json {r['raw_b']:6.1f} B | "
+                  f"ingestão {r['rows_per_s']:7.0f} linhas/s | list p50/p99 {r['list_p50']:5.2f}/{r['list_p99']:5.2f} ms | "
+                  f"aggregate p50 {r['agg_p50']:5.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Benchmark: consultas geo com o R*Tree (`telemetry_geo`) × varredura sem índice.
+
+Grava `--rows` amostras (quatro origens, cada uma num passeio aleatório de
+~10 m por amostra em volta do mesmo ponto) num SQLite temporário e compara,
+para caixas e raios pequenos espalhados pela área:
+
+- `bbox_docs` / `near_docs` (R*Tree + filtro exato), com e sem filtro de tempo;
+- a mesma consulta por varredura de `telemetry` (`lat`/`lon` sem índice).
+
+Confere que os dois caminhos devolvem as mesmas linhas e mede o custo do
+índice na ingestão (tabela com e sem os triggers) e no tamanho do banco.
+
+Uso (a partir de backend/):
+    python -m bench.bench_geo [--rows 300000] [--queries 100]
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import os
+import random
+import tempfile
+import time
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+
+def _fill(n: int, t0: int) -> float:
+    """Grava as amostras; retorna o tempo só do `insert_rows`."""
+    from app.core.db import engine
+    from app.crud.telemetry import build_rows, insert_rows
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_read_p99 import SAMPLE
+
+    rnd = random.Random(7)
+    pos = [[-23.5586, -46.6492] for _ in range(4)]
+    raw = copy.deepcopy(SAMPLE)
+    raw_rows, tel_rows, spent = [], [], 0.0
+
+    def flush():
+        nonlocal spent
+        t = time.perf_counter()
+        with engine.begin() as conn:
+            insert_rows(conn, raw_rows, tel_rows)
+        spent += time.perf_counter() - t
+        raw_rows.clear()
+        tel_rows.clear()
+
+    for i in range(n):
+        k = i % 4
+        pos[k][0] += rnd.uniform(-1e-4, 1e-4)
+        pos[k][1] += rnd.uniform(-1e-4, 1e-4)
+        raw["src"] = f"bench-{k}"
+        raw["car"]["gps"] = {"latitude": pos[k][0], "longitude": pos[k][1]}
+        r, t, _ = build_rows(TelemetryIn.model_validate(raw), t0 + i * 50)
+        raw_rows.append(r)
+        tel_rows.append(t)
+        if len(tel_rows) >= 5000:
+            flush()
+    if tel_rows:
+        flush()
+    return spent
+
+def _scan(db, min_lat, max_lat, min_lon, max_lon, start_ts=None, end_ts=None):
+    """A mesma consulta sem o R*Tree: `NOT INDEXED` varre `telemetry` inteira."""
+    from sqlalchemy import text
+    from app.models.telemetry import Telemetry
+
+    where = "lat BETWEEN :a AND :b AND lon BETWEEN :c AND :d"
+    params = {"a": min_lat, "b": max_lat, "c": min_lon, "d": max_lon}
+    if start_ts is not None:
+        where += " AND ts BETWEEN :s AND :e"
+        params.update(s=start_ts, e=end_ts)
+    q = text(f"SELECT lat, lon, doc_json FROM telemetry NOT INDEXED WHERE {where} ORDER BY ts, id")
+    return db.execute(q.columns(doc_json=Telemetry.__table__.c.doc_json.type), params).all()
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=300_000)
+    ap.add_argument("--queries", type=int, default=100)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_geo_")
+    os.environ["SQLITE_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(tmp, "segments")
+    os.environ.setdefault("MQTT_URL", "")
+
+    from sqlalchemy import text
+    from app.core.db import engine, init_db, ReadSessionLocal
+    from app.crud.telemetry_geo import GEO_TABLE, bbox_docs, haversine_m, near_docs, radius_bbox
+
+    init_db()
+    t0 = int(time.time() * 1000) - args.rows * 50
+
+    # ingestão sem os triggers (primeira metade) e com eles (segunda metade)
+    with engine.begin() as conn:
+        for trg in ("ai", "au", "ad"):
+            conn.exec_driver_sql(f"DROP TRIGGER {GEO_TABLE}_{trg}")
+    half = args.rows // 2
+    s_off = _fill(half, t0)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE {GEO_TABLE}")
+    init_db()  # recria e indexa a primeira metade
+    s_on = _fill(args.rows - half, t0 + half * 50)
+    print(f"ingestão (insert_rows): sem índice {half / s_off:8.0f} linhas/s | com R*Tree {(args.rows - half) / s_on:8.0f} linhas/s")
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        lat_lo, lat_hi, lon_lo, lon_hi = conn.execute(text("SELECT min(lat), max(lat), min(lon), max(lon) FROM telemetry")).one()
+        try:
+            geo_b = conn.execute(text(f"SELECT sum(pgsize) FROM dbstat WHERE name LIKE '{GEO_TABLE}%'")).scalar() or 0
+        except Exception:
+            geo_b = 0
+    print(f"área {lat_hi - lat_lo:.4f}° × {lon_hi - lon_lo:.4f}° | R*Tree {geo_b / 1e6:.1f} MB "
+          f"({geo_b / args.rows:.0f} B/linha) | banco {os.path.getsize(os.environ['SQLITE_PATH']) / 1e6:.1f} MB")
+
+    rnd = random.Random(1)
+    span = args.rows * 50
+    cases = []
+    for _ in range(args.queries):
+        lat, lon = rnd.uniform(lat_lo, lat_hi), rnd.uniform(lon_lo, lon_hi)
+        start = t0 + rnd.randrange(0, max(1, span - span // 10))
+        cases.append((lat, lon, start, start + span // 10))
+
+    lim = 10_000_000
+    results = {name: [] for name in ("bbox", "bbox_scan", "bbox_t", "bbox_t_scan", "near", "near_scan")}
+    mismatches = hits = 0
+    with ReadSessionLocal() as db:
+        for lat, lon, start, end in cases:
+            box = radius_bbox(lat, lon, 200.0)
+
+            t = time.perf_counter(); a = bbox_docs(db, *box, limit=lim); results["bbox"].append(time.perf_counter() - t)
+            t = time.perf_counter(); b = [r[2] for r in _scan(db, *box)]; results["bbox_scan"].append(time.perf_counter() - t)
+            mismatches += a != b
+            hits += len(a)
+
+            t = time.perf_counter(); a = bbox_docs(db, *box, start_ts=start, end_ts=end, limit=lim)
+            results["bbox_t"].append(time.perf_counter() - t)
+            t = time.perf_counter(); b = [r[2] for r in _scan(db, *box, start, end)]
+            results["bbox_t_scan"].append(time.perf_counter() - t)
+            mismatches += a != b
+
+            t = time.perf_counter(); a = near_docs(db, lat, lon, 200.0, limit=lim); results["near"].append(time.perf_counter() - t)
+            t = time.perf_counter()
+            b = [d for la, lo, d in _scan(db, *box) if haversine_m(lat, lon, la, lo) <= 200.0]
+            results["near_scan"].append(time.perf_counter() - t)
+            mismatches += a != b
+
+    print(f"{args.queries} consultas (caixa/raio de 200 m, {hits / args.queries:.0f} linhas em média), divergências: {mismatches}")
+    for name, label in (("bbox", "bbox"), ("bbox_t", "bbox + 10% do tempo"), ("near", "near 200 m")):
+        idx, scan = results[name], results[name + "_scan"]
+        print(f"  {label:20} R*Tree p50/p99 {_pct(idx, 50):8.2f}/{_pct(idx, 99):8.2f} ms | "
+              f"varredura p50/p99 {_pct(scan, 50):8.2f}/{_pct(scan, 99):8.2f} ms")
+
+if __name__ == "__main__":
+    main()
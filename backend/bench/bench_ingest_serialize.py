@@ -0,0 +1,73 @@
+"""Micro-benchmark: amostras/s por núcleo na preparação da ingestão (sem banco).
+
+Compara o caminho antigo (model_dump_json + json.loads + json.dumps repetidos
+para bruto, car, centric e doc) com `build_rows` (um model_dump por amostra,
+uma codificação por coluna JSON, raw_json verbatim). Inclui a validação do
+payload a partir dos bytes recebidos, como no MQTT.
+
+Uso (a partir de backend/):
+    python -m bench.bench_ingest_serialize [--n 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+from app.crud.telemetry import build_rows, _iso_fields, _clamp
+from app.core.config import settings
+from app.schemas.telemetry import TelemetryIn
+from bench.bench_read_p99 import SAMPLE
+
+def _legacy_rows(body: bytes, ts_ms: int):
+    """Cópia do caminho anterior, mantida só como referência de comparação."""
+    payload = TelemetryIn.model_validate(json.loads(body.decode("utf-8")))
+    raw_dict = json.loads(payload.model_dump_json())
+    raw_json = json.dumps(raw_dict, separators=(",", ":"))
+    data = {
+        "ts": ts_ms, "ts_iso": "", "ts_local": "", "src": payload.src,
+        "car": json.loads(payload.car.model_dump_json()),
+        "centric": json.loads(payload.centric.model_dump_json()),
+    }
+    controls = data["centric"]["controls"]
+    cd = int(controls.get("curve_direction", 0))
+    steering_deg = 0.0 if cd in (0, 180) else (float(cd) if cd < 180 else float(-(360 - cd)))
+    speed_cmd_byte = int(_clamp(controls.get("speed", 0), 0, 255) or 0)
+    pct = speed_cmd_byte / 255.0
+    controls["derived"] = {
+        "steering_deg": steering_deg,
+        "steering_side": "right" if steering_deg > 0 else ("left" if steering_deg < 0 else "straight"),
+        "speed_cmd_byte": speed_cmd_byte,
+        "speed_cmd_pct": round(pct, 6),
+        "speed_cmd_mps": round(pct * settings.VMAX_MPS, 6),
+        "movement_direction_text": "front" if controls.get("movement_direction", 1) == 1 else "back",
+    }
+    data["ts_iso"], data["ts_local"] = _iso_fields(ts_ms)
+    return raw_json, json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+def _new_rows(body: bytes, ts_ms: int):
+    payload = TelemetryIn.model_validate_json(body)
+    return build_rows(payload, ts_ms, body)
+
+def _rate(fn, bodies, ts0) -> float:
+    t0 = time.perf_counter()
+    for i, body in enumerate(bodies):
+        fn(body, ts0 + i)
+    return len(bodies) / (time.perf_counter() - t0)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args()
+
+    bodies = [json.dumps(SAMPLE).encode()] * args.n
+    ts0 = 1_757_588_324_210
+    _rate(_legacy_rows, bodies[:500], ts0)
+    _rate(_new_rows, bodies[:500], ts0)
+    before = _rate(_legacy_rows, bodies, ts0)
+    after = _rate(_new_rows, bodies, ts0)
+    print(f"antes : {before:10.0f} amostras/s/núcleo")
+    print(f"depois: {after:10.0f} amostras/s/núcleo  ({after / before:.2f}x)")
+
+if __name__ == "__main__":
+    main()
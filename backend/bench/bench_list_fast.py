@@ -0,0 +1,58 @@
+"""Benchmark: /list, /latest e /raw/list no caminho padrão vs `fast=true`.
+
+Também confere que os dois caminhos devolvem o mesmo conteúdo (JSON
+semanticamente idêntico) antes de medir. Usa um SQLite temporário.
+
+Uso (a partir de backend/):
+    python -m bench.bench_list_fast [--rows 1000] [--repeat 50]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["SQLITE_PATH"] = os.path.join(tmp.name, "bench.db")
+    os.environ["MQTT_URL"] = ""
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from bench.bench_read_p99 import SAMPLE
+
+    with TestClient(app) as client:
+        r = client.post("/api/v1/telemetry/ingest/bulk", json=[SAMPLE] * args.rows)
+        r.raise_for_status()
+
+        cases = [
+            ("/api/v1/telemetry/list", {"limit": min(args.rows, 1000)}),
+            ("/api/v1/telemetry/latest", {}),
+            ("/api/v1/telemetry/raw/list", {"limit": min(args.rows, 1000)}),
+        ]
+        for path, params in cases:
+            slow = client.get(path, params=params)
+            fast = client.get(path, params={**params, "fast": "true"})
+            assert slow.status_code == fast.status_code == 200, (slow.status_code, fast.status_code)
+            assert json.loads(slow.content) == json.loads(fast.content), f"conteúdo diverge em {path}"
+
+            timings = {}
+            for mode, extra in (("padrão", {}), ("fast", {"fast": "true"})):
+                t0 = time.perf_counter()
+                for _ in range(args.repeat):
+                    client.get(path, params={**params, **extra})
+                timings[mode] = (time.perf_counter() - t0) / args.repeat * 1000.0
+            print(
+                f"{path:28s} padrão={timings['padrão']:8.2f} ms  fast={timings['fast']:8.2f} ms  "
+                f"speedup={timings['padrão'] / timings['fast']:.1f}x  (conteúdo idêntico)"
+            )
+
+if __name__ == "__main__":
+    main()
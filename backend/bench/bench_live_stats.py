@@ -0,0 +1,102 @@
+"""Benchmark: estatísticas móveis em memória (`live_stats`) × recalcular pelo banco.
+
+Gera `--sources` origens a 5 Hz durante `--seconds` segundos (IMU e tração
+variando), alimenta o `LiveStats` em lotes como o escritor da ingestão e mede:
+
+- custo da atualização por amostra e memória por origem (fixa);
+- custo de um `snapshot` (todas as janelas) de uma origem;
+- o resultado da maior janela recalculado a partir do banco (`list_range_docs` +
+  `json.loads` de cada documento), como uma rota sem o motor faria.
+
+Uso (a partir de backend/):
+    python -m bench.bench_live_stats [--sources 20] [--seconds 300]
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+def _docs(sources: int, seconds: int, t0: int):
+    from app.crud.telemetry import build_rows
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_read_p99 import SAMPLE
+
+    rnd = random.Random(7)
+    raw = copy.deepcopy(SAMPLE)
+    imu, drive = raw["car"]["imu"], raw["car"]["drive"]
+    out = []
+    for i in range(seconds * 5):
+        for s in range(sources):
+            raw["src"] = f"bench-{s}"
+            for k in ("accelerationX", "accelerationY", "accelerationZ", "spinX", "spinY", "spinZ"):
+                imu[k] = max(-128, min(127, int(rnd.gauss(0, 40))))
+            drive["speed_est_mps"] = round(rnd.uniform(0, 4), 3)
+            drive["pwm"] = rnd.randint(0, 255)
+            out.append(build_rows(TelemetryIn.model_validate(raw), t0 + i * 200 + s))
+    return out
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sources", type=int, default=20)
+    ap.add_argument("--seconds", type=int, default=300)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_live_stats_")
+    os.environ["SQLITE_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(tmp, "segments")
+    os.environ.setdefault("MQTT_URL", "")
+
+    from app.core.config import settings
+    from app.core.db import engine, init_db, ReadSessionLocal
+    from app.core.live_stats import LiveStats, parse_windows, sample_values, SIGNALS
+    from app.crud.telemetry import insert_rows, list_range_docs
+
+    init_db()
+    t0 = int(time.time() * 1000) - args.seconds * 1000
+    rows = _docs(args.sources, args.seconds, t0)
+    n = len(rows)
+    for i in range(0, n, 5000):
+        chunk = rows[i:i + 5000]
+        with engine.begin() as conn:
+            insert_rows(conn, [r[0] for r in chunk], [r[1] for r in chunk])
+
+    ls = LiveStats(parse_windows(settings.LIVE_STATS_WINDOWS_MS), settings.LIVE_STATS_BUCKETS)
+    procs = [r[2] for r in rows]
+    t = time.perf_counter()
+    for i in range(0, n, 256):  # lotes do escritor (INGEST_BATCH_MAX)
+        ls.update(procs[i:i + 256])
+    upd_us = (time.perf_counter() - t) / n * 1e6
+    cells = len(ls.windows_ms) * ls.buckets * len(SIGNALS)
+    print(f"{n} amostras ({args.sources} origens × {args.seconds} s a 5 Hz); janelas {list(ls.windows_ms)} ms, "
+          f"{ls.buckets} baldes")
+    print(f"  atualização: {upd_us:6.1f} µs/amostra | memória por origem: {cells * 5 * 8 + cells // len(SIGNALS) * 8} bytes (fixa)")
+
+    now = procs[-1]["ts"]
+    t = time.perf_counter()
+    reps = 200
+    for _ in range(reps):
+        snap = ls.snapshot("bench-0", now)
+    print(f"  snapshot (todas as janelas, 1 origem): {(time.perf_counter() - t) / reps * 1000:6.3f} ms")
+
+    # recalculando a maior janela pelo banco (mesmo início, alinhado aos baldes)
+    win, width = max(ls.windows_ms), ls.widths[-1]
+    lo = (now // width - ls.buckets + 1) * width
+    t = time.perf_counter()
+    with ReadSessionLocal() as db:
+        docs = [json.loads(d) for d in list_range_docs(db, limit=n, start_ts=lo, end_ts=now, order_by="ts")]
+    vals = [sample_values(d) for d in docs if d.get("src") == "bench-0"]
+    xs = [v[0] for v in vals if v[0] is not None]
+    rms = math.sqrt(sum(x * x for x in xs) / len(xs))
+    db_ms = (time.perf_counter() - t) * 1000
+    got = snap["windows"][str(win)]["accelerationX"]
+    print(f"  recalculado pelo banco ({win} ms, 1 origem): {db_ms:8.1f} ms | "
+          f"RMS accelerationX banco {rms:.3f} × motor {got['rms']:.3f} (n {len(xs)} × {got['n']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark/conferência: `/telemetry/quantiles` (sketches por janela) × cálculo exato.
+
+Grava `--hours` horas de `--sources` origens do `make_payload` de
+`simulator/sim.py` (a `SIM_INTERVAL_MS`) num SQLite temporário, sela a metade
+mais velha em segmentos e, para intervalos aleatórios (não alinhados às
+janelas) de até `--max-hours`, compara p50/p95/p99 de cada campo com o valor
+exato (todas as amostras do intervalo ordenadas, posto `q·(n-1)`):
+
+- maior erro relativo observado × `SKETCH_REL_ACCURACY`;
+- tempo da consulta pelos sketches × leitura + ordenação exata;
+- custo dos sketches na ingestão (parte do `insert_rows`) e bytes em disco.
+
+Uso (a partir de backend/):
+    python -m bench.bench_quantiles [--hours 6] [--sources 4] [--queries 30]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=float, default=6)
+    ap.add_argument("--sources", type=int, default=4)
+    ap.add_argument("--queries", type=int, default=30)
+    ap.add_argument("--max-hours", type=float, default=5)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_quantiles_")
+    os.environ["SQLITE_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(tmp, "segments")
+    os.environ.setdefault("MQTT_URL", "")
+
+    from sqlalchemy import text
+    from app.core.config import settings
+    from app.core.db import engine, init_db, ReadSessionLocal
+    from app.crud import telemetry as crud_telemetry
+    from app.crud.telemetry import build_rows, insert_rows
+    from app.crud.telemetry_archive import archive_store, seal_archive
+    from app.crud.telemetry_sketch import _exact_values, quantiles
+    from app.models.telemetry import SKETCH_FIELDS
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_compression import load_make_payload
+
+    # mede só a parte dos sketches dentro de `insert_rows`
+    sketch_s = [0.0]
+    apply = crud_telemetry.apply_sketches
+
+    def timed(conn, rows):
+        t = time.perf_counter()
+        apply(conn, rows)
+        sketch_s[0] += time.perf_counter() - t
+    crud_telemetry.apply_sketches = timed
+
+    init_db()
+    interval_ms = int(os.getenv("SIM_INTERVAL_MS", "200"))
+    per_src = int(args.hours * 3600 * 1000 / interval_ms)
+    makers = [load_make_payload(f"sim-{s}") for s in range(args.sources)]
+    now = int(time.time() * 1000)
+    t0 = now - per_src * interval_ms - 1000
+    insert_s = 0.0
+    raw_rows, tel_rows = [], []
+    for i in range(per_src):
+        for s, make in enumerate(makers):
+            r, tr, _ = build_rows(TelemetryIn.model_validate(make(i * interval_ms / 1000.0)), t0 + i * interval_ms + s)
+            raw_rows.append(r)
+            tel_rows.append(tr)
+        if len(tel_rows) >= 256 or i == per_src - 1:  # lotes do escritor (INGEST_BATCH_MAX)
+            t = time.perf_counter()
+            with engine.begin() as conn:
+                insert_rows(conn, raw_rows, tel_rows)
+            insert_s += time.perf_counter() - t
+            raw_rows, tel_rows = [], []
+    crud_telemetry.apply_sketches = apply
+    n = per_src * args.sources
+    seal_archive(engine, now_ms=now, older_than_ms=now - (t0 + per_src * interval_ms // 2), store=archive_store)
+    with engine.connect() as conn:
+        sk_rows = conn.execute(text("SELECT count(*) FROM telemetry_sketch")).scalar()
+        sk_bytes = conn.execute(text(
+            "SELECT sum(" + " + ".join(f"coalesce(length({f}), 0)" for f in SKETCH_FIELDS) + ") FROM telemetry_sketch"
+        )).scalar()
+    print(f"{n} amostras ({args.sources} origens × {args.hours:g} h), {archive_store.stats()['rows']} seladas; "
+          f"α = {settings.SKETCH_REL_ACCURACY}")
+    print(f"  ingestão: insert_rows {insert_s / n * 1e6:6.1f} µs/amostra, dos quais sketches {sketch_s[0] / n * 1e6:6.1f} µs | "
+          f"{sk_rows} linhas de sketch, {sk_bytes / 1e3:.0f} kB")
+
+    rnd = random.Random(11)
+    qs = [0.5, 0.95, 0.99]
+    worst = 0.0
+    t_sk = t_ex = 0.0
+    span = per_src * interval_ms
+    with ReadSessionLocal() as db:
+        for k in range(args.queries):
+            field = SKETCH_FIELDS[k % len(SKETCH_FIELDS)]
+            src = None if k % 3 == 0 else f"sim-{rnd.randrange(args.sources)}"
+            length = rnd.randint(60_000, int(min(args.max_hours * 3600 * 1000, span)))
+            lo = t0 + rnd.randint(0, span - length)
+            hi = lo + length
+
+            t = time.perf_counter()
+            got = quantiles(db, field, qs, lo, hi, src=src)
+            t_sk += time.perf_counter() - t
+
+            t = time.perf_counter()
+            vals = sorted(_exact_values(db, field, lo, hi, src))
+            exact = [vals[int(q * (len(vals) - 1))] for q in qs]
+            t_ex += time.perf_counter() - t
+
+            assert got["n"] == len(vals), (field, src, got["n"], len(vals))
+            for a, e in zip(got["values"], exact):
+                err = abs(a - e) / abs(e) if e else abs(a)
+                worst = max(worst, err)
+                if err > settings.SKETCH_REL_ACCURACY + 1e-9:
+                    print(f"  ERRO acima do limite: {field} src={src} [{lo}, {hi}] exato {e} sketch {a}")
+            if k < 4:
+                print(f"  {field:14} src={src or '*':6} {length / 3.6e6:5.2f} h: n {len(vals):7} | "
+                      f"sketch {json.dumps([round(v, 3) for v in got['values']])} exato {json.dumps(exact)} | "
+                      f"{got['sketches']} sketches + {got['exact_rows']} linhas")
+    print(f"  {args.queries} consultas: erro relativo máx {worst:.4%} (limite {settings.SKETCH_REL_ACCURACY:.2%}) | "
+          f"sketch {t_sk / args.queries * 1000:7.1f} ms/consulta × exato {t_ex / args.queries * 1000:8.1f} ms/consulta")
+
+if __name__ == "__main__":
+    main()
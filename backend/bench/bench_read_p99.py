@@ -0,0 +1,124 @@
+"""Benchmark: latência de leitura (/list) com ingestão rodando a toda velocidade.
+
+Compara o perfil de produção (WAL + escritor serializado + leitores somente
+leitura) com o journal clássico (rollback/DELETE). Cada perfil roda num
+subprocesso com um SQLite temporário.
+
+Uso (a partir de backend/):
+    python -m bench.bench_read_p99 [--seconds 10] [--readers 4]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    "wal": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+    "rollback": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+}
+
+SAMPLE = {
+    "car": {
+        "gps": {"latitude": -23.5586, "longitude": -46.6492},
+        "imu": {"accelerationX": 10, "accelerationY": -3, "accelerationZ": 60,
+                "spinX": 1, "spinY": 2, "spinZ": -5, "scale_dps": 500},
+        "drive": {"pwm": 120, "speed_est_mps": 3.33},
+    },
+    "centric": {"controls": {"curve_direction": 49, "speed": 120, "movement_direction": 1}},
+    "src": "bench",
+}
+
+def _pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+def run_profile(seconds: float, readers: int) -> dict:
+    from app.core.db import init_db, ReadSessionLocal
+    from app.core.ingest import IngestWriter
+    from app.core.db import engine
+    from app.crud.telemetry import list_range
+    from app.schemas.telemetry import TelemetryIn
+
+    init_db()
+    payload = TelemetryIn.model_validate(SAMPLE)
+    writer = IngestWriter(engine, batch_max=256, flush_ms=20, queue_max=4096)
+    writer.start()
+
+    stop = threading.Event()
+    lat_ms: list[float] = []
+    errors = {"read": 0}
+    lock = threading.Lock()
+
+    def produce():
+        while not stop.is_set():
+            writer.submit(payload)
+
+    def read():
+        local: list[float] = []
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            db = ReadSessionLocal()
+            try:
+                list_range(db, limit=100)
+            except Exception:
+                with lock:
+                    errors["read"] += 1
+            finally:
+                db.close()
+            local.append((time.perf_counter() - t0) * 1000.0)
+        with lock:
+            lat_ms.extend(local)
+
+    threads = [threading.Thread(target=produce) for _ in range(2)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    for th in threads:
+        th.start()
+    time.sleep(seconds)
+    stop.set()
+    for th in threads:
+        th.join()
+    writer.stop()
+
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT count(*) FROM telemetry").scalar()
+    return {
+        "ingest_per_s": round(rows / seconds, 1),
+        "reads": len(lat_ms),
+        "read_errors": errors["read"],
+        "read_p50_ms": round(_pct(lat_ms, 50), 2),
+        "read_p99_ms": round(_pct(lat_ms, 99), 2),
+        "read_max_ms": round(max(lat_ms) if lat_ms else float("nan"), 2),
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--child", choices=list(PROFILES), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.seconds, args.readers)))
+        return
+
+    for name, env in PROFILES.items():
+        with tempfile.TemporaryDirectory() as d:
+            child_env = {**os.environ, **env, "SQLITE_PATH": os.path.join(d, "bench.db"), "MQTT_URL": ""}
+            out = subprocess.run(
+                [sys.executable, "-m", "bench.bench_read_p99", "--child", name,
+                 "--seconds", str(args.seconds), "--readers", str(args.readers)],
+                env=child_env, capture_output=True, text=True, check=True,
+            )
+            print(f"{name:9s}", out.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark: `rederive` (recalcular os derivados do histórico) com ingestão ao vivo.
+
+Grava `--rows` amostras (quatro origens a 5 Hz, controles variando) com
+`VMAX_MPS=12` num SQLite temporário, sela a metade mais velha em segmentos
+(janelas de 15 min) e roda a rederivação alternando `VMAX_MPS` entre 9 e 12
+(toda execução regrava tudo). Durante cada execução, um subprocesso ingere lotes de 10 amostras a cada
+20 ms pelo mesmo caminho da API (`insert_rows` + commit) e mede a latência de
+cada lote; a primeira linha é a ingestão sozinha.
+
+Uso (a partir de backend/):
+    python -m bench.bench_rederive [--rows 200000] [--workers 1,4] [--pauses 0,50]
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else float("nan")
+
+def _fill(n: int, t0: int) -> None:
+    from app.core.db import engine
+    from app.crud.telemetry import build_rows, insert_rows
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_read_p99 import SAMPLE
+
+    rnd = random.Random(5)
+    raw = copy.deepcopy(SAMPLE)
+    ctl = raw["centric"]["controls"]
+    raw_rows, tel_rows = [], []
+    for i in range(n):
+        raw["src"] = f"bench-{i % 4}"
+        ctl["curve_direction"] = rnd.randint(0, 360)
+        ctl["speed"] = rnd.randint(0, 255)
+        ctl["movement_direction"] = int(rnd.random() < 0.9)
+        raw["car"]["drive"]["speed_est_mps"] = round(rnd.uniform(0, 4), 3)
+        r, t, _ = build_rows(TelemetryIn.model_validate(raw), t0 + i * 50)
+        raw_rows.append(r)
+        tel_rows.append(t)
+        if len(tel_rows) >= 5000:
+            with engine.begin() as conn:
+                insert_rows(conn, raw_rows, tel_rows)
+            raw_rows, tel_rows = [], []
+    if tel_rows:
+        with engine.begin() as conn:
+            insert_rows(conn, raw_rows, tel_rows)
+
+def _ingest_child(stop_path: str) -> None:
+    """Subprocesso: ingere até `stop_path` existir e imprime as latências (ms) em JSON."""
+    from app.core.db import init_db, engine
+    from app.crud.telemetry import build_rows, insert_rows
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_read_p99 import SAMPLE
+
+    init_db()
+    payload = TelemetryIn.model_validate({**SAMPLE, "src": "live"})
+    lat = []
+    while not os.path.exists(stop_path):
+        rows = [build_rows(payload, int(time.time() * 1000)) for _ in range(10)]
+        t = time.perf_counter()
+        with engine.begin() as conn:
+            insert_rows(conn, [r[0] for r in rows], [r[1] for r in rows])
+        lat.append((time.perf_counter() - t) * 1000)
+        time.sleep(0.02)
+    print(json.dumps(lat))
+
+class _Ingest:
+    def __init__(self, tmp: str) -> None:
+        self.stop_path = os.path.join(tmp, "stop")
+        if os.path.exists(self.stop_path):
+            os.remove(self.stop_path)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "bench.bench_rederive", "--ingest-child", self.stop_path],
+            stdout=subprocess.PIPE, env=os.environ.copy(),
+        )
+        time.sleep(2.0)  # importações do subprocesso
+
+    def stop(self):
+        open(self.stop_path, "w").close()
+        out, _ = self.proc.communicate()
+        return json.loads(out)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    ap.add_argument("--pauses", default="0,50")
+    ap.add_argument("--ingest-child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.ingest_child:
+        _ingest_child(args.ingest_child)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="bench_rederive_")
+    os.environ["SQLITE_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(tmp, "segments")
+    os.environ["VMAX_MPS"] = "12"
+    os.environ.setdefault("ARCHIVE_WINDOW_MS", str(15 * 60 * 1000))  # a metade velha fecha janelas inteiras
+    os.environ.setdefault("MQTT_URL", "")
+
+    from app.core.config import settings
+    from app.core.db import engine, init_db
+    from app.crud.telemetry_archive import archive_store, seal_archive
+    from app.crud.telemetry_rederive import rederive
+
+    init_db()
+    now = int(time.time() * 1000)
+    t0 = now - 3600 * 1000 - args.rows * 50  # histórico termina 1 h antes da ingestão ao vivo
+    _fill(args.rows, t0)
+    seal_archive(engine, now_ms=now, older_than_ms=now - (t0 + args.rows * 25), store=archive_store)
+    print(f"{args.rows} amostras, {archive_store.stats()['rows']} seladas em segmentos; CPUs: {os.cpu_count()}")
+
+    ing = _Ingest(tmp)
+    time.sleep(5)
+    lat = ing.stop()
+    print(f"  só ingestão:               lote de 10 p50/p99/máx {_pct(lat, 50):6.1f}/{_pct(lat, 99):6.1f}/{max(lat):7.1f} ms")
+
+    vmax = 12
+    for workers in sorted({int(w) for w in args.workers.split(",")}):
+        for pause in (int(p) for p in args.pauses.split(",")):
+            vmax = 9 if vmax == 12 else 12
+            os.environ["VMAX_MPS"] = str(vmax)  # o pool (spawn) lê do ambiente
+            settings.VMAX_MPS = float(vmax)
+            settings.REDERIVE_PAUSE_MS = pause
+            ing = _Ingest(tmp)
+            t = time.perf_counter()
+            out = rederive(engine, workers=workers, restart=True)
+            spent = time.perf_counter() - t
+            lat = ing.stop()
+            print(f"  workers {workers} pausa {pause:3} ms: {spent:6.1f} s ({out['rows'] / spent:7.0f} linhas/s, "
+                  f"{out['rows_updated']} regravadas, {out['segments_rewritten']} segmentos) | "
+                  f"ingestão p50/p99/máx {_pct(lat, 50):6.1f}/{_pct(lat, 99):6.1f}/{max(lat):7.1f} ms")
+
+if __name__ == "__main__":
+    main()
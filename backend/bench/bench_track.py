@@ -0,0 +1,122 @@
+"""Benchmark: `/telemetry/track` (trajeto simplificado) × documentos completos.
+
+Grava `--hours` horas de uma origem a 5 Hz (trajeto de ~3 m/s com curvas e
+ruído de GPS) num SQLite temporário, sela a primeira metade em segmentos e mede,
+para algumas tolerâncias:
+
+- pontos devolvidos e bytes da resposta × os `TelemetryOut` do intervalo;
+- tempo da chamada sem cache (primeira) e com o cache de janelas;
+- o desvio máximo de cada amostra original em relação ao traço simplificado.
+
+Uso (a partir de backend/):
+    python -m bench.bench_track [--hours 24] [--tolerances 1,2,5,10]
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+def _points(n: int, t0: int):
+    rnd = random.Random(3)
+    m_per_deg = math.pi * 6_371_008.8 / 180.0
+    lat, lon, heading = -23.5586, -46.6492, 0.0
+    for i in range(n):
+        if i % 500 == 0:
+            heading += rnd.uniform(-1.5, 1.5)
+        heading += rnd.gauss(0, 0.01)
+        lat += 0.6 * math.cos(heading) / m_per_deg
+        lon += 0.6 * math.sin(heading) / (m_per_deg * math.cos(math.radians(lat)))
+        yield t0 + i * 200, lat + rnd.gauss(0, 3e-6), lon + rnd.gauss(0, 3e-6)
+
+def _fill(n: int, t0: int) -> None:
+    from app.core.db import engine
+    from app.crud.telemetry import build_rows, insert_rows
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_read_p99 import SAMPLE
+
+    raw = copy.deepcopy(SAMPLE)
+    raw["src"] = "bench-track"
+    raw_rows, tel_rows = [], []
+    for ts, lat, lon in _points(n, t0):
+        raw["car"]["gps"] = {"latitude": lat, "longitude": lon}
+        r, t, _ = build_rows(TelemetryIn.model_validate(raw), ts)
+        raw_rows.append(r)
+        tel_rows.append(t)
+        if len(tel_rows) >= 5000:
+            with engine.begin() as conn:
+                insert_rows(conn, raw_rows, tel_rows)
+            raw_rows, tel_rows = [], []
+    if tel_rows:
+        with engine.begin() as conn:
+            insert_rows(conn, raw_rows, tel_rows)
+
+def _max_dev(original, simplified) -> float:
+    """Maior distância (m) de uma amostra ao trecho simplificado que a cobre."""
+    from app.crud.telemetry_track import _M_PER_DEG
+
+    lat0 = original[0][1]
+    kx = _M_PER_DEG * math.cos(math.radians(lat0))
+    xy = lambda p: ((p[2] - original[0][2]) * kx, (p[1] - lat0) * _M_PER_DEG)
+    worst, j = 0.0, 0
+    for p in original:
+        while j + 1 < len(simplified) - 1 and simplified[j + 1][0] <= p[0]:
+            j += 1
+        (ax, ay), (bx, by), (px, py) = xy(simplified[j]), xy(simplified[min(j + 1, len(simplified) - 1)]), xy(p)
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        t = 0.0 if seg2 == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg2))
+        worst = max(worst, math.hypot(px - ax - t * dx, py - ay - t * dy))
+    return worst
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=float, default=24)
+    ap.add_argument("--tolerances", default="1,2,5,10")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_track_")
+    os.environ["SQLITE_PATH"] = os.path.join(tmp, "bench.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(tmp, "segments")
+    os.environ.setdefault("MQTT_URL", "")
+
+    from app.core.db import engine, init_db, ReadSessionLocal
+    from app.crud.telemetry_archive import archive_store, seal_archive
+    from app.crud.telemetry_track import track, track_cache
+
+    init_db()
+    n = int(args.hours * 3600 * 5)
+    now = int(time.time() * 1000)
+    t0 = now - n * 200 - 1000
+    _fill(n, t0)
+    seal_archive(engine, now_ms=now, older_than_ms=now - (t0 + n * 100), store=archive_store)
+    st = archive_store.stats()
+    print(f"{n} amostras ({args.hours:g} h a 5 Hz), {st['rows']} seladas em {st['segments']} segmentos")
+
+    from app.crud.telemetry import list_range_docs
+    with ReadSessionLocal() as db:
+        docs = list_range_docs(db, limit=n, start_ts=t0, end_ts=now, order_by="ts")
+    full_b = len(("[" + ",".join(docs) + "]").encode())
+    original = sorted((d["ts"], d["car"]["gps"]["latitude"], d["car"]["gps"]["longitude"]) for d in map(json.loads, docs))
+    print(f"documentos completos: {full_b / 1e6:.1f} MB")
+
+    for tol in (float(x) for x in args.tolerances.split(",")):
+        track_cache._data.clear()
+        with ReadSessionLocal() as db:
+            t = time.perf_counter()
+            pts = track(db, "bench-track", t0, now, tol)
+            cold_ms = (time.perf_counter() - t) * 1000
+            t = time.perf_counter()
+            track(db, "bench-track", t0, now, tol)
+            warm_ms = (time.perf_counter() - t) * 1000
+        body = len(json.dumps({"points": pts}, separators=(",", ":")).encode())
+        print(f"  tol {tol:5.1f} m: {len(pts):6} pontos ({len(pts) / n:6.2%}), {body / 1e3:8.1f} kB | "
+              f"sem cache {cold_ms:7.1f} ms | com cache {warm_ms:6.1f} ms | desvio máx {_max_dev(original, pts):5.2f} m")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark + conferência: viagens atualizadas na ingestão em blocos (`create_many`).
+
+Cada bloco passa por `create_many` numa `SessionLocal`, como `/ingest/bulk` e o
+fallback de `/ingest`; com várias `src`, cada uma recebe vários blocos seguidos,
+então a viagem aberta é relida e regravada (UPDATE) em quase todos. Há blocos
+parados no meio dos em movimento e, de tempos em tempos, uma pausa maior que
+`TRIP_STOP_MS` (reduzido aqui) que fecha as viagens abertas.
+
+No fim confere que a tabela `trips` mantida na ingestão é igual à refeita por
+`rebuild_trips` (o `trips-backfill`). Usa um SQLite temporário.
+
+Uso (a partir de backend/):
+    python -m bench.bench_trips [--batches 200] [--batch-size 50] [--srcs 4]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+def _items(src: str, n: int, moving: bool):
+    from bench.bench_read_p99 import SAMPLE
+
+    doc = json.loads(json.dumps(SAMPLE))
+    doc["src"] = src
+    doc["car"]["drive"]["speed_est_mps"] = 3.33 if moving else 0.0
+    text = json.dumps(doc)
+    return [(i, text) for i in range(n)]
+
+def _trips():
+    """Linhas de `trips` sem o `id` (o backfill renumera), ordenadas."""
+    from sqlalchemy import select
+
+    from app.core.db import engine
+    from app.models.telemetry import Trip
+
+    cols = [c for c in Trip.__table__.columns if c.name != "id"]
+    with engine.connect() as conn:
+        return sorted(tuple(r._mapping.items()) for r in conn.execute(select(*cols)).all())
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batches", type=int, default=200)
+    ap.add_argument("--batch-size", type=int, default=50)
+    ap.add_argument("--srcs", type=int, default=4)
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["SQLITE_PATH"] = os.path.join(tmp.name, "bench.db")
+    os.environ["MQTT_URL"] = ""
+    os.environ["TRIP_STOP_MS"] = "300"
+    os.environ["TRIP_IDLE_GAP_MS"] = "1000"
+
+    from app.core.db import SessionLocal, engine, init_db
+    from app.crud.telemetry import create_many
+    from app.crud.trips import rebuild_trips
+
+    init_db()
+    srcs = [f"car{i}" for i in range(args.srcs)]
+    t0 = time.perf_counter()
+    for b in range(args.batches):
+        moving = b % 10 != 9
+        if b % 50 == 49:
+            time.sleep(0.35)  # mais que TRIP_STOP_MS sem movimento: as viagens abertas fecham
+        with SessionLocal() as db:
+            accepted, rejected = create_many(db, _items(srcs[b % len(srcs)], args.batch_size, moving))
+        assert accepted == args.batch_size and not rejected, (accepted, rejected)
+    wall = time.perf_counter() - t0
+    n = args.batches * args.batch_size
+
+    live = _trips()
+    t0 = time.perf_counter()
+    out = rebuild_trips(engine)
+    rebuild_s = time.perf_counter() - t0
+    assert live == _trips(), "viagens da ingestão divergem do trips-backfill"
+    closed = sum(1 for t in live if dict(t)["closed"])
+    print(f"{args.batches} blocos de {args.batch_size} em {args.srcs} src: {n / wall:8.0f} amostras/s "
+          f"({wall / args.batches * 1000:.2f} ms/bloco)")
+    print(f"{len(live)} viagens ({closed} fechadas); trips-backfill: {out['trips']} viagens em {rebuild_s:.2f}s "
+          f"(idênticas às da ingestão)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark: custo de publicação no fan-out do WebSocket com muitos clientes.
+
+Simula N clientes (sockets falsos com latência de envio), alguns deles
+lentos, e publica documentos na taxa da ingestão. Mede quanto tempo cada
+`publish_many` segura o event loop (o que atrasaria a ingestão) e o atraso
+de entrega por cliente, comparando com o broadcast antigo (um `send_json`
+aguardado por cliente). Por fim, divide os clientes entre algumas assinaturas
+(projeção de campos/limite de taxa) e mede publicação e bytes enviados.
+
+Uso (a partir de backend/):
+    python -m bench.bench_ws_fanout [--clients 500] [--slow 10] [--msgs 200] [--hz 50]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+class FakeWS:
+    def __init__(self, delay_s: float) -> None:
+        self.delay_s = delay_s
+        self.received = 0
+        self.bytes = 0
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        await asyncio.sleep(self.delay_s)
+        self.received += 1
+        self.bytes += len(text)
+
+    async def send_json(self, data) -> None:
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else float("nan")
+
+async def run(args) -> None:
+    from app.core.fanout import FanOut
+    from bench.bench_read_p99 import SAMPLE
+
+    docs = [dict(SAMPLE, seq=i) for i in range(args.msgs)]
+    period = 1.0 / args.hz
+
+    def sockets():
+        return [FakeWS(0.5 if i < args.slow else 0.0005) for i in range(args.clients)]
+
+    # --- antigo: await send_json cliente a cliente ---------------------------
+    socks = sockets()
+    hold = []
+    for doc in docs[: max(1, args.msgs // 20)]:
+        t0 = time.perf_counter()
+        for ws in socks:
+            await ws.send_json(doc)
+        hold.append((time.perf_counter() - t0) * 1000.0)
+    print(f"[antigo] broadcast por mensagem: p50={_pct(hold, 50):.1f}ms p99={_pct(hold, 99):.1f}ms "
+          f"({len(hold)} mensagens; ingestão esperaria isso a cada commit)")
+
+    # --- fan-out: publish só enfileira ------------------------------------
+    for policy in ("drop_oldest", "coalesce", "disconnect"):
+        fan = FanOut(queue_max=64, policy=policy, send_timeout_s=2.0)
+        socks = sockets()
+        slow_ids = set()
+        for i, ws in enumerate(socks):
+            c = await fan.connect(ws)
+            if i < args.slow:
+                slow_ids.add(c.id)
+        hold = []
+        for doc in docs:
+            t0 = time.perf_counter()
+            fan.publish_many([doc])
+            hold.append((time.perf_counter() - t0) * 1000.0)
+            await asyncio.sleep(period)
+        await asyncio.sleep(0.2)
+        st = fan.stats()
+        fast = [c for c in st["per_client"] if c["id"] not in slow_ids] or st["per_client"]
+        lags = [c["max_lag_ms"] for c in fast]
+        print(f"[{policy}] publish: p50={_pct(hold, 50):.3f}ms p99={_pct(hold, 99):.3f}ms | "
+              f"clientes rápidos max_lag p99={_pct(lags, 99):.1f}ms | "
+              f"descartes={sum(c['dropped'] for c in st['per_client'])} "
+              f"coalescidos={sum(c['coalesced'] for c in st['per_client'])} "
+              f"desconectados={st['disconnected_slow']}")
+        for c in list(fan._clients.values()):
+            await fan.disconnect(c)
+
+    # --- assinaturas: clientes divididos em poucas assinaturas distintas -------
+    subs = [
+        None,
+        {"type": "subscribe", "fields": ["car.gps"], "max_hz": 1},
+        {"type": "subscribe", "fields": ["centric.controls.derived"]},
+    ]
+    fan = FanOut(queue_max=64, policy="drop_oldest", send_timeout_s=2.0)
+    socks = [FakeWS(0.0005) for _ in range(args.clients)]
+    for i, ws in enumerate(socks):
+        c = await fan.connect(ws)
+        if subs[i % len(subs)] is not None:
+            fan.handle_message(c, json.dumps(subs[i % len(subs)]))
+    hold = []
+    for doc in docs:
+        t0 = time.perf_counter()
+        fan.publish_many([doc])
+        hold.append((time.perf_counter() - t0) * 1000.0)
+        await asyncio.sleep(period)
+    await asyncio.sleep(1.1)
+    st = fan.stats()
+    groups = ", ".join(f"{g['fields'] or 'tudo'}@{g['interval_ms']}ms: {g['frames']} frames" for g in st["subscriptions"])
+    print(f"[assinaturas] publish: p50={_pct(hold, 50):.3f}ms p99={_pct(hold, 99):.3f}ms | "
+          f"bytes enviados={sum(ws.bytes for ws in socks)} | {groups}")
+    for c in list(fan._clients.values()):
+        await fan.disconnect(c)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--slow", type=int, default=10, help="clientes com 500 ms por envio")
+    ap.add_argument("--msgs", type=int, default=200)
+    ap.add_argument("--hz", type=float, default=50.0)
+    args = ap.parse_args()
+    os.environ.setdefault("MQTT_URL", "")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark: tamanho e custo de codificação dos frames do `/ws` por formato.
+
+Gera uma sequência de documentos processados (via `build_rows`) parecida com a de
+um carro andando — GPS e IMU variando a cada amostra, controles mudando de vez
+em quando — e compara `json` (o `doc_json` de hoje), `bin` e `delta`:
+bytes por frame e µs de codificação por frame.
+
+Uso (a partir de backend/):
+    python -m bench.bench_ws_frames [--frames 20000] [--keyframe-every 50]
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import random
+import time
+
+def make_docs(n: int):
+    from app.crud.telemetry import build_rows
+    from app.schemas.telemetry import TelemetryIn
+    from bench.bench_read_p99 import SAMPLE
+
+    rnd = random.Random(42)
+    raw = copy.deepcopy(SAMPLE)
+    docs = []
+    ts = 1_700_000_000_000
+    for i in range(n):
+        car, ctl = raw["car"], raw["centric"]["controls"]
+        car["gps"]["latitude"] += rnd.uniform(-1e-5, 1e-5)
+        car["gps"]["longitude"] += rnd.uniform(-1e-5, 1e-5)
+        for k in ("accelerationX", "accelerationY", "accelerationZ", "spinX", "spinY", "spinZ"):
+            car["imu"][k] = max(-128, min(127, car["imu"][k] + rnd.randint(-2, 2)))
+        car["drive"]["speed_est_mps"] = round(car["drive"]["speed_est_mps"] + rnd.uniform(-0.05, 0.05), 3)
+        if i % 10 == 0:
+            ctl["curve_direction"] = rnd.choice((0, 30, 49, 90, 300, 330))
+            ctl["speed"] = car["drive"]["pwm"] = rnd.randint(80, 160)
+        ts += 200
+        docs.append(build_rows(TelemetryIn.model_validate(raw), ts)[2])
+    return docs
+
+def run(args) -> None:
+    from app.core import wsframe
+
+    docs = make_docs(args.frames)
+    results = {}
+
+    t0 = time.perf_counter()
+    size = sum(len(json.dumps(d, ensure_ascii=False, separators=(",", ":")).encode("utf-8")) for d in docs)
+    results["json"] = (size, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    size = sum(len(wsframe.encode_key(d["ts"], d["src"], wsframe.extract(d))) for d in docs)
+    results["bin"] = (size, time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    size, prev, since = 0, None, 0
+    for d in docs:
+        vals = wsframe.extract(d)
+        frame = wsframe.encode_delta(d["ts"], d["src"], vals, prev) if prev is not None and since < args.keyframe_every else None
+        if frame is None:
+            frame, since = wsframe.encode_key(d["ts"], d["src"], vals), 0
+        since += 1
+        prev = vals
+        size += len(frame)
+    results["delta"] = (size, time.perf_counter() - t0)
+
+    base = results["json"][0]
+    for fmt, (size, secs) in results.items():
+        print(f"[{fmt:5}] {size / len(docs):7.1f} B/frame ({size / base * 100:5.1f}% do json) | "
+              f"{secs / len(docs) * 1e6:6.2f} µs/frame")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=20000)
+    ap.add_argument("--keyframe-every", type=int, default=50)
+    args = ap.parse_args()
+    os.environ.setdefault("MQTT_URL", "")
+    run(args)
+
+if __name__ == "__main__":
+    main()
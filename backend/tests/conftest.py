@@ -0,0 +1,65 @@
+"""Ambiente dos testes: SQLite, segmentos e partições num diretório temporário.
+
+As variáveis são definidas antes de importar `app` (o `settings` é lido na
+importação). MQTT e a manutenção periódica ficam desligados; os testes selam
+a camada fria explicitamente com `seal_all`.
+"""
+import json
+import os
+import tempfile
+import time
+
+_TMP = tempfile.mkdtemp(prefix="telemetry-tests-")
+os.environ.update({
+    "SQLITE_PATH": os.path.join(_TMP, "test.db"),
+    "ARCHIVE_DIR": os.path.join(_TMP, "segments"),
+    "PARTITION_DIR": os.path.join(_TMP, "partitions"),
+    "MQTT_URL": "",
+    "ARCHIVE_INTERVAL_S": "0",
+})
+
+import pytest  # noqa: E402
+
+SAMPLE = {
+    "car": {
+        "gps": {"latitude": -23.5586, "longitude": -46.6492},
+        "imu": {"accelerationX": 10, "accelerationY": -3, "accelerationZ": 60,
+                "spinX": 1, "spinY": 2, "spinZ": -5, "scale_dps": 500},
+        "drive": {"pwm": 120, "speed_est_mps": 3.33},
+    },
+    "centric": {"controls": {"curve_direction": 49, "speed": 120, "movement_direction": 1}},
+    "src": "car0",
+}
+
+def sample(i: int, src: str) -> dict:
+    """Amostra válida que varia com `i` (campos numéricos e controles)."""
+    doc = json.loads(json.dumps(SAMPLE))
+    doc["src"] = src
+    doc["car"]["gps"]["latitude"] += i * 1e-5
+    doc["car"]["imu"]["accelerationX"] = (i * 7) % 120 - 60
+    doc["car"]["drive"]["speed_est_mps"] = round((i % 13) * 0.5, 2)
+    doc["centric"]["controls"]["curve_direction"] = (i * 11) % 360
+    doc["centric"]["controls"]["movement_direction"] = i % 2
+    return doc
+
+def seal_all() -> dict:
+    """Sela tudo o que está em `telemetry` (inclusive a janela corrente)."""
+    from app.core.db import engine
+    from app.crud.telemetry_archive import archive_store, seal_archive
+
+    return seal_archive(engine, older_than_ms=0, now_ms=int(time.time() * 1000) + 2 * archive_store.window_ms)
+
+@pytest.fixture(scope="session")
+def db_ready():
+    """Tabelas criadas (testes que usam o banco sem subir a API)."""
+    from app.core.db import init_db
+
+    init_db()
+
+@pytest.fixture(scope="session")
+def client(db_ready):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
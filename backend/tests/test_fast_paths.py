@@ -0,0 +1,92 @@
+"""`fast=true` devolve o mesmo conteúdo do caminho padrão (user-005).
+
+O corpo do caminho rápido é o `doc_json` emendado; o padrão passa por
+`json.loads` + `response_model`. Os dois são comparados após o parse, com a
+ordem das chaves preservada, em `/latest`, `/list` (offset e cursor) e
+`/raw/list`, num intervalo que cruza um segmento selado e linhas quentes. As
+linhas seladas também são comparadas com o que a API devolvia antes da selagem
+(documento remontado do segmento = documento gravado).
+"""
+import json
+
+import pytest
+
+from tests.conftest import sample, seal_all
+
+API = "/api/v1/telemetry"
+SRCS = ("car0", "car1", "car2")
+
+def _ordered(body: bytes):
+    return json.loads(body, object_pairs_hook=list)
+
+def _same(client, path, params):
+    slow = client.get(path, params=params)
+    fast = client.get(path, params={**params, "fast": "true"})
+    assert slow.status_code == fast.status_code == 200, (slow.text, fast.text)
+    assert fast.headers["content-type"] == "application/json"
+    assert _ordered(fast.content) == _ordered(slow.content)
+    return slow, fast
+
+@pytest.fixture(scope="module")
+def spans(client):
+    """60 amostras seladas seguidas de 60 quentes.
+
+    Devolve `(ts da 1ª fria, ts da última quente, corpo de /list das frias antes da selagem)`.
+    """
+    def ingest(offset):
+        items = [sample(offset + i, SRCS[i % len(SRCS)]) for i in range(60)]
+        r = client.post(f"{API}/ingest/bulk", json=items)
+        r.raise_for_status()
+        assert r.json()["accepted"] == 60
+
+    ingest(0)
+    before = client.get(f"{API}/list", params={"limit": 1000, "fast": "true"}).content
+    assert seal_all()["rows"] >= 60
+    ingest(60)
+    docs = client.get(f"{API}/list", params={"limit": 1000}).json()
+    return docs[-1]["ts"], docs[0]["ts"], before
+
+def test_sealed_rows_unchanged(client, spans):
+    first, _, before = spans
+    cold_last = _ordered(before)[0]
+    end = dict(cold_last)["ts"]
+    after = client.get(f"{API}/list", params={"limit": 1000, "start_ts": first, "end_ts": end, "fast": "true"})
+    assert after.content == before
+
+def test_latest(client, spans):
+    slow, _ = _same(client, f"{API}/latest", {})
+    assert slow.json() is not None
+    for src in SRCS:
+        slow, _ = _same(client, f"{API}/latest", {"src": src})
+        assert slow.json()["src"] == src
+    slow, fast = _same(client, f"{API}/latest", {"src": "nenhuma"})
+    assert fast.content == b"null"
+
+def test_list_offset_spans_sealed_segment(client, spans):
+    first, last, _ = spans
+    slow, _ = _same(client, f"{API}/list", {"limit": 1000, "start_ts": first, "end_ts": last})
+    assert len(slow.json()) >= 120
+    _same(client, f"{API}/list", {"limit": 50, "offset": 40, "start_ts": first, "end_ts": last})
+
+def test_list_cursor_pages(client, spans):
+    first, last, _ = spans
+    cursors = {"padrão": "", "fast": ""}
+    seen = []
+    while True:
+        params = {"limit": 17, "start_ts": first, "end_ts": last}
+        slow = client.get(f"{API}/list", params={**params, "cursor": cursors["padrão"]})
+        fast = client.get(f"{API}/list", params={**params, "cursor": cursors["fast"], "fast": "true"})
+        assert slow.status_code == fast.status_code == 200
+        assert _ordered(fast.content) == _ordered(slow.content)
+        assert slow.headers.get("X-Next-Cursor") == fast.headers.get("X-Next-Cursor")
+        seen += [(d["ts"], d["src"]) for d in slow.json()]
+        nxt = slow.headers.get("X-Next-Cursor")
+        if not nxt:
+            break
+        cursors = {"padrão": nxt, "fast": nxt}
+    assert len(seen) >= 120
+    assert seen == sorted(seen, key=lambda k: k[0], reverse=True)
+
+def test_raw_list(client, spans):
+    _same(client, f"{API}/raw/list", {"limit": 1000})
+    _same(client, f"{API}/raw/list", {"limit": 10, "cursor": ""})
@@ -0,0 +1,124 @@
+"""Sketches de quantis (user-024): erro relativo ≤ α e fusão de janelas = sketch único.
+
+A fusão é conferida no caminho que alimenta `/telemetry/quantiles`: lotes
+aplicados por `apply_sketches` em `telemetry_sketch` (1 min e 1 h) e somados
+por `quantiles` têm de dar exatamente o sketch de todas as amostras de uma vez.
+"""
+import random
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.crud.telemetry_sketch import SKETCH_RES_MS, Sketch, _counts, apply_sketches, quantiles
+from app.models.telemetry import SKETCH_FIELDS, TelemetrySketch
+
+ALPHA = settings.SKETCH_REL_ACCURACY
+QS = (0.0, 0.01, 0.25, 0.5, 0.75, 0.95, 0.99, 1.0)
+T0 = 1_577_836_800_000  # 2020-01-01 UTC, alinhado à hora: longe dos dados dos outros testes
+
+def _values(rnd: random.Random, n: int):
+    out = []
+    for _ in range(n):
+        r = rnd.random()
+        if r < 0.05:
+            out.append(0.0)
+        elif r < 0.35:
+            out.append(-rnd.lognormvariate(0, 2))
+        else:
+            out.append(rnd.lognormvariate(1, 3))
+    return out
+
+def _sketch(values) -> Sketch:
+    sk = Sketch()
+    sk.add_counts(_counts(values))
+    return sk
+
+def _state(sk: Sketch):
+    """Contadores por balde, sem depender do `offset`/tamanho dos arrays."""
+    def store(s):
+        return {s.off + i: c for i, c in enumerate(s.bins) if c}
+    return sk.zero, store(sk.pos), store(sk.neg)
+
+def _exact(values, q):
+    s = sorted(values)
+    return s[int(q * (len(s) - 1))]  # mesmo posto `q·(n-1)` do sketch
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_relative_error_bound(seed):
+    values = _values(random.Random(seed), 5000)
+    got = _sketch(values).quantiles(QS)
+    for q, v in zip(QS, got):
+        exact = _exact(values, q)
+        assert abs(v - exact) <= ALPHA * abs(exact) * (1 + 1e-9), (q, v, exact)
+
+def test_merge_equals_single_sketch():
+    rnd = random.Random(7)
+    values = _values(rnd, 4000)
+    cuts = sorted(rnd.sample(range(1, len(values)), 9))
+    parts = [values[a:b] for a, b in zip([0] + cuts, cuts + [len(values)])]
+    merged = Sketch()
+    for p in parts:
+        merged.merge(Sketch.decode(_sketch(p).encode()))  # como as janelas gravadas
+    single = _sketch(values)
+    assert _state(merged) == _state(single)
+    assert merged.count() == len(values)
+    assert merged.quantiles(QS) == single.quantiles(QS)
+
+def test_encode_roundtrip():
+    sk = _sketch(_values(random.Random(11), 1000))
+    assert _state(Sketch.decode(sk.encode())) == _state(sk)
+    assert _state(Sketch.decode(Sketch().encode())) == _state(Sketch())
+
+def _rows(rnd: random.Random, src: str, n: int, span_ms: int):
+    rows = []
+    for _ in range(n):
+        row = {"ts": T0 + rnd.randrange(span_ms), "src": src}
+        for f, v in zip(SKETCH_FIELDS, _values(rnd, len(SKETCH_FIELDS))):
+            row[f] = None if rnd.random() < 0.1 else v
+        rows.append(row)
+    return rows
+
+def test_bucket_merge_path_matches_single_sketch(db_ready):
+    from app.core.db import SessionLocal, engine
+
+    rnd = random.Random(5)
+    hour = SKETCH_RES_MS[-1]
+    rows = _rows(rnd, "sketch-a", 3000, 2 * hour) + _rows(rnd, "sketch-b", 1000, 2 * hour)
+    rnd.shuffle(rows)
+    # lotes de tamanhos variados e fora de ordem, como chegam da ingestão
+    i = 0
+    while i < len(rows):
+        n = rnd.randint(1, 200)
+        with engine.begin() as conn:
+            apply_sketches(conn, rows[i:i + n])
+        i += n
+
+    with SessionLocal() as db:
+        for f in SKETCH_FIELDS[:3]:
+            # janelas de 1 h e 1 min (com pontas exatas vazias: não há linhas em `telemetry`)
+            for lo, hi in ((T0, T0 + 2 * hour - 1), (T0 + 5 * 60_000, T0 + hour + 17 * 60_000 - 1)):
+                vals = [r[f] for r in rows if r["src"] == "sketch-a" and lo <= r["ts"] <= hi and r[f] is not None]
+                out = quantiles(db, f, QS, lo, hi, src="sketch-a")
+                assert out["exact_rows"] == 0 and out["sketches"] > 0
+                assert out["n"] == len(vals)
+                assert out["values"] == _sketch(vals).quantiles(QS)
+            both = [r[f] for r in rows if r[f] is not None]
+            assert quantiles(db, f, QS, T0, T0 + 2 * hour - 1)["values"] == _sketch(both).quantiles(QS)
+
+        # cada janela de 1 h = soma das suas janelas de 1 min
+        fine, coarse = SKETCH_RES_MS[0], SKETCH_RES_MS[-1]
+        f = SKETCH_FIELDS[0]
+        col = getattr(TelemetrySketch, f)
+        for b in (T0 // coarse, T0 // coarse + 1):
+            hourly = db.execute(select(col).where(
+                TelemetrySketch.res_ms == coarse, TelemetrySketch.src == "sketch-a", TelemetrySketch.bucket == b,
+            )).scalar_one()
+            minutes = Sketch()
+            for blob in db.execute(select(col).where(
+                TelemetrySketch.res_ms == fine, TelemetrySketch.src == "sketch-a",
+                TelemetrySketch.bucket >= b * coarse // fine, TelemetrySketch.bucket < (b + 1) * coarse // fine,
+                col.is_not(None),
+            )).scalars():
+                minutes.merge(Sketch.decode(blob))
+            assert _state(Sketch.decode(hourly)) == _state(minutes)
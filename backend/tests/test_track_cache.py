@@ -0,0 +1,47 @@
+"""Cache de trajeto (user-020): UPDATE no lugar não pode servir pedaço velho.
+
+A janela quente fica em cache por `(count, max(updated_at))`; um UPDATE que
+avança `updated_at` muda a chave, e o que não avança (rederivação) limpa o
+cache com `track_cache.clear()`.
+"""
+from sqlalchemy import update
+
+from app.crud.telemetry_archive import archive_store
+from app.crud.telemetry_track import track, track_cache
+from app.models.telemetry import Telemetry
+
+SRC = "track-cache"
+
+def _seed(db, t0: int) -> None:
+    step = archive_store.window_ms // 20
+    db.add_all([
+        Telemetry(ts=t0 + i * step, src=SRC, updated_at=t0 + i * step,
+                  lat=-23.5 + i * 1e-3, lon=-46.6 + (i % 2) * 1e-3, doc_json="{}")
+        for i in range(20)
+    ])
+    db.commit()
+
+def test_update_in_place_invalidates_hot_window(db_ready):
+    from app.core.db import SessionLocal
+
+    window = archive_store.window_ms
+    t0 = 1_578_000_000_000 // window * window  # janela inteira, longe dos dados dos outros testes
+    t1 = t0 + window - 1
+    with SessionLocal() as db:
+        _seed(db, t0)
+        before = track(db, SRC, t0, t1, 0.0)
+        assert track(db, SRC, t0, t1, 0.0) == before  # agora vem do cache
+
+        # UPDATE que avança `updated_at`: a chave muda
+        db.execute(update(Telemetry).where(Telemetry.src == SRC, Telemetry.ts == t0)
+                   .values(lat=-24.0, updated_at=t1 + 1))
+        db.commit()
+        moved = track(db, SRC, t0, t1, 0.0)
+        assert moved[0][1] == -24.0 and moved[1:] == before[1:]
+
+        # UPDATE sem `updated_at` (como o `rederive`): só depois de limpar o cache
+        db.execute(update(Telemetry).where(Telemetry.src == SRC, Telemetry.ts == t0).values(lat=-25.0))
+        db.commit()
+        assert track(db, SRC, t0, t1, 0.0) == moved
+        track_cache.clear()
+        assert track(db, SRC, t0, t1, 0.0)[0][1] == -25.0
@@ -0,0 +1,147 @@
+"""Benchmark: leitura da serial, JSON por linha (legado) × frames binários SLIP.
+
+Sem hardware: um subprocesso escreve no lado mestre de um pty (`os.openpty`)
+`--samples` amostras no ritmo de `--rate` Hz (0 = o mais rápido possível) e
+este processo lê o lado escravo como o bridge:
+
+- `legado`: `readline()` + `json.loads` + `json.dumps` (o laço antigo);
+- `json`:   leitura em bloco + `StreamDecoder` sobre as mesmas linhas;
+- `binário`: leitura em bloco + `StreamDecoder` sobre frames (`encode_frame`).
+
+Para cada modo: amostras/s, CPU do leitor por amostra e bytes por amostra na
+serial. Com o pyserial instalado a porta é aberta com `serial.Serial`, como no
+bridge; sem ele, direto pelo descritor do pty.
+
+Uso (a partir de serial_bridge/):
+    python bench_serial.py [--samples 100000] [--rate 0]
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import tty
+
+from framing import StreamDecoder, encode_frame
+
+try:
+    import serial
+except ImportError:  # o bench também roda fora do container
+    serial = None
+
+def _payloads(n: int):
+    rnd = random.Random(3)
+    out = []
+    for i in range(n):
+        t = i / 100.0
+        duty = (math.sin(t / 5.0) + 1.0) * 0.5
+        out.append({
+            "car": {
+                "gps": {"latitude": -23.5586 + 0.00015 * math.sin(t / 20.0), "longitude": -46.6492 + 0.00015 * math.cos(t / 20.0)},
+                "imu": {
+                    "accelerationX": rnd.randint(-128, 127), "accelerationY": rnd.randint(-128, 127),
+                    "accelerationZ": rnd.randint(-128, 127), "spinX": rnd.randint(-128, 127),
+                    "spinY": rnd.randint(-128, 127), "spinZ": rnd.randint(-128, 127),
+                    "scale_dps": (250, 500, 1000, 2000)[int(t / 20.0) & 3],
+                },
+                "drive": {"pwm": int(duty * 255 + 0.5), "speed_est_mps": 12.0 * duty},
+            },
+            "centric": {"controls": {"curve_direction": int(90 * math.sin(t / 4.0)) % 360, "speed": int(duty * 255 + 0.5),
+                                     "movement_direction": int(math.sin(t / 15.0) > -0.2)}},
+            "src": "central",
+        })
+    return out
+
+def _writer(master_fd: int, path: str, rate: float) -> None:
+    """Subprocesso: escreve o conteúdo de `path` no pty, em rajadas de 10 ms quando `rate` > 0."""
+    data = open(path, "rb").read()
+    records = json.load(open(path + ".ends"))
+    t0 = time.perf_counter()
+    start = i = 0
+    step = max(1, int(rate / 100)) if rate > 0 else 256
+    while i < len(records):
+        j = min(len(records), i + step)
+        end = records[j - 1]
+        view = memoryview(data)[start:end]
+        while view:
+            view = view[os.write(master_fd, view):]
+        start, i = end, j
+        if rate > 0:
+            delay = t0 + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+def _run(label: str, blob: bytes, ends, n: int, rate: float, legacy: bool) -> None:
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.path.join(os.environ.get("TMPDIR", "/tmp"), f"bench_serial_{os.getpid()}.bin")
+    with open(path, "wb") as f:
+        f.write(blob)
+    with open(path + ".ends", "w") as f:
+        json.dump(ends, f)  # fim de cada registro: a escrita não corta amostras entre rajadas
+    ser = serial.Serial(os.ttyname(slave), 115200, timeout=1) if serial else None
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "--writer", str(master), path, str(rate)],
+        pass_fds=(master,),
+    )
+    got = 0
+    dec = StreamDecoder()
+    raw = io.FileIO(slave, "rb", closefd=False)
+    c0, t0 = time.process_time(), time.perf_counter()
+    if legacy:
+        readline = ser.readline if ser else raw.readline
+        while got < n:
+            line = readline().strip()
+            if line:
+                json.dumps(json.loads(line.decode("utf-8")), separators=(",", ":")).encode()
+                got += 1
+    else:
+        while got < n:
+            data = ser.read(min(65536, ser.in_waiting or 1)) if ser else os.read(slave, 65536)
+            got += len(dec.feed(data))
+    cpu, wall = time.process_time() - c0, time.perf_counter() - t0
+    proc.wait()
+    if ser:
+        ser.close()
+    for fd in (master, slave):
+        os.close(fd)
+    os.remove(path)
+    os.remove(path + ".ends")
+    extra = "" if legacy else f" | {json.dumps(dec.stats())}"
+    print(f"  {label:8} {n / wall:9.0f} amostras/s | CPU do leitor {cpu / n * 1e6:6.1f} µs/amostra | "
+          f"{len(blob) / n:5.1f} bytes/amostra{extra}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--samples", type=int, default=100_000)
+    ap.add_argument("--rate", type=float, default=0)
+    ap.add_argument("--writer", nargs=3, default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.writer:
+        _writer(int(args.writer[0]), args.writer[1], float(args.writer[2]))
+        return
+
+    frames = [encode_frame(p, i) for i, p in enumerate(_payloads(args.samples))]
+    # as linhas JSON são as que o firmware monta (mesmo texto que o decodificador gera dos frames)
+    lines = [j + b"\n" for j in StreamDecoder().feed(b"\n" + b"".join(frames))]
+    assert len(lines) == args.samples
+
+    def ends(chunks):
+        out, pos = [], 0
+        for c in chunks:
+            pos += len(c)
+            out.append(pos)
+        return out
+
+    print(f"{args.samples} amostras, ritmo {'máximo' if args.rate <= 0 else f'{args.rate:g} Hz'}; "
+          f"porta: {'pyserial' if serial else 'descritor do pty (sem pyserial)'}; CPUs: {os.cpu_count()}")
+    _run("legado", b"".join(lines), ends(lines), args.samples, args.rate, legacy=True)
+    _run("json", b"".join(lines), ends(lines), args.samples, args.rate, legacy=False)
+    _run("binário", b"".join(frames), ends(frames), args.samples, args.rate, legacy=False)
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ from urllib.parse import urlparse
 import requests
 import paho.mqtt.client as mqtt
 
+from framing import StreamDecoder
+
 SERIAL_PORT = os.getenv("SERIAL_PORT", "/dev/ttyACM0")
 SERIAL_BAUD = int(os.getenv("SERIAL_BAUD", "115200"))
 BRIDGE_MODE = os.getenv("BRIDGE_MODE", "mqtt").lower()  # mqtt|http
@@ -14,6 +16,8 @@ MQTT_USERNAME = os.getenv("MQTT_USERNAME") or None
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD") or None
 
 API_INGEST_URL = os.getenv("API_INGEST_URL", "http://api:8000/api/v1/telemetry/ingest")
+SERIAL_STATS_S = float(os.getenv("SERIAL_STATS_S", "60"))  # log do decodificador (0 desliga)
+READ_MAX = 65536
 
 def mqtt_connect(url: str):
     u = urlparse(url)
@@ -26,11 +30,11 @@ def mqtt_connect(url: str):
     client.loop_start()
     return client
 
-def forward_mqtt(cli, payload: dict):
-    cli.publish(MQTT_TOPIC, json.dumps(payload, separators=(',',':')))
+def forward_mqtt(cli, payload: bytes):
+    cli.publish(MQTT_TOPIC, payload)
 
-def forward_http(payload: dict):
-    r = requests.post(API_INGEST_URL, json=payload, timeout=5)
+def forward_http(payload: bytes):
+    r = requests.post(API_INGEST_URL, data=payload, headers={"Content-Type": "application/json"}, timeout=5)
     if r.status_code >= 300:
         print("[serial_bridge] HTTP error", r.status_code, r.text[:200])
 
@@ -55,29 +59,25 @@ def main():
 
     while True:
         ser = open_serial()
-        buf = b""
+        # linhas JSON (legado) ou frames binários SLIP, detectados por registro (framing.py)
+        dec = StreamDecoder()
+        next_stats = time.monotonic() + SERIAL_STATS_S
         try:
             while True:
-                line = ser.readline()
-                if not line:
-                    continue
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    payload = json.loads(line.decode("utf-8"))
-                except Exception as e:
-                    print("[serial_bridge] invalid JSON line:", line[:80], e)
-                    continue
-
-                # Transparente: não alteramos o payload. Ele deve estar no formato esperado pelo backend.
-                try:
-                    if BRIDGE_MODE == "mqtt":
-                        forward_mqtt(cli, payload)
-                    else:
-                        forward_http(payload)
-                except Exception as e:
-                    print("[serial_bridge] forward error:", e)
+                # bloqueia até 1 byte (timeout da porta) e depois pega tudo o que já chegou
+                data = ser.read(min(READ_MAX, ser.in_waiting or 1))
+                for payload in dec.feed(data) if data else ():
+                    # Transparente: o JSON segue como o firmware montou; o backend valida.
+                    try:
+                        if BRIDGE_MODE == "mqtt":
+                            forward_mqtt(cli, payload)
+                        else:
+                            forward_http(payload)
+                    except Exception as e:
+                        print("[serial_bridge] forward error:", e)
+                if SERIAL_STATS_S > 0 and time.monotonic() >= next_stats:
+                    next_stats = time.monotonic() + SERIAL_STATS_S
+                    print("[serial_bridge] stats:", json.dumps(dec.stats()))
         except Exception as e:
             print("[serial_bridge] serial loop error:", e)
             try:
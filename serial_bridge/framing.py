@@ -0,0 +1,197 @@
+"""Decodificação do stream da serial: linhas JSON (legado) e frames binários SLIP.
+
+Frame binário (firmware com `COMM_USB_BINARY`, ver `CommUSB_SendPacketBinary`):
+
+    END | payload com escapes SLIP | END          (END = 0xC0, ESC = 0xDB)
+
+O payload é o `TelemetryPacket` de `Core/Inc/telemetry_model.h` empacotado
+sem padding, little-endian (`FRAME`), com versão, número de sequência
+(uint16, para contar perdas) e CRC-16/CCITT-FALSE no final (o mesmo de
+`binascii.crc_hqx(dados, 0xFFFF)`). `src` vai em 16 bytes completados com NUL.
+
+Detecção automática: no começo de cada registro, END inicia um frame e `{`
+inicia uma linha JSON (terminada em `\\n`, com chaves balanceadas); o resto é
+descartado até o próximo `\\n` ou END. 0xC0 nunca aparece em UTF-8, então os dois formatos podem se
+alternar no mesmo stream (ex.: a linha de hello seguida de frames). Frames com
+tamanho, versão ou CRC inválidos são descartados e contados.
+
+`StreamDecoder.feed` recebe blocos do tamanho que a porta entregar e devolve
+o JSON de cada registro pronto para publicar: linhas JSON seguem como vieram
+(sem `json.loads`/`json.dumps`) e frames viram o mesmo JSON que o firmware
+monta. O buffer é um `bytearray` reaproveitado; frames sem escape são lidos
+com `unpack_from` direto dele, sem cópia.
+"""
+from __future__ import annotations
+
+import binascii
+import json
+import struct
+from typing import Dict, List
+
+END = 0xC0
+ESC = 0xDB
+ESC_END = 0xDC
+ESC_ESC = 0xDD
+FRAME_VERSION = 1
+SRC_BYTES = 16
+
+# versão, seq, lat, lon, accel xyz, spin xyz, scale_dps, pwm, speed_est_mps,
+# curve_direction, speed, movement_direction, src, crc
+FRAME = struct.Struct("<BHff6bhBfHBB%dsH" % SRC_BYTES)
+_CRC = struct.Struct("<H")
+_CRC_AT = FRAME.size - 2
+
+MAX_LINE = 4096  # linha JSON sem `\n` até aqui é descartada
+
+_JSON = (
+    b'{"car":{"gps":{"latitude":%.6f,"longitude":%.6f},'
+    b'"imu":{"accelerationX":%d,"accelerationY":%d,"accelerationZ":%d,'
+    b'"spinX":%d,"spinY":%d,"spinZ":%d,"scale_dps":%d},'
+    b'"drive":{"pwm":%d,"speed_est_mps":%.3f}},'
+    b'"centric":{"controls":{"curve_direction":%d,"speed":%d,"movement_direction":%d}},'
+    b'"src":%s}'
+)
+
+_BOUNDARY, _LINE, _FRAME, _SKIP = range(4)
+_WS = b" \t\r\n"
+
+def encode_frame(payload: dict, seq: int) -> bytes:
+    """Frame SLIP completo de um payload no formato do backend (referência do firmware)."""
+    car, ctl = payload["car"], payload["centric"]["controls"]
+    gps, imu, drive = car["gps"], car["imu"], car["drive"]
+    body = FRAME.pack(
+        FRAME_VERSION, seq & 0xFFFF, gps["latitude"], gps["longitude"],
+        imu["accelerationX"], imu["accelerationY"], imu["accelerationZ"],
+        imu["spinX"], imu["spinY"], imu["spinZ"], imu["scale_dps"],
+        drive["pwm"], drive["speed_est_mps"],
+        ctl["curve_direction"], ctl["speed"], ctl["movement_direction"],
+        (payload.get("src") or "").encode("utf-8")[:SRC_BYTES], 0,
+    )[:_CRC_AT]
+    body += _CRC.pack(binascii.crc_hqx(body, 0xFFFF))
+    body = body.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc")
+    return b"\xc0" + body + b"\xc0"
+
+class StreamDecoder:
+    def __init__(self) -> None:
+        self.buf = bytearray()
+        self.state = _BOUNDARY
+        self.scan = 0  # até onde o registro corrente já foi procurado
+        self.last_seq = None
+        self._src: Dict[bytes, bytes] = {}
+        self.lines = 0
+        self.frames = 0
+        self.bad_frames = 0
+        self.lost = 0  # buracos na sequência dos frames
+        self.dropped_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "lines": self.lines,
+            "frames": self.frames,
+            "bad_frames": self.bad_frames,
+            "lost": self.lost,
+            "dropped_bytes": self.dropped_bytes,
+        }
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Acrescenta `data` e devolve o JSON de cada registro completo."""
+        buf = self.buf
+        buf += data
+        out: List[bytes] = []
+        pos, n, state = 0, len(buf), self.state
+        scan = max(pos, self.scan)
+        while pos < n:
+            if state == _BOUNDARY:
+                b = buf[pos]
+                if b == END:
+                    state, pos = _FRAME, pos + 1
+                elif b == 0x7B:  # "{"
+                    state = _LINE
+                elif b in _WS:
+                    pos += 1
+                else:
+                    state = _SKIP
+                scan = pos
+            elif state == _LINE:
+                nl = buf.find(b"\n", scan)
+                end = buf.find(b"\xc0", scan, nl if nl >= 0 else n)
+                if end >= 0:  # frame no meio da linha: a linha está truncada
+                    self.dropped_bytes += end - pos
+                    state, pos = _FRAME, end + 1
+                elif nl >= 0:
+                    line = bytes(buf[pos:nl]).rstrip()
+                    # linha pega pela metade (porta aberta no meio dela) começa num `{` interno
+                    if line.endswith(b"}") and line.count(b"{") == line.count(b"}"):
+                        out.append(line)
+                        self.lines += 1
+                    else:
+                        self.dropped_bytes += len(line)
+                    state, pos = _BOUNDARY, nl + 1
+                elif n - pos > MAX_LINE:
+                    self.dropped_bytes += n - pos
+                    state, pos = _SKIP, n
+                else:
+                    scan = n
+                    break
+                scan = pos
+            elif state == _FRAME:
+                end = buf.find(b"\xc0", scan)
+                if end < 0:
+                    if n - pos > 2 * FRAME.size:  # maior que um frame todo escapado: END perdido
+                        self.dropped_bytes += n - pos
+                        state, pos = _SKIP, n
+                    else:
+                        scan = n
+                        break
+                elif end == pos:  # END END: o segundo abre o frame
+                    pos += 1
+                else:
+                    self._frame(buf, pos, end, out)
+                    state, pos = _BOUNDARY, end + 1
+                scan = pos
+            else:  # _SKIP
+                nl = buf.find(b"\n", pos)
+                end = buf.find(b"\xc0", pos, nl if nl >= 0 else n)
+                if end >= 0:
+                    self.dropped_bytes += end - pos
+                    state, pos = _FRAME, end + 1
+                elif nl >= 0:
+                    self.dropped_bytes += nl - pos
+                    state, pos = _BOUNDARY, nl + 1
+                else:
+                    self.dropped_bytes += n - pos
+                    pos = n
+                scan = pos
+        del buf[:pos]
+        self.state, self.scan = state, scan - pos
+        return out
+
+    def _frame(self, buf: bytearray, start: int, end: int, out: List[bytes]) -> None:
+        if buf.find(b"\xdb", start, end) >= 0:
+            raw = bytes(buf[start:end]).replace(b"\xdb\xdc", b"\xc0").replace(b"\xdb\xdd", b"\xdb")
+            start, end, view = 0, len(raw), raw
+        else:
+            view = buf
+        if end - start != FRAME.size:
+            self.bad_frames += 1
+            return
+        with memoryview(view) as mv:
+            crc_ok = binascii.crc_hqx(mv[start:start + _CRC_AT], 0xFFFF) == _CRC.unpack_from(mv, start + _CRC_AT)[0]
+            f = FRAME.unpack_from(mv, start) if crc_ok else None
+        if f is None or f[0] != FRAME_VERSION:
+            self.bad_frames += 1
+            return
+        seq = f[1]
+        if self.last_seq is not None:
+            gap = (seq - self.last_seq - 1) & 0xFFFF
+            if gap < 0x8000:  # "para trás" = firmware reiniciou
+                self.lost += gap
+        self.last_seq = seq
+        self.frames += 1
+        out.append(_JSON % (f[2:16] + (self._src_json(f[16]),)))
+
+    def _src_json(self, raw: bytes) -> bytes:
+        s = self._src.get(raw)
+        if s is None:
+            s = self._src[raw] = json.dumps(raw.rstrip(b"\0").decode("utf-8", "replace")).encode()
+        return s